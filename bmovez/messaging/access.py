@@ -0,0 +1,45 @@
+"""Cached channel membership lookups for hot authorization paths.
+
+Every user's channel ids are kept as a set in the two-tier cache (process LRU
+in front of redis), so checks like centrifugo subscribe authorization do not
+touch Postgres. The set is invalidated whenever one of the user's
+memberships is written.
+"""
+from typing import Any
+
+from django.db import transaction
+
+from bmovez.messaging.models import ChannelMembership
+from bmovez.utils.cache import TwoTierCache
+
+channel_membership_cache = TwoTierCache(namespace="channel-memberships")
+
+
+def member_channel_ids(user_id: Any) -> frozenset[str]:
+    """Ids of every channel the user belongs to."""
+
+    def build() -> frozenset[str]:
+        channel_ids = ChannelMembership.objects.filter(user_id=user_id).values_list(
+            "channel_id", flat=True
+        )
+        return frozenset(str(channel_id) for channel_id in channel_ids)
+
+    return channel_membership_cache.get_or_set(str(user_id), build)
+
+
+def is_channel_member(user_id: Any, channel_id: Any) -> bool:
+    return str(channel_id) in member_channel_ids(user_id)
+
+
+def invalidate_member_channels_on_commit(*user_ids: Any) -> None:
+    """Drop cached membership sets once the writing transaction commits.
+
+    Invalidating earlier would let a concurrent rebuild cache the
+    pre-commit memberships again.
+    """
+
+    def invalidate() -> None:
+        for user_id in user_ids:
+            channel_membership_cache.invalidate(str(user_id))
+
+    transaction.on_commit(invalidate)
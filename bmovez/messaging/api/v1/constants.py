@@ -6,3 +6,22 @@ CENTRIFUGO_ACTION_MESSAGE_DELETE = "message:delete"
 CENTRIFUGO_ACTION_REACTION_CREATE = "reaction:create"
 CENTRIFUGO_ACTION_REACTION_EDIT = "reaction:edit"
 CENTRIFUGO_ACTION_REACTION_DELETE = "reaction:delete"
+
+# personal channel actions
+CENTRIFUGO_ACTION_CHANNEL_JOIN = "channel:join"
+CENTRIFUGO_ACTION_CHANNEL_LEAVE = "channel:leave"
+CENTRIFUGO_ACTION_INBOX_MESSAGE = "inbox:message"
+CENTRIFUGO_ACTION_INBOX_READ = "inbox:read"
+
+# fanned out to channels and personal channels, see bmovez.messaging.tasks
+CENTRIFUGO_ACTION_USER_UPDATE = "user:update"
+CENTRIFUGO_ACTION_CHANNEL_MEMBERS = "channel:members"
+
+# centrifugo proxy error codes, see https://centrifugal.dev/docs/server/codes
+CENTRIFUGO_ERROR_UNAUTHORIZED = {"code": 101, "message": "unauthorized"}
+CENTRIFUGO_ERROR_PERMISSION_DENIED = {"code": 103, "message": "permission denied"}
+CENTRIFUGO_ERROR_TOO_MANY_REQUESTS = {"code": 111, "message": "too many requests"}
+
+# message pages past the online history, see ChannelMessagesAPIView
+ARCHIVE_QUERY_PARAM = "archive"
+ARCHIVE_OFFSET_QUERY_PARAM = "offset"
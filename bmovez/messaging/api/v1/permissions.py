@@ -1,5 +1,7 @@
+import hmac
 from typing import Any
 
+from django.conf import settings
 from rest_framework import permissions
 from rest_framework.generics import GenericAPIView
 from rest_framework.request import Request
@@ -78,3 +80,12 @@ class IsAllowedToEditMembershipOrReadOnly(permissions.BasePermission):
             return False
 
         return obj.user == request.user or requester_membership.is_admin
+
+
+class IsCentrifugoProxy(permissions.BasePermission):
+    """Allow requests carrying the secret centrifugo sends with proxy calls."""
+
+    def has_permission(self, request: Request, view: GenericAPIView) -> bool:
+        secret = settings.CENTRIFUGO_PROXY_SECRET
+        provided = request.headers.get("X-Centrifugo-Proxy-Secret", "")
+        return bool(secret) and hmac.compare_digest(provided, secret)
@@ -1,12 +1,30 @@
 import logging
 from typing import Any
 
+from django.conf import settings
+from django.db.models import Manager, prefetch_related_objects
 from rest_framework import serializers
 
-from bmovez.messaging.api.v1.utils import assign_members_to_channel
-from bmovez.messaging.models import Channel, ChannelMembership, File, Message, Reaction
-from bmovez.users.api.v1.serializers import UserSerializer
+from bmovez.messaging.api.v1.utils import (
+    assign_members_to_channel,
+    claim_files,
+    prefetch_file_urls,
+)
+from bmovez.messaging.inbox import message_preview
+from bmovez.messaging.models import (
+    Channel,
+    ChannelMembership,
+    File,
+    Message,
+    MessageTag,
+    Reaction,
+    UploadSession,
+)
+from bmovez.messaging.presence import EMPTY_PRESENCE
+from bmovez.messaging.uploads import missing_chunks
+from bmovez.users.api.v1.serializers import UserSerializer, get_user_card
 from bmovez.users.models import User
+from bmovez.utils.avatars import avatar_url
 
 logger = logging.getLogger()
 
@@ -69,15 +87,15 @@ class ChannelSerializer(serializers.ModelSerializer):
 
         data = {
             "id": str(instance.id),
-            "users": [
-                {**UserSerializer(instance=context_user).data, "membership_data": None}
-            ],
+            "users": [{**get_user_card(context_user.id), "membership_data": None}],
             "type": instance.type,
             "title": context_user.name,
             "description": "",
-            "icon": context_user.profile_picture
-            if (context_user.profile_picture)
-            else None,
+            "icon": avatar_url(
+                context_user.profile_picture,
+                self.context.get("avatar_size", settings.AVATAR_DETAIL_SIZE),
+                self.context.get("request"),
+            ),
             "is_active": instance.is_active,
             "datetime_updated": instance.datetime_updated,
         }
@@ -93,7 +111,7 @@ class ChannelSerializer(serializers.ModelSerializer):
             "id": str(instance.id),
             "users": [
                 {
-                    **UserSerializer(instance=membership.user).data,
+                    **get_user_card(membership.user_id),
                     "membership_data": {
                         "added_by": str(membership.added_by.id)
                         if (membership.added_by)
@@ -109,7 +127,11 @@ class ChannelSerializer(serializers.ModelSerializer):
             "type": instance.type,
             "title": instance.title,
             "description": instance.description,
-            "icon": instance.icon if (instance.icon) else None,
+            "icon": avatar_url(
+                instance.icon,
+                self.context.get("avatar_size", settings.AVATAR_DETAIL_SIZE),
+                self.context.get("request"),
+            ),
             "is_active": instance.is_active,
             "datetime_updated": instance.datetime_updated,
         }
@@ -118,9 +140,16 @@ class ChannelSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance: Channel) -> dict[str, Any]:
         if instance.type == Channel.CHANNEL_TYPE_GROUP:
-            return self.group_channel_representation(instance)
+            data = self.group_channel_representation(instance)
         else:
-            return self.dm_channel_representation(instance)
+            data = self.dm_channel_representation(instance)
+
+        # batched by the view, see bmovez.messaging.presence
+        presence = self.context.get("presence")
+        if presence is not None:
+            data["presence"] = presence.get(str(instance.id), EMPTY_PRESENCE)
+
+        return data
 
 
 class ChannelMemberSerializer(serializers.ModelSerializer):
@@ -136,22 +165,144 @@ class ChannelMemberSerializer(serializers.ModelSerializer):
         """Assign members to channel."""
         user = self.context["request"].user
 
-        assign_members_to_channel(
+        # kept for the view, which announces who actually joined
+        self.memberships = assign_members_to_channel(
             channel=instance, users=validated_data["users"], initiator=user
         )
 
         return self.instance
 
 
+class ChannelMuteSerializer(serializers.Serializer):
+    is_muted = serializers.BooleanField()
+
+
+class FileListSerializer(serializers.ListSerializer):
+    def to_representation(self, data: Any) -> list[dict[str, Any]]:
+        files = list(data.all() if isinstance(data, Manager) else data)
+        prefetch_file_urls(files)
+        return super().to_representation(files)
+
+
 class FileSerializer(serializers.ModelSerializer):
     class Meta:
         model = File
-        fields = "__all__"
-        read_only_fields = ["id", "created_by", "datetime_created", "datetime_updated"]
+        list_serializer_class = FileListSerializer
+        exclude = ["blob"]
+        read_only_fields = [
+            "id",
+            "created_by",
+            "filename",
+            "channel",
+            "width",
+            "height",
+            "blurhash",
+            "variants",
+            "datetime_created",
+            "datetime_updated",
+        ]
 
     def update(self, instance: File, validated_data: dict[str, Any]) -> None:
         """Overide this method."""
 
+    def to_representation(self, instance: File) -> dict[str, Any]:
+        data = super().to_representation(instance)
+        data["variants"] = instance.get_variants()
+        return data
+
+
+class GalleryFileSerializer(serializers.ModelSerializer):
+    """Files of a channel gallery, with thumbnails instead of every variant."""
+
+    class Meta:
+        model = File
+        list_serializer_class = FileListSerializer
+        fields = [
+            "id",
+            "type",
+            "file",
+            "filename",
+            "width",
+            "height",
+            "blurhash",
+            "datetime_created",
+        ]
+
+    def to_representation(self, instance: File) -> dict[str, Any]:
+        data = super().to_representation(instance)
+        variants = instance.get_variants()
+        data["thumbnails"] = {
+            name: variants[name]
+            for name in settings.IMAGE_THUMBNAIL_SIZES
+            if name in variants
+        }
+        return data
+
+
+class FileUploadRequestSerializer(serializers.Serializer):
+    filename = serializers.CharField(max_length=200)
+    type = serializers.ChoiceField(choices=File.FILE_TYPES)
+    content_type = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+
+    def validate_size(self, size: int) -> int:
+        if size > settings.FILE_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError("File is too large.")
+        return size
+
+    def validate(self, attrs: dict[str, Any]) -> dict[str, Any]:
+        if (
+            attrs["type"] == File.FILE_TYPE_IMAGE
+            and attrs["content_type"] not in settings.FILE_UPLOAD_IMAGE_CONTENT_TYPES
+        ):
+            raise serializers.ValidationError(
+                {"content_type": "Unsupported image type."}
+            )
+        return attrs
+
+
+class FileUploadCompleteSerializer(serializers.Serializer):
+    token = serializers.CharField()
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = [
+            "id",
+            "type",
+            "filename",
+            "content_type",
+            "size",
+            "chunk_size",
+            "file",
+            "datetime_created",
+        ]
+        read_only_fields = ["id", "chunk_size", "file", "datetime_created"]
+        # leaves room for the key prefix within the 300 characters of keys
+        extra_kwargs = {"filename": {"max_length": 200}}
+
+    def validate_size(self, size: int) -> int:
+        if size > settings.FILE_UPLOAD_SESSION_MAX_SIZE:
+            raise serializers.ValidationError("File is too large.")
+        return size
+
+    def validate(self, attrs: dict[str, Any]) -> dict[str, Any]:
+        if (
+            attrs.get("type") == File.FILE_TYPE_IMAGE
+            and attrs["content_type"] not in settings.FILE_UPLOAD_IMAGE_CONTENT_TYPES
+        ):
+            raise serializers.ValidationError(
+                {"content_type": "Unsupported image type."}
+            )
+        return attrs
+
+    def to_representation(self, instance: UploadSession) -> dict[str, Any]:
+        data = super().to_representation(instance)
+        data["chunk_count"] = instance.chunk_count
+        data["missing_chunks"] = missing_chunks(instance)
+        return data
+
 
 class ReactionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -172,34 +323,51 @@ class ReactionSerializer(serializers.ModelSerializer):
         data = {
             "id": str(instance.id),
             "emoji": instance.emoji,
-            "created_by": UserSerializer(instance=instance.created_by).data,
+            "created_by": get_user_card(instance.created_by_id),
             "message": MessageSerializer(instance=instance.message).data,
             "datetime_created": instance.datetime_created.isoformat(),
-            "datetime_updated": instance.datetime_created.isoformat(),
+            "datetime_updated": instance.datetime_updated.isoformat(),
         }
 
         return data
 
 
+class MessageListSerializer(serializers.ListSerializer):
+    def to_representation(self, data: Any) -> list[dict[str, Any]]:
+        messages = list(data.all() if isinstance(data, Manager) else data)
+        prefetch_related_objects(messages, "files")
+        prefetch_file_urls(
+            [file for message in messages for file in message.files.all()]
+        )
+        return super().to_representation(messages)
+
+
 class MessageSerializer(serializers.ModelSerializer):
+    # declared explicitly, drf makes m2m fields with a custom through read only
+    tagged_users = serializers.PrimaryKeyRelatedField(
+        queryset=User.objects.all(),
+        many=True,
+        required=False,
+        allow_null=True,
+        allow_empty=True,
+    )
+
     class Meta:
         model = Message
+        list_serializer_class = MessageListSerializer
         fields = "__all__"
         read_only_fields = [
             "id",
             "created_by",
             "edited",
+            "reply_count",
+            "last_reply_at",
             "datetime_created",
             "datetime_updated",
             "channel",
         ]
         extra_kwargs = {
             "files": {"required": False, "allow_null": True, "allow_empty": True},
-            "tagged_users": {
-                "required": False,
-                "allow_null": True,
-                "allow_empty": True,
-            },
         }
 
     def to_representation(self, instance: Message) -> dict[str, Any]:
@@ -207,31 +375,141 @@ class MessageSerializer(serializers.ModelSerializer):
             "id": str(instance.id),
             "text": instance.text,
             "edited": instance.edited,
-            "created_by": UserSerializer(instance=instance.created_by).data,
-            "channel": str(instance.channel.id),
-            "replying": str(instance.replying.id) if instance.replying else None,
-            "files": FileSerializer(instance=instance.files, many=True).data,
-            "tagged_users": UserSerializer(
-                instance=instance.tagged_users, many=True
-            ).data,
+            "created_by": get_user_card(instance.created_by_id),
+            "channel": str(instance.channel_id),
+            "replying": str(instance.replying_id) if instance.replying_id else None,
+            "reply_count": instance.reply_count,
+            "last_reply_at": (
+                instance.last_reply_at.isoformat() if instance.last_reply_at else None
+            ),
+            "files": FileSerializer(instance=instance.files.all(), many=True).data,
+            "tagged_users": [
+                get_user_card(user.id) for user in instance.tagged_users.all()
+            ],
             "reactions": [
                 {
                     "id": str(reaction.id),
-                    "created_by": UserSerializer(instance=reaction.created_by).data,
+                    "created_by": get_user_card(reaction.created_by_id),
                     "emoji": reaction.emoji,
                     "datetime_created": reaction.datetime_created.isoformat(),
                 }
                 for reaction in instance.reaction_set.all()
             ],
             "datetime_created": instance.datetime_created.isoformat(),
-            "datetime_updated": instance.datetime_created.isoformat(),
+            "datetime_updated": instance.datetime_updated.isoformat(),
         }
+        # only message pages batch-load previews, see ChannelMessagesAPIView
+        if "reply_previews" in self.context:
+            message_data["latest_replies"] = [
+                message_preview(reply)
+                for reply in self.context["reply_previews"].get(str(instance.id), [])
+            ]
 
         return message_data
 
+    def create(self, validated_data: dict[str, Any]) -> Message:
+        if validated_data.get("files"):
+            validated_data["files"] = claim_files(
+                validated_data["files"], validated_data["channel"]
+            )
+        return super().create(validated_data)
+
     def update(self, instance: Message, validated_data: dict[str, Any]) -> Message:
         # important we dont want replying to be updated
         validated_data.pop("replying", "")
         # important we dont want replying to be updated
         validated_data.pop("files", "")
         return super().update(instance, validated_data)
+
+
+class ArchivedMessageListSerializer(serializers.ListSerializer):
+    def to_representation(self, data: Any) -> list[dict[str, Any]]:
+        records = list(data)
+        files = {
+            str(file_id): file
+            for file_id, file in File.objects.in_bulk(
+                {file_id for record in records for file_id in record["files"]}
+            ).items()
+        }
+        prefetch_file_urls(list(files.values()))
+        users = {
+            str(user_id)
+            for user_id in User.objects.filter(
+                id__in={
+                    user_id
+                    for record in records
+                    for user_id in [
+                        record["created_by"],
+                        *record["tagged_users"],
+                        *[reaction["created_by"] for reaction in record["reactions"]],
+                    ]
+                }
+            ).values_list("id", flat=True)
+        }
+        # records outlive deleted users, whose messages are gone online too
+        return super().to_representation(
+            [
+                {
+                    **record,
+                    "files": [
+                        files[file_id]
+                        for file_id in record["files"]
+                        if file_id in files
+                    ],
+                    "tagged_users": [
+                        user_id
+                        for user_id in record["tagged_users"]
+                        if user_id in users
+                    ],
+                    "reactions": [
+                        reaction
+                        for reaction in record["reactions"]
+                        if reaction["created_by"] in users
+                    ],
+                }
+                for record in records
+                if record["created_by"] in users
+            ]
+        )
+
+
+class ArchivedMessageSerializer(serializers.Serializer):
+    """Messages read back from archive segments, rendered like MessageSerializer."""
+
+    class Meta:
+        list_serializer_class = ArchivedMessageListSerializer
+
+    def to_representation(self, instance: dict[str, Any]) -> dict[str, Any]:
+        return {
+            **instance,
+            "created_by": get_user_card(instance["created_by"]),
+            "files": FileSerializer(instance=instance["files"], many=True).data,
+            "tagged_users": [
+                get_user_card(user_id) for user_id in instance["tagged_users"]
+            ],
+            "reactions": [
+                {**reaction, "created_by": get_user_card(reaction["created_by"])}
+                for reaction in instance["reactions"]
+            ],
+            "archived": True,
+        }
+
+
+class MentionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MessageTag
+        fields = ["id", "is_read", "datetime_created", "message"]
+
+    def to_representation(self, instance: MessageTag) -> dict[str, Any]:
+        return {
+            "id": str(instance.id),
+            "is_read": instance.is_read,
+            "datetime_created": instance.datetime_created.isoformat(),
+            "message": MessageSerializer(instance=instance.message).data,
+        }
+
+
+class MarkMentionsReadSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=True
+    )
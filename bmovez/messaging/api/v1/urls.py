@@ -2,20 +2,38 @@ from django.urls import path
 
 from bmovez.messaging.api.v1.views import (
     AddChannelMemeberAPIView,
+    CentrifugoConnectProxyAPIView,
+    CentrifugoPublishProxyAPIView,
+    CentrifugoRefreshProxyAPIView,
+    CentrifugoSubscribeProxyAPIView,
     ChannelAPIView,
+    ChannelGalleryAPIView,
     ChannelMessageDetailAPIView,
     ChannelMessagesAPIView,
     DirectMessageAPIView,
     FileUploadAPIView,
+    FileUploadCompleteAPIView,
+    FileUploadRequestAPIView,
+    InboxAPIView,
     ListChannelFiles,
+    MarkChannelReadAPIView,
+    MarkMentionsReadAPIView,
+    MentionsAPIView,
+    MuteChannelAPIView,
     ReactionAPIView,
     ReactionDetailAPIView,
     RemoveChannelMemberAPIView,
     RetrieveUpdateChannelAPIView,
+    ThreadAPIView,
+    UploadChunkAPIView,
+    UploadSessionAPIView,
+    UploadSessionCompleteAPIView,
+    UploadSessionDetailAPIView,
 )
 
 urlpatterns = [
     path("channels/", ChannelAPIView.as_view(), name="channel_list_create"),
+    path("channels/inbox/", InboxAPIView.as_view(), name="channel_inbox"),
     path(
         "channels/<uuid:id>/",
         RetrieveUpdateChannelAPIView.as_view(),
@@ -31,6 +49,20 @@ urlpatterns = [
         RemoveChannelMemberAPIView.as_view(),
         name="remove_channel_members",
     ),
+    path(
+        "channels/<uuid:channel_id>/read/",
+        MarkChannelReadAPIView.as_view(),
+        name="mark_channel_read",
+    ),
+    path(
+        "channels/<uuid:channel_id>/mute/",
+        MuteChannelAPIView.as_view(),
+        name="mute_channel",
+    ),
+    path("mentions/", MentionsAPIView.as_view(), name="mention_list"),
+    path(
+        "mentions/read/", MarkMentionsReadAPIView.as_view(), name="mark_mentions_read"
+    ),
     path(
         "messages/<uuid:channel_id>/",
         ChannelMessagesAPIView.as_view(),
@@ -46,12 +78,48 @@ urlpatterns = [
         ChannelMessageDetailAPIView.as_view(),
         name="message_detail",
     ),
+    path(
+        "messages/<uuid:channel_id>/<uuid:message_id>/thread/",
+        ThreadAPIView.as_view(),
+        name="message_thread",
+    ),
     path("files/", FileUploadAPIView.as_view(), name="file_create"),
+    path(
+        "files/uploads/", FileUploadRequestAPIView.as_view(), name="file_upload_request"
+    ),
+    path(
+        "files/uploads/complete/",
+        FileUploadCompleteAPIView.as_view(),
+        name="file_upload_complete",
+    ),
+    path(
+        "files/sessions/", UploadSessionAPIView.as_view(), name="upload_session_create"
+    ),
+    path(
+        "files/sessions/<uuid:session_id>/",
+        UploadSessionDetailAPIView.as_view(),
+        name="upload_session_detail",
+    ),
+    path(
+        "files/sessions/<uuid:session_id>/chunks/<int:number>/",
+        UploadChunkAPIView.as_view(),
+        name="upload_chunk",
+    ),
+    path(
+        "files/sessions/<uuid:session_id>/complete/",
+        UploadSessionCompleteAPIView.as_view(),
+        name="upload_session_complete",
+    ),
     path(
         "files/<uuid:channel_id>/",
         ListChannelFiles.as_view(),
         name="channel_files_list",
     ),
+    path(
+        "files/<uuid:channel_id>/gallery/",
+        ChannelGalleryAPIView.as_view(),
+        name="channel_gallery",
+    ),
     path(
         "reactions/<uuid:channel_id>/",
         ReactionAPIView.as_view(),
@@ -62,4 +130,24 @@ urlpatterns = [
         ReactionDetailAPIView.as_view(),
         name="reaction_details",
     ),
+    path(
+        "centrifugo/connect/",
+        CentrifugoConnectProxyAPIView.as_view(),
+        name="centrifugo_connect_proxy",
+    ),
+    path(
+        "centrifugo/publish/",
+        CentrifugoPublishProxyAPIView.as_view(),
+        name="centrifugo_publish_proxy",
+    ),
+    path(
+        "centrifugo/refresh/",
+        CentrifugoRefreshProxyAPIView.as_view(),
+        name="centrifugo_refresh_proxy",
+    ),
+    path(
+        "centrifugo/subscribe/",
+        CentrifugoSubscribeProxyAPIView.as_view(),
+        name="centrifugo_subscribe_proxy",
+    ),
 ]
@@ -1,11 +1,16 @@
 import logging
 from typing import Any
 
-from cent import CentException, Client
-from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import prefetch_related_objects
 
-from bmovez.messaging.models import Channel, ChannelMembership
+from bmovez.messaging import blobs, inbox, realtime
+from bmovez.messaging.access import invalidate_member_channels_on_commit
+from bmovez.messaging.models import Channel, ChannelMembership, File, Message
+from bmovez.messaging.signals import channel_version_scopes
 from bmovez.users.models import User
+from bmovez.utils import versions
+from bmovez.utils.storages import prefetch_urls
 
 logger = logging.getLogger()
 
@@ -32,34 +37,131 @@ def assign_members_to_channel(
             )
             memberships.append(membership)
 
-    return ChannelMembership.objects.bulk_create(memberships, ignore_conflicts=False)
+    created = ChannelMembership.objects.bulk_create(memberships, ignore_conflicts=False)
+    # bulk_create skips post_save, so update the inbox read model ourselves
+    transaction.on_commit(lambda: inbox.on_memberships_added(created))
+    transaction.on_commit(lambda: realtime.notify_memberships_added(created))
+    invalidate_member_channels_on_commit(
+        *[membership.user_id for membership in created]
+    )
+    versions.bump_on_commit(
+        lambda: [
+            *channel_version_scopes(channel.id),
+            *[versions.inbox_scope(user.id) for user in users],
+        ]
+    )
+    return created
+
 
+def latest_messages_per_channel(
+    channel_ids: list[Any], limit: int
+) -> dict[str, list[Message]]:
+    """Fetch the latest `limit` messages of each channel in a single query."""
 
-class CentWrapper:
-    def __init__(self):
-        self.client = Client(
-            address=settings.CENTRIFUGO_API_ADDRESS,
-            api_key=settings.CENTRIFUGO_API_KEY,
-            timeout=0.5,
+    if not channel_ids:
+        return {}
+
+    if connection.vendor == "postgresql":
+        messages = list(
+            Message.objects.raw(
+                f"""
+                SELECT message.*
+                FROM unnest(%s::uuid[]) AS channel(id)
+                CROSS JOIN LATERAL (
+                    SELECT * FROM {Message._meta.db_table}
+                    WHERE channel_id = channel.id
+                    ORDER BY datetime_created DESC
+                    LIMIT %s
+                ) AS message
+                """,
+                [[str(channel_id) for channel_id in channel_ids], limit],
+            )
         )
+    else:
+        messages = [
+            message
+            for channel_id in channel_ids
+            for message in Message.objects.filter(channel_id=channel_id).order_by(
+                "-datetime_created"
+            )[:limit]
+        ]
+
+    prefetch_related_objects(messages, "files", "tagged_users", "reaction_set")
+
+    grouped: dict[str, list[Message]] = {
+        str(channel_id): [] for channel_id in channel_ids
+    }
+    for message in messages:
+        grouped[str(message.channel_id)].append(message)
+
+    return grouped
+
+
+def latest_replies_per_message(
+    message_ids: list[Any], limit: int
+) -> dict[str, list[Message]]:
+    """Fetch the latest `limit` replies to each message in a single query."""
+
+    if not message_ids:
+        return {}
 
-    def publish(
-        self,
-        action: str,
-        channel: Channel,
-        data: dict[str, Any],
-        user: User | None,
-    ):
-        """Publish a message to centrifugo."""
-
-        centrifugo_data = {"action": action, "data": data, "sender": str(user.id)}
-
-        try:
-            self.client.publish(channel=str(channel.id), data=centrifugo_data)
-        except (CentException, TypeError):
-            logger.error(
-                msg=(
-                    "bmoves::messging::api::v1::utils::CentWrapper::publish::"
-                    "Error occured while publishin data to centrifugo"
-                ),
+    if connection.vendor == "postgresql":
+        replies = list(
+            Message.objects.raw(
+                f"""
+                SELECT reply.*
+                FROM unnest(%s::uuid[]) AS parent(id)
+                CROSS JOIN LATERAL (
+                    SELECT * FROM {Message._meta.db_table}
+                    WHERE replying_id = parent.id
+                    ORDER BY datetime_created DESC
+                    LIMIT %s
+                ) AS reply
+                """,
+                [[str(message_id) for message_id in message_ids], limit],
             )
+        )
+    else:
+        replies = [
+            reply
+            for message_id in message_ids
+            for reply in Message.objects.filter(replying_id=message_id).order_by(
+                "-datetime_created"
+            )[:limit]
+        ]
+
+    grouped: dict[str, list[Message]] = {
+        str(message_id): [] for message_id in message_ids
+    }
+    for reply in replies:
+        grouped[str(reply.replying_id)].append(reply)
+
+    return grouped
+
+
+def claim_files(files: list[File], channel: Channel) -> list[File]:
+    """Files to attach to a message in a channel.
+
+    A file belongs to the channel it is first sent in, which is what channel
+    galleries filter on. Sending it on to another channel attaches a copy
+    sharing the stored content.
+    """
+    claimed = []
+    for file in files:
+        if file.channel_id is None:
+            File.objects.filter(id=file.id, channel__isnull=True).update(
+                channel=channel
+            )
+            file.refresh_from_db(fields=["channel"])
+        if file.channel_id != channel.id:
+            file = blobs.copy_file(file, channel=channel)
+        claimed.append(file)
+    return claimed
+
+
+def prefetch_file_urls(files: list[File]) -> None:
+    """Sign the urls of a page of files in one go, see MediaRootS3Boto3Storage."""
+    prefetch_urls(
+        File._meta.get_field("file").storage,
+        [name for file in files for name in file.storage_names()],
+    )
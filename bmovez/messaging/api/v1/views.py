@@ -1,30 +1,84 @@
+import json
 import uuid
+from datetime import date, datetime, timedelta
+from typing import Any
 
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Count, F, QuerySet
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.decorators import method_decorator
 from rest_framework import filters, generics, permissions, status
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
 from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
+from bmovez.messaging import archive, events, inbox, presence, uploads
+from bmovez.messaging.access import is_channel_member, member_channel_ids
 from bmovez.messaging.api.v1 import constants
 from bmovez.messaging.api.v1.permissions import (
+    IsCentrifugoProxy,
     IsChannelAdminOrReadOnly,
     IsChannelMember,
     IsObjectCreator,
 )
 from bmovez.messaging.api.v1.serializers import (
+    ArchivedMessageSerializer,
     ChannelMemberSerializer,
+    ChannelMuteSerializer,
     ChannelSerializer,
     FileSerializer,
+    FileUploadCompleteSerializer,
+    FileUploadRequestSerializer,
+    GalleryFileSerializer,
+    MarkMentionsReadSerializer,
+    MentionSerializer,
     MessageSerializer,
     ReactionSerializer,
+    UploadSessionSerializer,
 )
-from bmovez.messaging.api.v1.utils import CentWrapper
-from bmovez.messaging.models import Channel, ChannelMembership, File, Message, Reaction
+from bmovez.messaging.api.v1.utils import latest_replies_per_message
+from bmovez.messaging.models import (
+    Channel,
+    ChannelMembership,
+    File,
+    Message,
+    MessageTag,
+    Reaction,
+    UploadSession,
+)
+from bmovez.messaging.realtime import CentWrapper, get_stream_position, personal_channel
+from bmovez.messaging.tasks import fan_out_channel_members_task
 from bmovez.users.models import User
+from bmovez.utils import versions
+from bmovez.utils.api.v1.mixins import ConditionalGetMixin
+from bmovez.utils.cache import single_flight
+
+
+class ChannelPresenceMixin:
+    """Presence of every channel of the user, batched into one lookup.
+
+    Presence changes without bumping version stamps, so it is part of the
+    ETag; both come from caches so 304s stay cheap.
+    """
+
+    def get_channel_presence(self) -> dict[str, dict[str, int]]:
+        if not hasattr(self, "_channel_presence"):
+            self._channel_presence = presence.channel_presence(
+                member_channel_ids(self.request.user.id)
+            )
+        return self._channel_presence
 
+    def get_etag_parts(self) -> list[str]:
+        return [json.dumps(self.get_channel_presence(), sort_keys=True)]
 
-class ChannelAPIView(generics.ListCreateAPIView):
+
+class ChannelAPIView(
+    ChannelPresenceMixin, ConditionalGetMixin, generics.ListCreateAPIView
+):
     serializer_class = ChannelSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.OrderingFilter, filters.SearchFilter]
@@ -32,11 +86,128 @@ class ChannelAPIView(generics.ListCreateAPIView):
     ordering = ["-datetime_updated"]
     search_fields = ["username", "name"]
 
+    def get_etag_scopes(self) -> list[str]:
+        return [versions.inbox_scope(self.request.user.id)]
+
+    def get_serializer_context(self) -> dict[str, Any]:
+        context = super().get_serializer_context()
+        if self.request.method == "GET":
+            context["presence"] = self.get_channel_presence()
+            context["avatar_size"] = settings.AVATAR_LIST_SIZE
+        return context
+
     def get_queryset(self) -> QuerySet[Channel]:
         return self.request.user.channel_set.all().order_by("-datetime_updated")
 
 
-class RetrieveUpdateChannelAPIView(generics.RetrieveUpdateAPIView):
+class InboxAPIView(ChannelPresenceMixin, ConditionalGetMixin, generics.GenericAPIView):
+    """Channel summaries for the inbox screen, served from the read model."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_etag_scopes(self) -> list[str]:
+        return [versions.inbox_scope(self.request.user.id)]
+
+    def get(self, request: Request) -> Response:
+        summaries = inbox.read_inbox(request.user.id)
+        channel_presence = self.get_channel_presence()
+        for summary in summaries:
+            summary["presence"] = channel_presence.get(
+                summary["id"], presence.EMPTY_PRESENCE
+            )
+        return Response(data=summaries)
+
+
+class MarkChannelReadAPIView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated, IsChannelMember]
+
+    def get_object(self) -> Channel:
+        return get_object_or_404(Channel, id=self.kwargs["channel_id"])
+
+    def post(self, request: Request, channel_id: uuid.uuid4) -> Response:
+        """Mark every message in a channel as read."""
+        ChannelMembership.objects.filter(
+            user=request.user, channel_id=channel_id
+        ).update(last_read_at=timezone.now())
+        MessageTag.objects.filter(
+            user=request.user, message__channel_id=channel_id, is_read=False
+        ).update(is_read=True)
+        inbox.mark_read(request.user.id, channel_id)
+        # keeps the user's other devices in sync
+        CentWrapper().publish_to_users_on_commit(
+            action=constants.CENTRIFUGO_ACTION_INBOX_READ,
+            user_ids=[request.user.id],
+            data={"channel": str(channel_id)},
+            user=request.user,
+        )
+        versions.bump_on_commit([versions.inbox_scope(request.user.id)])
+        return Response(status=status.HTTP_200_OK)
+
+
+class MentionsAPIView(generics.ListAPIView):
+    """Messages mentioning the user across all of their channels.
+
+    Pages are read off the (user, -datetime_created) index of the mentions
+    table; pass `is_read=false` for unread mentions only.
+    """
+
+    serializer_class = MentionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ["datetime_created"]
+    ordering = ["-datetime_created"]
+
+    def get_queryset(self) -> QuerySet[MessageTag]:
+        mentions = (
+            MessageTag.objects.filter(
+                user=self.request.user,
+                # mentions stay readable only while the user is in the channel
+                message__channel_id__in=member_channel_ids(self.request.user.id),
+            )
+            .select_related("message")
+            .prefetch_related(
+                "message__files", "message__tagged_users", "message__reaction_set"
+            )
+        )
+        if self.request.query_params.get("is_read") == "false":
+            mentions = mentions.filter(is_read=False)
+        return mentions
+
+
+class MarkMentionsReadAPIView(generics.GenericAPIView):
+    serializer_class = MarkMentionsReadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request: Request) -> Response:
+        """Mark the given mentions, or all of them, as read."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        mentions = MessageTag.objects.filter(user=request.user, is_read=False)
+        if "ids" in serializer.validated_data:
+            mentions = mentions.filter(id__in=serializer.validated_data["ids"])
+        return Response(
+            data={"updated": mentions.update(is_read=True)}, status=status.HTTP_200_OK
+        )
+
+
+class MuteChannelAPIView(generics.GenericAPIView):
+    serializer_class = ChannelMuteSerializer
+    permission_classes = [permissions.IsAuthenticated, IsChannelMember]
+
+    def get_object(self) -> Channel:
+        return get_object_or_404(Channel, id=self.kwargs["channel_id"])
+
+    def post(self, request: Request, channel_id: uuid.uuid4) -> Response:
+        """Mute or unmute push notifications of a channel."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ChannelMembership.objects.filter(
+            user=request.user, channel_id=channel_id
+        ).update(is_muted=serializer.validated_data["is_muted"])
+        return Response(data=serializer.data, status=status.HTTP_200_OK)
+
+
+class RetrieveUpdateChannelAPIView(ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     serializer_class = ChannelSerializer
     permission_classes = [
         permissions.IsAuthenticated,
@@ -46,6 +217,9 @@ class RetrieveUpdateChannelAPIView(generics.RetrieveUpdateAPIView):
 
     lookup_field = "id"
 
+    def get_etag_scopes(self) -> list[str]:
+        return [versions.channel_scope(self.kwargs["id"])]
+
     def get_queryset(self) -> QuerySet[Channel]:
         return self.request.user.channel_set.all().order_by("-datetime_updated")
 
@@ -72,6 +246,12 @@ class AddChannelMemeberAPIView(generics.GenericAPIView):
 
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        added = [str(membership.user_id) for membership in serializer.memberships]
+        transaction.on_commit(
+            lambda: fan_out_channel_members_task.delay(
+                str(channel.id), added, [], str(request.user.id)
+            )
+        )
         return Response(data=serializer.data, status=status.HTTP_201_CREATED)
 
 
@@ -96,7 +276,16 @@ class RemoveChannelMemberAPIView(generics.GenericAPIView):
         serializer = self.get_serializer(data=request.data, instance=channel)
         serializer.is_valid(raise_exception=True)
         users = serializer.validated_data["users"]
-        ChannelMembership.objects.filter(user__in=users, channel=channel).delete()
+        memberships = ChannelMembership.objects.filter(user__in=users, channel=channel)
+        removed = [
+            str(user_id) for user_id in memberships.values_list("user_id", flat=True)
+        ]
+        memberships.delete()
+        transaction.on_commit(
+            lambda: fan_out_channel_members_task.delay(
+                str(channel.id), [], removed, str(request.user.id)
+            )
+        )
         return Response(data=serializer.data, status=status.HTTP_200_OK)
 
 
@@ -108,29 +297,167 @@ class FileUploadAPIView(generics.CreateAPIView):
         serializer.save(created_by=self.request.user)
 
 
-class ListChannelFiles(generics.ListAPIView):
+class FileUploadRequestAPIView(generics.GenericAPIView):
+    serializer_class = FileUploadRequestSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request: Request) -> Response:
+        """Presign a direct upload to storage, completed with the returned token."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            upload = uploads.presign_upload(
+                user=request.user,
+                filename=serializer.validated_data["filename"],
+                file_type=serializer.validated_data["type"],
+                content_type=serializer.validated_data["content_type"],
+                size=serializer.validated_data["size"],
+            )
+        except uploads.UploadError as error:
+            raise ValidationError({"detail": str(error)})
+        return Response(data=upload, status=status.HTTP_201_CREATED)
+
+
+class FileUploadCompleteAPIView(generics.GenericAPIView):
+    serializer_class = FileUploadCompleteSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request: Request) -> Response:
+        """Verify an uploaded object and create its file."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            file = uploads.complete_upload(
+                request.user, serializer.validated_data["token"]
+            )
+        except uploads.UploadError as error:
+            raise ValidationError({"token": str(error)})
+        return Response(
+            data=FileSerializer(instance=file).data, status=status.HTTP_201_CREATED
+        )
+
+
+class UploadSessionAPIView(generics.CreateAPIView):
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def perform_create(self, serializer) -> None:
+        """Start a resumable upload, sent in `chunk_size` chunks."""
+        serializer.instance = uploads.start_session(
+            user=self.request.user,
+            filename=serializer.validated_data["filename"],
+            file_type=serializer.validated_data.get("type", File.FILE_TYPE_DOCUMENT),
+            content_type=serializer.validated_data["content_type"],
+            size=serializer.validated_data["size"],
+        )
+
+
+class UploadSessionDetailAPIView(generics.RetrieveDestroyAPIView):
+    """Progress of a resumable upload, or its cancellation."""
+
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_url_kwarg = "session_id"
+
+    def get_queryset(self) -> QuerySet[UploadSession]:
+        return UploadSession.objects.filter(created_by=self.request.user)
+
+    def perform_destroy(self, instance: UploadSession) -> None:
+        uploads.abort_session(instance)
+
+
+# chunks are streamed to storage, which must not hold a transaction open
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
+class UploadChunkAPIView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_object(self) -> UploadSession:
+        return get_object_or_404(
+            UploadSession, id=self.kwargs["session_id"], created_by=self.request.user
+        )
+
+    def put(self, request: Request, session_id: uuid.uuid4, number: int) -> Response:
+        """Store one chunk of a resumable upload, sent as the raw request body."""
+        session = self.get_object()
+        try:
+            uploads.write_chunk(
+                session,
+                number,
+                stream=request.stream,
+                length=int(request.META.get("CONTENT_LENGTH") or 0),
+            )
+        except uploads.UploadError as error:
+            raise ValidationError({"detail": str(error)})
+        return Response(
+            data={"number": number, "missing_chunks": uploads.missing_chunks(session)},
+            status=status.HTTP_200_OK,
+        )
+
+
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
+class UploadSessionCompleteAPIView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_object(self) -> UploadSession:
+        return get_object_or_404(
+            UploadSession, id=self.kwargs["session_id"], created_by=self.request.user
+        )
+
+    def post(self, request: Request, session_id: uuid.uuid4) -> Response:
+        """Assemble the chunks of a resumable upload into a file."""
+        session = self.get_object()
+        try:
+            file = uploads.finish_session(session.id, request.user)
+        except uploads.UploadError as error:
+            raise ValidationError({"detail": str(error)})
+        return Response(
+            data=FileSerializer(instance=file).data, status=status.HTTP_201_CREATED
+        )
+
+
+class ListChannelFiles(ConditionalGetMixin, generics.ListAPIView):
+    """Files sent in a channel, newest first; pass `type` for one file type.
+
+    Pages are read off the (channel, type, -datetime_created) index of files.
+    """
+
     serializer_class = FileSerializer
     permission_classes = [permissions.IsAuthenticated, IsChannelMember]
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ["datetime_created"]
     ordering = ["-datetime_created"]
 
+    def get_etag_scopes(self) -> list[str]:
+        return [versions.channel_scope(self.kwargs["channel_id"])]
+
     def get_object(self) -> Channel:
         channel = get_object_or_404(Channel, id=self.kwargs["channel_id"])
         return channel
 
     def get_queryset(self) -> QuerySet[File]:
         channel = self.get_object()
-        return File.objects.filter(message__channel=channel)
+        files = File.objects.filter(channel=channel)
+        if "type" in self.request.query_params:
+            files = files.filter(type=self.request.query_params["type"])
+        return files
+
 
+class ChannelGalleryAPIView(ListChannelFiles):
+    """Channel files with thumbnails, for browsing media."""
 
-class ChannelMessagesAPIView(generics.ListCreateAPIView):
+    serializer_class = GalleryFileSerializer
+
+
+class ChannelMessagesAPIView(ConditionalGetMixin, generics.ListCreateAPIView):
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated, IsChannelMember]
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ["datetime_created"]
     ordering = ["-datetime_created"]
 
+    def get_etag_scopes(self) -> list[str]:
+        return [versions.channel_scope(self.kwargs["channel_id"])]
+
     def get_object(self) -> Channel:
         channel = get_object_or_404(Channel, id=self.kwargs["channel_id"])
         self.channel = channel
@@ -140,41 +467,172 @@ class ChannelMessagesAPIView(generics.ListCreateAPIView):
         channel = self.get_object()
         return Message.objects.filter(channel=channel).order_by("-datetime_created")
 
+    def paginate_recent_first(
+        self, queryset: QuerySet[Message]
+    ) -> list[Message] | None:
+        """Paginate newest first over MESSAGE_HISTORY_WINDOWS, widening in turn.
+
+        Messages are partitioned by month on postgres. Bounding
+        datetime_created from below lets the planner skip every older
+        partition, so only channels quieter than a window read further back.
+        A window is used only when it fills the page, which then is the page
+        the unbounded query would return.
+        """
+        cursor = self.paginator.decode_cursor(self.request)
+        ordering = self.paginator.get_ordering(self.request, queryset, self)
+        # a reverse cursor reads newer messages, bounded from below already
+        if ordering != ("-datetime_created",) or (cursor and cursor.reverse):
+            return super().paginate_queryset(queryset)
+
+        start = parse_datetime(cursor.position) if cursor and cursor.position else None
+        start = start or timezone.now()
+        for days in settings.MESSAGE_HISTORY_WINDOWS:
+            page = super().paginate_queryset(
+                queryset.filter(datetime_created__gte=start - timedelta(days=days))
+            )
+            if page is None or self.paginator.has_next:
+                return page
+        return super().paginate_queryset(queryset)
+
+    def paginate_queryset(self, queryset: QuerySet[Message]) -> list[Message] | None:
+        page = self.paginate_recent_first(queryset)
+        if page is not None:
+            self.reply_previews = latest_replies_per_message(
+                [message.id for message in page if message.reply_count],
+                limit=settings.THREAD_REPLY_PREVIEWS,
+            )
+        return page
+
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        """List messages along with the channel's centrifugo stream position.
+
+        Clients subscribe with `since` set to the returned position so they
+        recover every event published after the page was read instead of
+        refetching the page on reconnect.
+
+        Past the oldest message still online, `next` goes on into the
+        archived history, see `list_archived`.
+        """
+        if constants.ARCHIVE_QUERY_PARAM in request.query_params:
+            return self.list_archived(request)
+
+        channel_id = self.kwargs["channel_id"]
+        position = get_stream_position(channel_id)
+        if request.query_params:
+            data = self.list_page(request, *args, **kwargs)
+        else:
+            # every member opens the channel on its latest page, so one worker
+            # rebuilds it per change; a write during the rebuild moves the
+            # stamp on and the stale page is never read
+            stamp = versions.get_stamps([versions.channel_scope(channel_id)])[0]
+            data = single_flight(
+                f"channel-page:{channel_id}:{stamp}",
+                lambda: self.list_page(request, *args, **kwargs),
+                timeout=settings.CHANNEL_PAGE_CACHE_TIMEOUT,
+            )
+
+        response = Response(data)
+        if position:
+            response["X-Centrifugo-Offset"] = position["offset"]
+            response["X-Centrifugo-Epoch"] = position["epoch"]
+        return response
+
+    def list_page(self, request: Request, *args, **kwargs) -> dict[str, Any]:
+        data = super().list(request, *args, **kwargs).data
+        if data["next"] is None and self.paginator.ordering == ("-datetime_created",):
+            month = archive.newest_month(self.channel.id)
+            if month:
+                data["next"] = self.archive_url(month, 0)
+        return data
+
+    def archive_url(self, month: date, offset: int) -> str:
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.paginator.cursor_query_param
+        )
+        url = replace_query_param(url, constants.ARCHIVE_QUERY_PARAM, f"{month:%Y-%m}")
+        return replace_query_param(url, constants.ARCHIVE_OFFSET_QUERY_PARAM, offset)
+
+    def list_archived(self, request: Request) -> Response:
+        """A page of archived messages, newest first, streamed from storage.
+
+        `archive` is the month (YYYY-MM) the page starts in and `offset` the
+        messages of that month already read.
+        """
+        try:
+            month = datetime.strptime(
+                request.query_params[constants.ARCHIVE_QUERY_PARAM], "%Y-%m"
+            ).date()
+            offset = int(
+                request.query_params.get(constants.ARCHIVE_OFFSET_QUERY_PARAM, 0)
+            )
+        except ValueError:
+            raise ValidationError(
+                {constants.ARCHIVE_QUERY_PARAM: "Invalid archive position."}
+            )
+
+        records, position = archive.read_archive(
+            self.get_object().id,
+            month,
+            max(offset, 0),
+            self.paginator.get_page_size(request),
+        )
+        serializer = ArchivedMessageSerializer(
+            records, many=True, context=self.get_serializer_context()
+        )
+        return Response(
+            {
+                "next": self.archive_url(*position) if position else None,
+                "previous": None,
+                "results": serializer.data,
+            }
+        )
+
+    def get_serializer_context(self) -> dict[str, Any]:
+        context = super().get_serializer_context()
+        if hasattr(self, "reply_previews"):
+            context["reply_previews"] = self.reply_previews
+        return context
+
     def perform_create(self, serializer) -> None:
-        serializer.save(channel=self.channel, created_by=self.request.user)
-        cent = CentWrapper()
-        cent.publish(
+        message = serializer.save(channel=self.channel, created_by=self.request.user)
+        CentWrapper().publish_on_commit(
             action=constants.CENTRIFUGO_ACTION_MESSAGE_CREATE,
             channel=self.channel,
-            data=serializer.data,
+            data=events.message_event(message),
             user=self.request.user,
         )
 
 
-class ChannelMessageDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
+class ChannelMessageDetailAPIView(
+    ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView
+):
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated, IsObjectCreator]
 
+    def get_etag_scopes(self) -> list[str]:
+        return [versions.channel_scope(self.kwargs["channel_id"])]
+
     def get_object(self) -> Message:
         channel = get_object_or_404(Channel, id=self.kwargs["channel_id"])
         self.channel = channel
         return get_object_or_404(Message, id=self.kwargs["message_id"], channel=channel)
 
     def perform_update(self, serializer) -> None:
-        serializer.save(edited=True)
-        cent = CentWrapper()
-        cent.publish(
+        changed = events.changed_message_fields(
+            serializer.instance, serializer.validated_data
+        )
+        message = serializer.save(edited=True)
+        CentWrapper().publish_on_commit(
             action=constants.CENTRIFUGO_ACTION_MESSAGE_EDIT,
             channel=self.channel,
-            data=serializer.data,
+            data=events.message_event(message, fields=[*changed, "edited"]),
             user=self.request.user,
         )
 
     def perform_destroy(self, instance) -> None:
-        data = MessageSerializer(instance=instance).data
+        data = events.message_deleted_event(instance)
         super().perform_destroy(instance)
-        cent = CentWrapper()
-        cent.publish(
+        CentWrapper().publish_on_commit(
             action=constants.CENTRIFUGO_ACTION_MESSAGE_DELETE,
             channel=self.channel,
             data=data,
@@ -182,6 +640,35 @@ class ChannelMessageDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
         )
 
 
+class ThreadAPIView(ConditionalGetMixin, generics.ListAPIView):
+    """A message and its replies, oldest reply first."""
+
+    serializer_class = MessageSerializer
+    permission_classes = [permissions.IsAuthenticated, IsChannelMember]
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ["datetime_created"]
+    ordering = ["datetime_created"]
+
+    def get_etag_scopes(self) -> list[str]:
+        return [versions.channel_scope(self.kwargs["channel_id"])]
+
+    def get_object(self) -> Channel:
+        return get_object_or_404(Channel, id=self.kwargs["channel_id"])
+
+    def get_queryset(self) -> QuerySet[Message]:
+        self.root = get_object_or_404(
+            Message, id=self.kwargs["message_id"], channel=self.get_object()
+        )
+        return Message.objects.filter(replying=self.root).prefetch_related(
+            "files", "tagged_users", "reaction_set"
+        )
+
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        response = super().list(request, *args, **kwargs)
+        response.data["root"] = self.get_serializer(instance=self.root).data
+        return response
+
+
 class ReactionAPIView(generics.CreateAPIView):
     serializer_class = ReactionSerializer
     permission_classes = [permissions.IsAuthenticated, IsChannelMember]
@@ -192,12 +679,11 @@ class ReactionAPIView(generics.CreateAPIView):
         return channel
 
     def perform_create(self, serializer) -> None:
-        serializer.save(created_by=self.request.user)
-        cent = CentWrapper()
-        cent.publish(
+        reaction = serializer.save(created_by=self.request.user)
+        CentWrapper().publish_on_commit(
             action=constants.CENTRIFUGO_ACTION_REACTION_CREATE,
             channel=self.channel,
-            data=serializer.data,
+            data=events.reaction_event(reaction),
             user=self.request.user,
         )
 
@@ -214,20 +700,18 @@ class ReactionDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
         )
 
     def perform_update(self, serializer) -> None:
-        serializer.save()
-        cent = CentWrapper()
-        cent.publish(
+        reaction = serializer.save()
+        CentWrapper().publish_on_commit(
             action=constants.CENTRIFUGO_ACTION_REACTION_EDIT,
             channel=self.channel,
-            data=serializer.data,
+            data=events.reaction_event(reaction),
             user=self.request.user,
         )
 
     def perform_destroy(self, instance) -> None:
-        data = ReactionSerializer(instance=instance).data
+        data = events.reaction_deleted_event(instance)
         super().perform_destroy(instance)
-        cent = CentWrapper()
-        cent.publish(
+        CentWrapper().publish_on_commit(
             action=constants.CENTRIFUGO_ACTION_REACTION_DELETE,
             channel=self.channel,
             data=data,
@@ -280,11 +764,126 @@ class DirectMessageAPIView(generics.CreateAPIView):
         return channel
 
     def perform_create(self, serializer) -> None:
-        serializer.save(channel=self.channel, created_by=self.request.user)
-        cent = CentWrapper()
-        cent.publish(
+        message = serializer.save(channel=self.channel, created_by=self.request.user)
+        CentWrapper().publish_on_commit(
             action=constants.CENTRIFUGO_ACTION_MESSAGE_CREATE,
             channel=self.channel,
-            data=serializer.data,
+            data=events.message_event(message),
             user=self.request.user,
         )
+
+
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
+class CentrifugoProxyAPIView(generics.GenericAPIView):
+    """Base for centrifugo proxy endpoints.
+
+    These are called on every connection and subscription, so they must not
+    open a database transaction just to answer from the cache.
+    """
+
+    permission_classes = [IsCentrifugoProxy]
+
+    @staticmethod
+    def connection_expiry() -> int:
+        return int(
+            (
+                timezone.now() + timedelta(seconds=settings.CENTRIFUGO_CONNECTION_TTL)
+            ).timestamp()
+        )
+
+
+class CentrifugoConnectProxyAPIView(CentrifugoProxyAPIView):
+    """Authenticate a centrifugo connection from the client's forwarded headers."""
+
+    def handle_exception(self, exc: Exception) -> Response:
+        if isinstance(exc, AuthenticationFailed):
+            return Response(data={"error": constants.CENTRIFUGO_ERROR_UNAUTHORIZED})
+        return super().handle_exception(exc)
+
+    def post(self, request: Request) -> Response:
+        if not request.user.is_authenticated:
+            return Response(data={"error": constants.CENTRIFUGO_ERROR_UNAUTHORIZED})
+
+        return Response(
+            data={
+                "result": {
+                    "user": str(request.user.id),
+                    "expire_at": self.connection_expiry(),
+                    "info": {"email": request.user.email},
+                    # server side subscription, see bmovez.messaging.realtime
+                    "channels": [personal_channel(request.user.id)],
+                }
+            }
+        )
+
+
+class CentrifugoRefreshProxyAPIView(CentrifugoProxyAPIView):
+    """Extend a proxy authenticated connection while the user stays active."""
+
+    authentication_classes: list[Any] = []
+
+    def post(self, request: Request) -> Response:
+        user_id = request.data.get("user")
+        if not user_id or not User.objects.filter(id=user_id, is_active=True).exists():
+            return Response(data={"result": {"expired": True}})
+
+        return Response(data={"result": {"expire_at": self.connection_expiry()}})
+
+
+class CentrifugoSubscribeProxyAPIView(CentrifugoProxyAPIView):
+    """Authorize channel subscriptions against the cached membership set."""
+
+    authentication_classes: list[Any] = []
+
+    def post(self, request: Request) -> Response:
+        user_id, channel = request.data.get("user"), request.data.get("channel", "")
+
+        if user_id and channel == personal_channel(user_id):
+            return Response(data={"result": {}})
+
+        # plain channel ids, or typing indicators of a channel
+        namespace, _, channel_id = channel.rpartition(":")
+        if (
+            not user_id
+            or namespace not in ("", presence.TYPING_NAMESPACE)
+            or not is_channel_member(user_id, channel_id)
+        ):
+            return Response(
+                data={"error": constants.CENTRIFUGO_ERROR_PERMISSION_DENIED}
+            )
+
+        return Response(data={"result": {}})
+
+
+class CentrifugoPublishProxyAPIView(CentrifugoProxyAPIView):
+    """Relay typing indicators published by clients.
+
+    Only members may publish, at a limited rate, and only a typing flag;
+    whatever else the client sent is replaced.
+    """
+
+    authentication_classes: list[Any] = []
+
+    def post(self, request: Request) -> Response:
+        user_id, channel = request.data.get("user"), request.data.get("channel", "")
+
+        namespace, _, channel_id = channel.rpartition(":")
+        if (
+            not user_id
+            or namespace != presence.TYPING_NAMESPACE
+            or not is_channel_member(user_id, channel_id)
+        ):
+            return Response(
+                data={"error": constants.CENTRIFUGO_ERROR_PERMISSION_DENIED}
+            )
+
+        if not presence.allow_typing_publication(user_id, channel_id):
+            return Response(
+                data={"error": constants.CENTRIFUGO_ERROR_TOO_MANY_REQUESTS}
+            )
+
+        data = request.data.get("data")
+        typing = data.get("typing", True) if isinstance(data, dict) else True
+        return Response(
+            data={"result": {"data": {"user": user_id, "typing": bool(typing)}}}
+        )
@@ -1,7 +1,23 @@
+import logging
+
 from django.apps import AppConfig
+from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
+logger = logging.getLogger()
+
 
 class MessagingConfig(AppConfig):
     name = "bmovez.messaging"
     verbose_name = _("Messaging")
+
+    def ready(self) -> None:
+        import bmovez.messaging.signals  # noqa F401
+
+        if settings.PUSH_PROVIDER == "bmovez.messaging.push.DisabledPushProvider":
+            logger.warning(
+                msg=(
+                    "bmoves::messaging::apps::MessagingConfig::ready::"
+                    "PUSH_PROVIDER is not set, push notifications are disabled"
+                )
+            )
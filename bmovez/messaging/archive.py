@@ -0,0 +1,218 @@
+"""Archival of cold message history to compressed segments in storage.
+
+Messages older than `MESSAGE_ARCHIVE_AFTER` days move out of the database a
+channel and month at a time, into gzipped JSON lines under
+`archive/<channel>/<yyyy-mm>.jsonl.gz`, newest message first. An
+`ArchiveSegment` row per segment is the manifest message pages read to
+continue past the oldest message still online, see ChannelMessagesAPIView.
+
+Records keep ids instead of user cards and file urls, which change, and are
+rendered when read, see ArchivedMessageSerializer. Archived messages are
+deleted without signals: to clients and inboxes they did not go away, they
+are only further back.
+"""
+import gzip
+import json
+import logging
+import tempfile
+import time
+from collections.abc import Iterator
+from contextlib import closing
+from datetime import date, datetime, timedelta
+from typing import Any
+
+from django.conf import settings
+from django.core.files import File as DjangoFile
+from django.db import transaction
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from bmovez.messaging.models import ArchiveSegment, Message, MessageTag, Reaction
+from bmovez.messaging.partitions import add_months, month_start
+from bmovez.utils import versions
+
+logger = logging.getLogger()
+
+ARCHIVE_LOCATION = "archive"
+# messages read, or deleted, per query
+ARCHIVE_BATCH_SIZE = 1000
+
+
+def archive_cutoff() -> datetime:
+    """Start of the oldest month that stays online."""
+    horizon = timezone.now() - timedelta(days=settings.MESSAGE_ARCHIVE_AFTER)
+    return month_start(horizon.date())
+
+
+def segment_name(channel_id: Any, month: date) -> str:
+    return f"{ARCHIVE_LOCATION}/{channel_id}/{month:%Y-%m}.jsonl.gz"
+
+
+def message_record(message: Message) -> dict[str, Any]:
+    return {
+        "id": str(message.id),
+        "text": message.text,
+        "edited": message.edited,
+        "created_by": str(message.created_by_id),
+        "channel": str(message.channel_id),
+        "replying": str(message.replying_id) if message.replying_id else None,
+        "reply_count": message.reply_count,
+        "last_reply_at": (
+            message.last_reply_at.isoformat() if message.last_reply_at else None
+        ),
+        "files": [str(file.id) for file in message.files.all()],
+        "tagged_users": [str(user.id) for user in message.tagged_users.all()],
+        "reactions": [
+            {
+                "id": str(reaction.id),
+                "created_by": str(reaction.created_by_id),
+                "emoji": reaction.emoji,
+                "datetime_created": reaction.datetime_created.isoformat(),
+            }
+            for reaction in message.reaction_set.all()
+        ],
+        "datetime_created": message.datetime_created.isoformat(),
+        "datetime_updated": message.datetime_updated.isoformat(),
+    }
+
+
+def pending_segments(limit: int) -> list[tuple[Any, datetime]]:
+    """(channel id, month) of the oldest segments still to archive."""
+    return list(
+        Message.objects.filter(datetime_created__lt=archive_cutoff())
+        .annotate(month=TruncMonth("datetime_created"))
+        .values_list("channel_id", "month")
+        .distinct()
+        .order_by("month", "channel_id")[:limit]
+    )
+
+
+def _delete_messages(ids: list[Any]) -> None:
+    # raw deletes skip the signals and cascades of user deletions
+    for start in range(0, len(ids), ARCHIVE_BATCH_SIZE):
+        end = start + ARCHIVE_BATCH_SIZE
+        batch = ids[start:end]
+        for model in (Reaction, MessageTag, Message.files.through):
+            model.objects.filter(message_id__in=batch)._raw_delete(model.objects.db)
+        Message.objects.filter(id__in=batch)._raw_delete(Message.objects.db)
+
+
+def archive_segment(channel_id: Any, month: date) -> ArchiveSegment:
+    """Move the messages of a channel and month to a segment in storage."""
+    since, until = month_start(month), month_start(add_months(month, 1))
+    ids = list(
+        Message.objects.filter(
+            channel_id=channel_id,
+            datetime_created__gte=since,
+            datetime_created__lt=until,
+        )
+        .order_by("-datetime_created", "-id")
+        .values_list("id", flat=True)
+    )
+
+    file_ids = set()
+    storage = ArchiveSegment._meta.get_field("content").storage
+    with tempfile.TemporaryFile() as content:
+        with gzip.GzipFile(fileobj=content, mode="wb") as lines:
+            for offset in range(0, len(ids), ARCHIVE_BATCH_SIZE):
+                end = offset + ARCHIVE_BATCH_SIZE
+                batch = ids[offset:end]
+                messages = (
+                    Message.objects.filter(id__in=batch)
+                    .order_by("-datetime_created", "-id")
+                    .prefetch_related("files", "tagged_users", "reaction_set")
+                )
+                for message in messages:
+                    record = message_record(message)
+                    file_ids.update(record["files"])
+                    lines.write(json.dumps(record).encode() + b"\n")
+        size = content.tell()
+        name = storage.save(segment_name(channel_id, month), DjangoFile(content))
+
+    try:
+        with transaction.atomic():
+            segment = ArchiveSegment.objects.create(
+                channel_id=channel_id,
+                month=month,
+                content=name,
+                message_count=len(ids),
+                size=size,
+            )
+            segment.files.set(file_ids)
+            _delete_messages(ids)
+    except Exception:
+        storage.delete(name)
+        raise
+
+    versions.bump_on_commit([versions.channel_scope(channel_id)])
+    return segment
+
+
+def archive_old_messages(limit: int, time_budget: float) -> int:
+    """Archive up to limit segments, returning how many were archived.
+
+    No further segment is started once time_budget seconds have passed, so a
+    run ends well before the task's time limit. Every segment is committed on
+    its own and stays archived whatever happens to the rest of the run.
+    """
+    started = time.monotonic()
+    archived = 0
+    for channel_id, month in pending_segments(limit):
+        segment = archive_segment(channel_id, month.date())
+        archived += 1
+        logger.info(
+            msg="bmoves::messaging::archive::archive_old_messages::Segment archived",
+            extra={
+                "channel": str(channel_id),
+                "month": f"{month:%Y-%m}",
+                "messages": segment.message_count,
+                "size": segment.size,
+            },
+        )
+        if time.monotonic() - started >= time_budget:
+            break
+    return archived
+
+
+def newest_month(channel_id: Any) -> date | None:
+    return (
+        ArchiveSegment.objects.filter(channel_id=channel_id)
+        .order_by("-month")
+        .values_list("month", flat=True)
+        .first()
+    )
+
+
+def read_segment(segment: ArchiveSegment) -> Iterator[dict[str, Any]]:
+    """Records of a segment, streamed, newest first."""
+    with segment.content.open("rb") as content, gzip.open(
+        content, "rt", encoding="utf-8"
+    ) as lines:
+        for line in lines:
+            yield json.loads(line)
+
+
+def read_archive(
+    channel_id: Any, month: date, offset: int, limit: int
+) -> tuple[list[dict[str, Any]], tuple[date, int] | None]:
+    """Up to limit archived records, newest first, from month and offset on.
+
+    Returns the records and the (month, offset) the next page starts at.
+    """
+    segments = ArchiveSegment.objects.filter(
+        channel_id=channel_id, month__lte=month
+    ).order_by("-month")
+
+    records = []
+    for segment in segments:
+        skip = offset if segment.month == month else 0
+        if skip >= segment.message_count:
+            continue
+        with closing(read_segment(segment)) as lines:
+            for index, record in enumerate(lines):
+                if index < skip:
+                    continue
+                if len(records) == limit:
+                    return records, (segment.month, index)
+                records.append(record)
+    return records, None
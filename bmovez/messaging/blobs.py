@@ -0,0 +1,136 @@
+"""Content-addressed, reference counted storage of file contents.
+
+Files with the same bytes share one `Blob`, so forwarding or re-uploading a
+document stores nothing new. Uploads through django arrive hashed by the
+upload handlers (see `bmovez.utils.uploadhandlers`) and are stored under
+`blobs/<sha256>` in pre_save. Uploads that go straight to storage (presigned
+and resumable ones) are hashed afterwards by `dedupe_file`, which points the
+file at an existing blob and drops the duplicate object, or turns the object
+into a new blob in place.
+
+Blobs nobody references any more keep `ref_count = 0` until they are
+collected.
+"""
+import hashlib
+import posixpath
+from typing import Any
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from bmovez.messaging.models import Blob, File
+
+BLOB_LOCATION = "blobs"
+HASH_BUFFER_SIZE = 64 * 1024
+
+
+def blob_name(sha256: str, filename: str) -> str:
+    # the extension lets storage serve the right content type
+    extension = posixpath.splitext(filename)[1].lower()[:10]
+    return f"{BLOB_LOCATION}/{sha256[:2]}/{sha256}{extension}"
+
+
+def _hash(content: Any) -> str:
+    sha256 = hashlib.sha256()
+    for chunk in content.chunks(HASH_BUFFER_SIZE):
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def acquire_blob(sha256: str, size: int, content: Any, filename: str) -> Blob:
+    """Take a reference on the blob with this hash, storing content if new."""
+    storage = Blob._meta.get_field("content").storage
+    while True:
+        blob = Blob.objects.filter(sha256=sha256).first()
+        if blob is None:
+            name = storage.save(blob_name(sha256, filename), content)
+            try:
+                with transaction.atomic():
+                    return Blob.objects.create(
+                        sha256=sha256, content=name, size=size, ref_count=1
+                    )
+            except IntegrityError:
+                # stored concurrently by another upload of the same content
+                storage.delete(name)
+                continue
+
+        # zero rows means the blob was collected in between, so store it again
+        if Blob.objects.filter(id=blob.id).update(ref_count=F("ref_count") + 1):
+            return blob
+
+
+def release_blob(blob_id: Any) -> None:
+    Blob.objects.filter(id=blob_id, ref_count__gt=0).update(
+        ref_count=F("ref_count") - 1
+    )
+
+
+def attach_blob(file: File) -> None:
+    """Store a file's fresh upload as a blob instead of under its own key.
+
+    Meant for pre_save, before the file field would store the upload itself.
+    """
+    if not file.file or file.file._committed or file.blob_id:
+        return
+
+    upload = file.file.file
+    if not file.filename:
+        file.filename = posixpath.basename(upload.name or "")
+    sha256 = getattr(upload, "sha256", None) or _hash(upload)
+    file.blob = acquire_blob(sha256, upload.size, upload, file.filename)
+    file.file.name = file.blob.content.name
+    file.file._committed = True
+
+
+def dedupe_file(file_id: Any) -> None:
+    """Move a file that was uploaded straight to storage onto a blob."""
+    file = File.objects.filter(id=file_id, blob__isnull=True).first()
+    if file is None:
+        return
+
+    storage = file.file.storage
+    with storage.open(file.file.name, "rb") as content:
+        sha256 = _hash(content)
+    duplicate_name = file.file.name
+
+    blob = Blob.objects.filter(sha256=sha256).first()
+    if blob is not None and Blob.objects.filter(id=blob.id).update(
+        ref_count=F("ref_count") + 1
+    ):
+        File.objects.filter(id=file.id).update(blob=blob, file=blob.content.name)
+        # copies of the file made before it was deduplicated share the object
+        if not File.objects.filter(file=duplicate_name).exists():
+            storage.delete(duplicate_name)
+        return
+
+    try:
+        with transaction.atomic():
+            # the object becomes the blob where it is, no copy needed
+            blob = Blob.objects.create(
+                sha256=sha256,
+                content=duplicate_name,
+                size=storage.size(duplicate_name),
+                ref_count=1,
+            )
+    except IntegrityError:
+        # the same content was stored concurrently, try again against it
+        return dedupe_file(file_id)
+    File.objects.filter(id=file.id).update(blob=blob)
+
+
+def copy_file(file: File, **fields: Any) -> File:
+    """Another File over the same stored content, taking a reference on its blob."""
+    if file.blob_id:
+        Blob.objects.filter(id=file.blob_id).update(ref_count=F("ref_count") + 1)
+    return File.objects.create(
+        created_by=file.created_by,
+        type=file.type,
+        file=file.file.name,
+        filename=file.filename,
+        blob_id=file.blob_id,
+        width=file.width,
+        height=file.height,
+        blurhash=file.blurhash,
+        variants=file.variants,
+        **fields,
+    )
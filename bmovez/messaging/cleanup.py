@@ -0,0 +1,135 @@
+"""Garbage collection of stored files nothing references any more.
+
+Files uploaded but never sent, and files whose messages or channel were
+deleted, are removed once older than `FILE_GC_GRACE_PERIOD`; attachments of
+archived messages stay. Each pass takes one batch of rows, locked so a file
+being attached meanwhile is skipped, deletes them and then their objects in
+multi-object storage deletes.
+Deleting a file releases its blob, and blobs left without references go the
+same way. Abandoned resumable upload sessions are aborted too.
+
+Reclaimed bytes are counted from blob sizes; files stored before blobs
+existed have no recorded size and only count as objects.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Any
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, QuerySet
+from django.utils import timezone
+
+from bmovez.messaging.images import variant_names
+from bmovez.messaging.models import ArchiveSegment, Blob, File, Message, UploadSession
+from bmovez.messaging.uploads import abort_session
+from bmovez.utils.storages import delete_objects
+
+logger = logging.getLogger()
+
+
+def _cutoff() -> datetime:
+    return timezone.now() - timedelta(seconds=settings.FILE_GC_GRACE_PERIOD)
+
+
+def orphan_files(after: datetime | None = None) -> QuerySet[File]:
+    """Files past the grace period attached to no message, oldest first."""
+    attachments = Message.files.through.objects.filter(file_id=OuterRef("id"))
+    archived = ArchiveSegment.files.through.objects.filter(file_id=OuterRef("id"))
+    files = File.objects.filter(datetime_created__lt=_cutoff())
+    if after is not None:
+        files = files.filter(datetime_created__gte=after)
+    # walks the datetime_created index, probing attachments by file
+    return files.filter(~Exists(attachments), ~Exists(archived)).order_by(
+        "datetime_created"
+    )
+
+
+def collect_files(batch_size: int, after: datetime | None = None) -> dict[str, Any]:
+    """Delete a batch of orphaned files and the objects only they used."""
+    with transaction.atomic():
+        files = list(
+            orphan_files(after)
+            .select_for_update(skip_locked=True)
+            .values("id", "file", "blob_id", "variants", "datetime_created")[
+                :batch_size
+            ]
+        )
+        File.objects.filter(id__in=[file["id"] for file in files]).delete()
+
+        # objects of files stored before blobs, unless copies still use them
+        names = [file["file"] for file in files if not file["blob_id"]]
+        shared = {
+            *File.objects.filter(file__in=names).values_list("file", flat=True),
+            *Blob.objects.filter(content__in=names).values_list("content", flat=True),
+        }
+
+    objects = {}
+    for file in files:
+        if file["blob_id"] or file["file"] in shared:
+            continue
+        objects[file["file"]] = None
+        for variant in file["variants"].values():
+            objects[variant["name"]] = None
+
+    failed = delete_objects(File._meta.get_field("file").storage, list(objects))
+    return {
+        "files": len(files),
+        "file_objects": len(objects) - failed,
+        "after": files[-1]["datetime_created"] if files else None,
+    }
+
+
+def collect_blobs(batch_size: int) -> dict[str, int]:
+    """Delete a batch of blobs without references and their objects."""
+    with transaction.atomic():
+        blobs = list(
+            Blob.objects.filter(ref_count=0)
+            .filter(~Exists(File.objects.filter(blob=OuterRef("id"))))
+            # a blob taken again meanwhile is locked by its update, or no longer 0
+            .select_for_update(skip_locked=True)
+            .order_by("id")
+            .values("id", "content", "size")[:batch_size]
+        )
+        Blob.objects.filter(id__in=[blob["id"] for blob in blobs]).delete()
+
+    # variants of images are written next to their blob
+    objects = [
+        name
+        for blob in blobs
+        for name in (blob["content"], *variant_names(blob["content"]))
+    ]
+    failed = delete_objects(Blob._meta.get_field("content").storage, objects)
+    return {
+        "blobs": len(blobs),
+        "blob_objects": len(objects) - failed,
+        "bytes": sum(blob["size"] for blob in blobs),
+    }
+
+
+def collect_upload_sessions(batch_size: int) -> int:
+    """Abort resumable uploads abandoned before completion."""
+    sessions = UploadSession.objects.filter(
+        file__isnull=True, datetime_updated__lt=_cutoff()
+    )[:batch_size]
+    count = 0
+    for session in sessions:
+        abort_session(session)
+        count += 1
+    return count
+
+
+def collect_garbage(after: datetime | None = None) -> dict[str, Any]:
+    """Collect one batch of each kind of garbage, reporting what went."""
+    batch_size = settings.FILE_GC_BATCH_SIZE
+    report = {
+        **collect_files(batch_size, after),
+        # after files, so the blobs they released go in the same pass
+        **collect_blobs(batch_size),
+        "sessions": collect_upload_sessions(batch_size),
+    }
+    logger.info(
+        msg="bmoves::messaging::cleanup::collect_garbage::Garbage collected",
+        extra={key: value for key, value in report.items() if key != "after"},
+    )
+    return report
@@ -0,0 +1,138 @@
+"""Realtime event schema.
+
+Events are built from model instances directly instead of re-running the
+REST serializers. Users are referenced by id (clients resolve them from their
+user cache) and edits only carry the fields that changed. Bump
+`EVENT_SCHEMA_VERSION` on any incompatible change.
+
+Events are JSON by default. With `CENTRIFUGO_EVENT_ENCODING = "msgpack"` they
+are published as msgpack `b64data`, which centrifugo hands to protobuf
+transport clients as raw bytes.
+"""
+import base64
+import uuid
+from typing import Any, Iterable
+
+import msgpack
+from django.conf import settings
+from django.utils import timezone
+
+from bmovez.messaging.models import File, Message, Reaction
+from bmovez.users.models import User
+from bmovez.utils.avatars import avatar_url
+
+EVENT_SCHEMA_VERSION = 1
+
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+
+
+def envelope(action: str, data: dict[str, Any], sender_id: Any) -> dict[str, Any]:
+    return {
+        "v": EVENT_SCHEMA_VERSION,
+        # lets clients drop events they already applied during recovery
+        "id": str(uuid.uuid4()),
+        "action": action,
+        "data": data,
+        "sender": str(sender_id) if sender_id else None,
+        "timestamp": timezone.now().isoformat(),
+    }
+
+
+def encode(event: dict[str, Any]) -> dict[str, Any]:
+    """Centrifugo publish params carrying the event in the configured encoding."""
+    if settings.CENTRIFUGO_EVENT_ENCODING == ENCODING_MSGPACK:
+        return {"b64data": base64.b64encode(msgpack.packb(event)).decode()}
+    return {"data": event}
+
+
+def file_event(file: File) -> dict[str, Any]:
+    return {
+        "id": str(file.id),
+        "type": file.type,
+        "url": file.file.url,
+        "width": file.width,
+        "height": file.height,
+        "blurhash": file.blurhash,
+        "variants": file.get_variants(),
+    }
+
+
+def message_event(
+    message: Message, fields: Iterable[str] | None = None
+) -> dict[str, Any]:
+    """Message event data, limited to `fields` (plus identity) when given."""
+    data = {
+        "id": str(message.id),
+        "channel": str(message.channel_id),
+        "datetime_updated": message.datetime_updated.isoformat(),
+    }
+    builders = {
+        "text": lambda: message.text,
+        "edited": lambda: message.edited,
+        "created_by": lambda: str(message.created_by_id),
+        "replying": lambda: str(message.replying_id) if message.replying_id else None,
+        "files": lambda: [file_event(file) for file in message.files.all()],
+        "tagged_users": lambda: [
+            str(user_id)
+            for user_id in message.tagged_users.values_list("id", flat=True)
+        ],
+        "datetime_created": lambda: message.datetime_created.isoformat(),
+    }
+    for field in builders if fields is None else fields:
+        data[field] = builders[field]()
+    return data
+
+
+def changed_message_fields(
+    message: Message, validated_data: dict[str, Any]
+) -> list[str]:
+    """Fields an edit would change; only these are editable, see MessageSerializer."""
+    changed = []
+    if "text" in validated_data and validated_data["text"] != message.text:
+        changed.append("text")
+    if "tagged_users" in validated_data:
+        current = set(message.tagged_users.values_list("id", flat=True))
+        if {user.id for user in validated_data["tagged_users"] or []} != current:
+            changed.append("tagged_users")
+    return changed
+
+
+def message_deleted_event(message: Message) -> dict[str, Any]:
+    # a tombstone is enough for clients and safe to replay on recovery
+    return {"id": str(message.id), "channel": str(message.channel_id)}
+
+
+def reaction_event(reaction: Reaction) -> dict[str, Any]:
+    return {
+        "id": str(reaction.id),
+        "emoji": reaction.emoji,
+        "created_by": str(reaction.created_by_id),
+        "message": str(reaction.message_id),
+        "datetime_created": reaction.datetime_created.isoformat(),
+        "datetime_updated": reaction.datetime_updated.isoformat(),
+    }
+
+
+def reaction_deleted_event(reaction: Reaction) -> dict[str, Any]:
+    return {"id": str(reaction.id), "message": str(reaction.message_id)}
+
+
+def user_event(user: User) -> dict[str, Any]:
+    """Public profile fields other users see, without contact details."""
+    return {
+        "id": str(user.id),
+        "username": user.username,
+        "name": user.name,
+        "profile_picture": avatar_url(user.profile_picture, settings.AVATAR_LIST_SIZE),
+    }
+
+
+def channel_members_event(
+    channel_id: Any, added: Iterable[Any], removed: Iterable[Any]
+) -> dict[str, Any]:
+    return {
+        "channel": str(channel_id),
+        "added": [str(user_id) for user_id in added],
+        "removed": [str(user_id) for user_id in removed],
+    }
@@ -0,0 +1,205 @@
+"""Web-optimized variants of image attachments.
+
+Every uploaded image gets WebP thumbnails (`IMAGE_THUMBNAIL_SIZES`), a WebP
+display variant capped at `IMAGE_DISPLAY_SIZE` and a blurhash placeholder,
+so clients never download originals to show previews. Variants are written
+next to the original, are oriented from its EXIF data and carry no EXIF
+themselves (it can hold locations and device details).
+"""
+import io
+import logging
+import math
+import posixpath
+from typing import Any
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import ExifTags, Image, ImageOps
+
+from bmovez.messaging.models import File, Message
+from bmovez.utils import versions
+
+logger = logging.getLogger()
+
+BLURHASH_CHARACTERS = (
+    "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    "abcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+)
+BLURHASH_SAMPLE_SIZE = 32
+# exif orientations that swap width and height
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def _base83(value: int, length: int) -> str:
+    return "".join(
+        BLURHASH_CHARACTERS[(value // 83 ** (length - 1 - digit)) % 83]
+        for digit in range(length)
+    )
+
+
+def _srgb_to_linear(value: int) -> float:
+    value = value / 255
+    if value <= 0.04045:
+        return value / 12.92
+    return ((value + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value: float) -> int:
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def blurhash(image: Image.Image, x_components: int = 4, y_components: int = 3) -> str:
+    """Encode an image as a blurhash (https://blurha.sh), from a small sample."""
+    size = BLURHASH_SAMPLE_SIZE
+    sample = image.convert("RGB").resize((size, size), Image.Resampling.BILINEAR)
+    pixels = [
+        tuple(_srgb_to_linear(channel) for channel in pixel)
+        for pixel in sample.getdata()
+    ]
+    cosines = [
+        [math.cos(math.pi * component * position / size) for position in range(size)]
+        for component in range(max(x_components, y_components))
+    ]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            normalisation = 1 if i == j == 0 else 2
+            red = green = blue = 0.0
+            for y in range(size):
+                for x in range(size):
+                    basis = normalisation * cosines[i][x] * cosines[j][y]
+                    pixel = pixels[y * size + x]
+                    red += basis * pixel[0]
+                    green += basis * pixel[1]
+                    blue += basis * pixel[2]
+            scale = 1 / (size * size)
+            factors.append((red * scale, green * scale, blue * scale))
+
+    dc, ac = factors[0], factors[1:]
+    encoded = _base83((x_components - 1) + (y_components - 1) * 9, 1)
+
+    if ac:
+        actual_maximum = max(abs(value) for factor in ac for value in factor)
+        quantised_maximum = max(0, min(82, int(actual_maximum * 166 - 0.5)))
+        maximum = (quantised_maximum + 1) / 166
+        encoded += _base83(quantised_maximum, 1)
+    else:
+        maximum = 1
+        encoded += _base83(0, 1)
+
+    encoded += _base83(
+        (_linear_to_srgb(dc[0]) << 16)
+        + (_linear_to_srgb(dc[1]) << 8)
+        + _linear_to_srgb(dc[2]),
+        4,
+    )
+
+    def quantise(value: float) -> int:
+        signed_root = math.copysign(abs(value / maximum) ** 0.5, value)
+        return max(0, min(18, int(math.floor(signed_root * 9 + 9.5))))
+
+    for red, green, blue in ac:
+        encoded += _base83(
+            quantise(red) * 19 * 19 + quantise(green) * 19 + quantise(blue), 2
+        )
+
+    return encoded
+
+
+def variant_name(name: str, variant: str) -> str:
+    root, _ = posixpath.splitext(name)
+    return f"{root}.{variant}.webp"
+
+
+def variant_names(name: str) -> list[str]:
+    """Names the variants of an image stored under name are written to."""
+    return [
+        variant_name(name, variant)
+        for variant in ("display", *settings.IMAGE_THUMBNAIL_SIZES)
+    ]
+
+
+def _save_variant(file: File, variant: str, image: Image.Image) -> dict[str, Any]:
+    buffer = io.BytesIO()
+    # no exif argument, so none of the original's metadata is written
+    image.save(buffer, format="WEBP", quality=settings.IMAGE_WEBP_QUALITY)
+    name = file.file.storage.save(
+        variant_name(file.file.name, variant), ContentFile(buffer.getvalue())
+    )
+    return {"name": name, "width": image.width, "height": image.height}
+
+
+def _bump_file_channels(file: File) -> None:
+    # files are embedded in the message pages of their channels
+    channel_ids = Message.objects.filter(files=file).values_list(
+        "channel_id", flat=True
+    )
+    versions.bump([versions.channel_scope(channel_id) for channel_id in channel_ids])
+
+
+def process_image(file_id: Any) -> None:
+    """Generate the variants and placeholder of an image file."""
+    file = File.objects.filter(id=file_id, type=File.FILE_TYPE_IMAGE).first()
+    if file is None or file.variants:
+        return
+
+    # the same content was processed before, under the same blob
+    processed = (
+        File.objects.filter(blob_id=file.blob_id).exclude(variants={}).first()
+        if file.blob_id
+        else None
+    )
+    if processed is not None:
+        File.objects.filter(id=file.id).update(
+            width=processed.width,
+            height=processed.height,
+            blurhash=processed.blurhash,
+            variants=processed.variants,
+        )
+        _bump_file_channels(file)
+        return
+
+    try:
+        with file.file.open("rb") as original, Image.open(original) as image:
+            width, height = image.size
+            if image.getexif().get(ExifTags.Base.Orientation) in ROTATED_ORIENTATIONS:
+                width, height = height, width
+            # decode a JPEG close to the display size instead of at full size
+            image.draft("RGB", (settings.IMAGE_DISPLAY_SIZE,) * 2)
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+            variants = {}
+            # each size is scaled down from the previous, larger one
+            for variant, size in [
+                ("display", settings.IMAGE_DISPLAY_SIZE),
+                *sorted(
+                    settings.IMAGE_THUMBNAIL_SIZES.items(),
+                    key=lambda item: item[1],
+                    reverse=True,
+                ),
+            ]:
+                image.thumbnail((size, size), Image.Resampling.LANCZOS)
+                variants[variant] = _save_variant(file, variant, image)
+
+            placeholder = blurhash(image)
+    except (OSError, ClientError, Image.DecompressionBombError) as error:
+        logger.error(
+            msg=(
+                "bmoves::messaging::images::process_image::"
+                "Error occured while generating image variants"
+            ),
+            extra={"details": str(error), "file": str(file_id)},
+        )
+        return
+
+    File.objects.filter(id=file.id).update(
+        width=width, height=height, blurhash=placeholder, variants=variants
+    )
+    _bump_file_channels(file)
@@ -0,0 +1,373 @@
+"""Materialized per-user inbox read model.
+
+Every user's inbox lives in redis as a sorted set of channel ids ordered by
+last activity and a hash holding, per channel, its summary (`meta:<id>`), the
+last message preview (`last:<id>`) and the unread count (`unread:<id>`).
+Message and membership events update it in place so the inbox screen is a
+single redis round trip. When the hash is missing its `built` marker (e.g.
+after cache loss) the inbox is rebuilt from Postgres, by one caller at a time.
+"""
+import json
+import logging
+from typing import Any, Iterable
+
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from bmovez.messaging.models import Channel, ChannelMembership, Message
+from bmovez.users.models import User
+from bmovez.utils.avatars import avatar_url
+from bmovez.utils.cache import get_redis_connection_or_none, single_flight
+
+logger = logging.getLogger()
+
+BUILT_FIELD = "built"
+
+
+def _order_key(user_id: Any) -> str:
+    return f"inbox:{user_id}:order"
+
+
+def _data_key(user_id: Any) -> str:
+    return f"inbox:{user_id}:data"
+
+
+def channel_meta(channel: Channel, other_user: User | None = None) -> dict[str, Any]:
+    """Title and icon of a channel as seen by one member.
+
+    DMs are titled after the other participant, so callers pass it in.
+    """
+    if channel.type == Channel.CHANNEL_TYPE_DM and other_user:
+        title = other_user.name
+        icon = avatar_url(other_user.profile_picture, settings.AVATAR_LIST_SIZE)
+    else:
+        title = channel.title
+        icon = avatar_url(channel.icon, settings.AVATAR_LIST_SIZE)
+
+    return {
+        "id": str(channel.id),
+        "type": channel.type,
+        "title": title,
+        "icon": icon,
+        "is_active": channel.is_active,
+    }
+
+
+def message_preview(message: Message) -> dict[str, Any]:
+    return {
+        "id": str(message.id),
+        "text": message.text[: settings.INBOX_PREVIEW_LENGTH],
+        "created_by": str(message.created_by_id),
+        "datetime_created": message.datetime_created.isoformat(),
+    }
+
+
+def _dm_counterparts(channel_ids: Iterable[Any], user_id: Any) -> dict[Any, User]:
+    """Map DM channel ids to the participant who is not user_id."""
+    memberships = (
+        ChannelMembership.objects.filter(
+            channel_id__in=channel_ids, channel__type=Channel.CHANNEL_TYPE_DM
+        )
+        .exclude(user_id=user_id)
+        .select_related("user")
+    )
+    return {membership.channel_id: membership.user for membership in memberships}
+
+
+def build_inbox(
+    user_id: Any, channel_ids: Iterable[Any] | None = None
+) -> list[dict[str, Any]]:
+    """Compute a user's inbox (or part of it) from Postgres, newest first."""
+
+    last_message = Message.objects.filter(channel=OuterRef("channel")).order_by(
+        "-datetime_created"
+    )
+    memberships = (
+        ChannelMembership.objects.filter(user_id=user_id)
+        .select_related("channel")
+        .annotate(
+            last_message_id=Subquery(last_message.values("id")[:1]),
+            unread_count=Count(
+                "channel__message",
+                filter=Q(
+                    channel__message__datetime_created__gt=Coalesce(
+                        F("last_read_at"), F("datetime_created")
+                    )
+                )
+                & ~Q(channel__message__created_by_id=user_id),
+            ),
+        )
+    )
+    if channel_ids is not None:
+        memberships = memberships.filter(channel_id__in=channel_ids)
+    memberships = list(memberships)
+
+    messages = Message.objects.in_bulk(
+        [membership.last_message_id for membership in memberships]
+    )
+    counterparts = _dm_counterparts(
+        [membership.channel_id for membership in memberships], user_id
+    )
+
+    summaries = []
+    for membership in memberships:
+        channel = membership.channel
+        message = messages.get(membership.last_message_id)
+        summaries.append(
+            {
+                **channel_meta(channel, counterparts.get(channel.id)),
+                "last_message": message_preview(message) if message else None,
+                "unread_count": membership.unread_count,
+                "score": (
+                    message.datetime_created if message else membership.datetime_created
+                ).timestamp(),
+            }
+        )
+
+    summaries.sort(key=lambda summary: summary["score"], reverse=True)
+    return summaries
+
+
+def _write_summary(pipeline: Any, user_id: Any, summary: dict[str, Any]) -> None:
+    channel_id = summary["id"]
+    meta = {
+        key: value
+        for key, value in summary.items()
+        if key not in ("last_message", "unread_count", "score")
+    }
+    pipeline.zadd(_order_key(user_id), {channel_id: summary["score"]})
+    pipeline.hset(
+        _data_key(user_id),
+        mapping={
+            f"meta:{channel_id}": json.dumps(meta),
+            f"last:{channel_id}": json.dumps(summary["last_message"]),
+            f"unread:{channel_id}": summary["unread_count"],
+        },
+    )
+
+
+def write_inbox(user_id: Any, summaries: list[dict[str, Any]]) -> None:
+    """Replace a user's materialized inbox."""
+    connection = get_redis_connection_or_none()
+    if connection is None:
+        return
+
+    pipeline = connection.pipeline(transaction=True)
+    pipeline.delete(_order_key(user_id), _data_key(user_id))
+    for summary in summaries:
+        _write_summary(pipeline, user_id, summary)
+    pipeline.hset(_data_key(user_id), BUILT_FIELD, 1)
+    pipeline.execute()
+
+
+def rebuild_inbox(user_id: Any) -> list[dict[str, Any]]:
+    summaries = build_inbox(user_id)
+    write_inbox(user_id, summaries)
+    return summaries
+
+
+def _strip_score(summaries: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    for summary in summaries:
+        summary.pop("score", None)
+    return summaries
+
+
+def read_inbox(user_id: Any) -> list[dict[str, Any]]:
+    """Return a user's inbox, from redis when it has been materialized."""
+    connection = get_redis_connection_or_none()
+    if connection is None:
+        return _strip_score(build_inbox(user_id))
+
+    try:
+        return _read_materialized(connection, user_id)
+    except Exception as error:
+        # the inbox still works without redis, only slower
+        logger.error(
+            msg=(
+                "bmoves::messaging::inbox::read_inbox::"
+                "Error occured while reading the inbox read model"
+            ),
+            extra={"details": str(error)},
+        )
+        return _strip_score(build_inbox(user_id))
+
+
+def _read_materialized(connection: Any, user_id: Any) -> list[dict[str, Any]]:
+    pipeline = connection.pipeline(transaction=False)
+    pipeline.zrevrange(_order_key(user_id), 0, -1)
+    pipeline.hgetall(_data_key(user_id))
+    channel_ids, data = pipeline.execute()
+
+    if BUILT_FIELD.encode() not in data:
+        # after cache loss every open app asks at once, rebuild each inbox once
+        return _strip_score(
+            single_flight(
+                f"inbox:{user_id}",
+                lambda: rebuild_inbox(user_id),
+                timeout=settings.INBOX_REBUILD_SHARE_TIMEOUT,
+            )
+        )
+
+    summaries = []
+    for channel_id in channel_ids:
+        channel_id = channel_id.decode()
+        meta = data.get(f"meta:{channel_id}".encode())
+        if meta is None:
+            continue
+        last_message = data.get(f"last:{channel_id}".encode())
+        summaries.append(
+            {
+                **json.loads(meta),
+                "last_message": json.loads(last_message) if last_message else None,
+                "unread_count": int(data.get(f"unread:{channel_id}".encode(), 0)),
+            }
+        )
+
+    return summaries
+
+
+def _safely(action: str):
+    """Keep read model failures from breaking the write path."""
+
+    def decorator(function):
+        def wrapper(*args: Any, **kwargs: Any) -> None:
+            try:
+                function(*args, **kwargs)
+            except Exception as error:
+                logger.error(
+                    msg=(
+                        f"bmoves::messaging::inbox::{action}::"
+                        "Error occured while updating the inbox read model"
+                    ),
+                    extra={"details": str(error)},
+                )
+
+        return wrapper
+
+    return decorator
+
+
+@_safely("on_message_created")
+def on_message_created(message: Message) -> None:
+    """Bump the channel to the top of every member's inbox."""
+    connection = get_redis_connection_or_none()
+    if connection is None:
+        return
+
+    member_ids = ChannelMembership.objects.filter(
+        channel_id=message.channel_id
+    ).values_list("user_id", flat=True)
+    channel_id = str(message.channel_id)
+    preview = json.dumps(message_preview(message))
+    score = message.datetime_created.timestamp()
+
+    pipeline = connection.pipeline(transaction=False)
+    for user_id in member_ids:
+        pipeline.zadd(_order_key(user_id), {channel_id: score})
+        pipeline.hset(_data_key(user_id), f"last:{channel_id}", preview)
+        if user_id != message.created_by_id:
+            pipeline.hincrby(_data_key(user_id), f"unread:{channel_id}", 1)
+    pipeline.execute()
+
+
+@_safely("on_message_deleted")
+def on_message_deleted(channel_id: Any) -> None:
+    """Point every member's preview at the channel's new last message."""
+    connection = get_redis_connection_or_none()
+    if connection is None:
+        return
+
+    message = (
+        Message.objects.filter(channel_id=channel_id)
+        .order_by("-datetime_created")
+        .first()
+    )
+    preview = json.dumps(message_preview(message) if message else None)
+    member_ids = ChannelMembership.objects.filter(channel_id=channel_id).values_list(
+        "user_id", flat=True
+    )
+
+    pipeline = connection.pipeline(transaction=False)
+    for user_id in member_ids:
+        pipeline.hset(_data_key(user_id), f"last:{channel_id}", preview)
+    pipeline.execute()
+
+
+@_safely("refresh_channel")
+def refresh_channel(channel_id: Any) -> None:
+    """Rewrite a channel's summary for all of its members."""
+    connection = get_redis_connection_or_none()
+    if connection is None:
+        return
+
+    channel = Channel.objects.filter(id=channel_id).first()
+    if channel is None:
+        return
+
+    memberships = list(
+        ChannelMembership.objects.filter(channel=channel).select_related("user")
+    )
+    pipeline = connection.pipeline(transaction=False)
+    for membership in memberships:
+        other_user = next(
+            (m.user for m in memberships if m.user_id != membership.user_id), None
+        )
+        pipeline.hset(
+            _data_key(membership.user_id),
+            f"meta:{channel.id}",
+            json.dumps(channel_meta(channel, other_user)),
+        )
+    pipeline.execute()
+
+
+@_safely("on_memberships_added")
+def on_memberships_added(memberships: Iterable[ChannelMembership]) -> None:
+    """Add a channel to the inbox of its new members.
+
+    Called directly for bulk created memberships, which do not send signals.
+    """
+    connection = get_redis_connection_or_none()
+    if connection is None:
+        return
+
+    pipeline = connection.pipeline(transaction=False)
+    dm_channel_ids = set()
+    for membership in memberships:
+        summaries = build_inbox(membership.user_id, channel_ids=[membership.channel_id])
+        for summary in summaries:
+            _write_summary(pipeline, membership.user_id, summary)
+            if summary["type"] == Channel.CHANNEL_TYPE_DM:
+                dm_channel_ids.add(membership.channel_id)
+    pipeline.execute()
+
+    # a DM is titled after the other participant, who may have just joined
+    for channel_id in dm_channel_ids:
+        refresh_channel(channel_id)
+
+
+@_safely("on_membership_removed")
+def on_membership_removed(user_id: Any, channel_id: Any) -> None:
+    connection = get_redis_connection_or_none()
+    if connection is None:
+        return
+
+    channel_id = str(channel_id)
+    pipeline = connection.pipeline(transaction=False)
+    pipeline.zrem(_order_key(user_id), channel_id)
+    pipeline.hdel(
+        _data_key(user_id),
+        f"meta:{channel_id}",
+        f"last:{channel_id}",
+        f"unread:{channel_id}",
+    )
+    pipeline.execute()
+
+
+@_safely("mark_read")
+def mark_read(user_id: Any, channel_id: Any) -> None:
+    connection = get_redis_connection_or_none()
+    if connection is None:
+        return
+
+    connection.hset(_data_key(user_id), f"unread:{channel_id}", 0)
@@ -0,0 +1,33 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from bmovez.messaging import inbox
+from bmovez.messaging.models import ChannelMembership
+
+
+class Command(BaseCommand):
+    help = "Regenerate the materialized inbox read model from Postgres."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--user",
+            action="append",
+            dest="users",
+            default=[],
+            help="Only rebuild the inbox of this user id (repeatable).",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        user_ids = options["users"] or (
+            ChannelMembership.objects.values_list("user_id", flat=True)
+            .distinct()
+            .iterator()
+        )
+
+        rebuilt = 0
+        for user_id in user_ids:
+            inbox.rebuild_inbox(user_id)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} inboxes."))
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.10 on 2026-10-19 02:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0005_alter_message_replying'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channelmembership',
+            name='last_read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.10 on 2026-10-19 03:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messaging", "0006_channelmembership_last_read_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="channelmembership",
+            name="is_muted",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,93 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_message_times(apps, schema_editor):
+    Message = apps.get_model("messaging", "Message")
+    MessageTag = apps.get_model("messaging", "MessageTag")
+    MessageTag.objects.update(
+        datetime_created=Subquery(
+            Message.objects.filter(id=OuterRef("message_id")).values(
+                "datetime_created"
+            )[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("messaging", "0007_channelmembership_is_muted"),
+    ]
+
+    operations = [
+        # turn the auto-created through table into an explicit model in place
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="MessageTag",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        (
+                            "message",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to="messaging.message",
+                            ),
+                        ),
+                        (
+                            "user",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to=settings.AUTH_USER_MODEL,
+                            ),
+                        ),
+                    ],
+                    options={
+                        "db_table": "messaging_message_tagged_users",
+                        "unique_together": {("message", "user")},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name="message",
+                    name="tagged_users",
+                    field=models.ManyToManyField(
+                        null=True,
+                        related_name="tagged_message_set",
+                        through="messaging.MessageTag",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="messagetag",
+            name="is_read",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="messagetag",
+            name="datetime_created",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copy_message_times, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="messagetag",
+            index=models.Index(
+                fields=["user", "-datetime_created"],
+                include=["message", "is_read"],
+                name="messagetag_user_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.0.10 on 2026-10-19 03:17
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def count_replies(apps, schema_editor):
+    Message = apps.get_model("messaging", "Message")
+    replies = Message.objects.filter(replying=OuterRef("id"))
+    Message.objects.filter(
+        id__in=Message.objects.filter(replying__isnull=False).values("replying")
+    ).update(
+        reply_count=Subquery(
+            replies.values("replying").annotate(count=Count("id")).values("count")[:1]
+        ),
+        last_reply_at=Subquery(
+            replies.order_by("-datetime_created").values("datetime_created")[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0008_messagetag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='last_reply_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['replying', 'datetime_created'], name='message_replying_created_idx'),
+        ),
+        migrations.RunPython(count_replies, migrations.RunPython.noop),
+    ]
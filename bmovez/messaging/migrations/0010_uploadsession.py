@@ -0,0 +1,48 @@
+# Generated by Django 4.0.10 on 2026-10-19 03:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('messaging', '0009_message_reply_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(db_index=True, default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('type', models.CharField(choices=[('IMG', 'IMAGE'), ('DOC', 'DOCUMENT')], default='DOC', max_length=255)),
+                ('filename', models.CharField(max_length=255)),
+                ('content_type', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField()),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('key', models.CharField(max_length=300)),
+                ('upload_id', models.CharField(blank=True, max_length=255)),
+                ('datetime_created', models.DateTimeField(auto_now_add=True)),
+                ('datetime_updated', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('file', models.OneToOneField(null=True, on_delete=django.db.models.deletion.SET_NULL, to='messaging.file')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UploadChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('size', models.PositiveIntegerField()),
+                ('etag', models.CharField(blank=True, max_length=255)),
+                ('datetime_created', models.DateTimeField(auto_now_add=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='messaging.uploadsession')),
+            ],
+            options={
+                'unique_together': {('session', 'number')},
+            },
+        ),
+    ]
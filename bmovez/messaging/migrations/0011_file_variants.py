@@ -0,0 +1,32 @@
+# Generated by Django 4.0.10 on 2026-10-19 03:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messaging", "0010_uploadsession"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="blurhash",
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="height",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="width",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.0.10 on 2026-10-19 03:29
+
+from django.db import migrations, models
+from django.db.models import F, Min, OuterRef, Subquery
+import django.db.models.deletion
+
+
+def set_file_channels(apps, schema_editor):
+    # as with claim_files, a file belongs to the channel it was first sent in
+    # and every other channel it was sent to gets a copy sharing its content
+    Message = apps.get_model("messaging", "Message")
+    File = apps.get_model("messaging", "File")
+    Blob = apps.get_model("messaging", "Blob")
+    Attachment = Message.files.through
+
+    attachments = Attachment.objects.filter(file_id=OuterRef("id"))
+    File.objects.filter(channel__isnull=True).update(
+        channel=Subquery(
+            attachments.order_by("message__datetime_created").values(
+                "message__channel_id"
+            )[:1]
+        )
+    )
+
+    sent_elsewhere = list(
+        Attachment.objects.exclude(message__channel_id=F("file__channel_id"))
+        .values("file_id", "message__channel_id")
+        .annotate(first_sent=Min("message__datetime_created"))
+        .order_by()
+    )
+    for row in sent_elsewhere:
+        file = File.objects.get(id=row["file_id"])
+        if file.blob_id:
+            Blob.objects.filter(id=file.blob_id).update(ref_count=F("ref_count") + 1)
+        copy = File.objects.create(
+            created_by_id=file.created_by_id,
+            type=file.type,
+            file=file.file.name,
+            filename=file.filename,
+            channel_id=row["message__channel_id"],
+            blob_id=file.blob_id,
+            width=file.width,
+            height=file.height,
+            blurhash=file.blurhash,
+            variants=file.variants,
+        )
+        # dated like a copy made when the file was sent there
+        File.objects.filter(id=copy.id).update(datetime_created=row["first_sent"])
+        Attachment.objects.filter(
+            file_id=file.id, message__channel_id=row["message__channel_id"]
+        ).update(file_id=copy.id)
+
+    if sent_elsewhere and schema_editor.connection.vendor == "postgresql":
+        # run the deferred foreign key checks of the copies now, postgres
+        # will not add this migration's indexes with trigger events pending
+        schema_editor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0012_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='channel',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='messaging.channel'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['channel', 'type', '-datetime_created'], name='file_channel_type_created_idx'),
+        ),
+        migrations.RunPython(set_file_channels, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.0.10 on 2026-10-19 03:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0013_file_channel'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='file',
+            name='channel',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='messaging.channel'),
+        ),
+        migrations.AddIndex(
+            model_name='blob',
+            index=models.Index(condition=models.Q(('ref_count', 0)), fields=['id'], name='blob_unreferenced_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['datetime_created'], name='file_created_idx'),
+        ),
+    ]
@@ -0,0 +1,210 @@
+# Generated by Django 4.0.10 on 2026-10-19 03:39
+
+from datetime import date, datetime, timezone
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# A frozen copy of how the tables were partitioned when this migration was
+# written, bmovez.messaging.partitions may change after it. Postgres only,
+# the tables stay as they are elsewhere.
+
+RANGE_PARTITIONED_TABLES = {
+    'messaging_message': 'datetime_created',
+    'messaging_reaction': 'datetime_created',
+}
+HASH_PARTITIONED_TABLES = {
+    'messaging_message_files': 'message_id',
+    'messaging_message_tagged_users': 'message_id',
+}
+HASH_PARTITIONS = 16
+# create_message_partitions_task keeps creating them from there
+PARTITIONS_AHEAD = 3
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    start = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+    end_month = add_months(month, 1)
+    end = datetime(end_month.year, end_month.month, 1, tzinfo=timezone.utc)
+    return f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+
+
+def table_schema(cursor, table):
+    """Primary key columns, indexes, constraints and sequences of a table."""
+    cursor.execute(
+        """
+        SELECT array_agg(attribute.attname ORDER BY attribute.attnum)
+        FROM pg_index index
+        JOIN pg_attribute attribute
+            ON attribute.attrelid = index.indrelid
+            AND attribute.attnum = ANY(index.indkey)
+        WHERE index.indrelid = %s::regclass AND index.indisprimary
+        """,
+        [table],
+    )
+    primary_key = cursor.fetchone()[0]
+    # indexes backing constraints come back with the constraints
+    cursor.execute(
+        """
+        SELECT pg_get_indexdef(index.indexrelid)
+        FROM pg_index index
+        WHERE index.indrelid = %s::regclass
+            AND NOT index.indisprimary
+            AND index.indexrelid NOT IN (
+                SELECT conindid FROM pg_constraint WHERE conrelid = %s::regclass
+            )
+        """,
+        [table, table],
+    )
+    # indexes of partitioned tables are defined ON ONLY the parent
+    indexes = [row[0].replace(' ON ONLY ', ' ON ') for row in cursor.fetchall()]
+    cursor.execute(
+        """
+        SELECT conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype IN ('u', 'f')
+        """,
+        [table],
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        """
+        SELECT attname, pg_get_serial_sequence(%s, attname)
+        FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+        """,
+        [table, table],
+    )
+    sequences = [
+        (column, sequence) for column, sequence in cursor.fetchall() if sequence
+    ]
+    return primary_key, indexes, constraints, sequences
+
+
+def rebuild_table(cursor, table, key, method=None, partitions=()):
+    """Rebuild a table, keeping its rows and schema.
+
+    With a method the table is partitioned by key, partitions are (name,
+    bound) pairs like ("t_p202401", "FROM (...) TO (...)") or ("t_default",
+    "DEFAULT"). Without one it becomes a plain table again. Partitioned
+    primary keys must include the partition key, plain ones go back without.
+    """
+    primary_key, indexes, constraints, sequences = table_schema(cursor, table)
+    primary_key = [column for column in primary_key if column != key]
+    if method:
+        primary_key.append(key)
+
+    old = f'{table}_rebuilt'
+    cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{old}"')
+    cursor.execute(
+        f'CREATE TABLE "{table}" (LIKE "{old}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        + (f' PARTITION BY {method} ("{key}")' if method else '')
+    )
+    for name, bound in partitions:
+        cursor.execute(
+            f'CREATE TABLE "{name}" PARTITION OF "{table}" '
+            + ('DEFAULT' if bound == 'DEFAULT' else f'FOR VALUES {bound}')
+        )
+    cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{old}"')
+
+    # sequences go with the table owning them, hand them over first
+    for column, sequence in sequences:
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+    # dropping a partitioned table drops its partitions too
+    cursor.execute(f'DROP TABLE "{old}"')
+    for column, sequence in sequences:
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY "{table}"."{column}"')
+
+    columns = ', '.join(f'"{column}"' for column in primary_key)
+    cursor.execute(f'ALTER TABLE "{table}" ADD PRIMARY KEY ({columns})')
+    for index in indexes:
+        cursor.execute(index)
+    for name, definition in constraints:
+        cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+
+
+def partition_tables(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    current = datetime.now(timezone.utc).date().replace(day=1)
+    with connection.cursor() as cursor:
+        for table, column in RANGE_PARTITIONED_TABLES.items():
+            cursor.execute(f'SELECT min("{column}") FROM "{table}"')
+            oldest = cursor.fetchone()[0]
+            month = oldest.date().replace(day=1) if oldest else current
+            last = add_months(current, PARTITIONS_AHEAD)
+            partitions = [(f'{table}_default', 'DEFAULT')]
+            while month <= last:
+                partitions.append(
+                    (f'{table}_p{month.year}{month.month:02d}', month_bounds(month))
+                )
+                month = add_months(month, 1)
+            rebuild_table(cursor, table, column, 'RANGE', partitions)
+
+        for table, column in HASH_PARTITIONED_TABLES.items():
+            rebuild_table(
+                cursor,
+                table,
+                column,
+                'HASH',
+                [
+                    (
+                        f'{table}_h{remainder:02d}',
+                        f'WITH (MODULUS {HASH_PARTITIONS}, REMAINDER {remainder})',
+                    )
+                    for remainder in range(HASH_PARTITIONS)
+                ],
+            )
+
+
+def unpartition_tables(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    tables = {**RANGE_PARTITIONED_TABLES, **HASH_PARTITIONED_TABLES}
+    with connection.cursor() as cursor:
+        for table, column in tables.items():
+            rebuild_table(cursor, table, column)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0014_garbage_collection'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='files',
+            field=models.ManyToManyField(db_constraint=False, null=True, to='messaging.file'),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='replying',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='messaging.message'),
+        ),
+        migrations.AlterField(
+            model_name='messagetag',
+            name='message',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='messaging.message'),
+        ),
+        migrations.AlterField(
+            model_name='reaction',
+            name='message',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='messaging.message'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['channel', '-datetime_created'], name='message_channel_created_idx'),
+        ),
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.0.10 on 2026-10-19 03:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0015_partition_messages'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('content', models.FileField(max_length=300, upload_to='')),
+                ('message_count', models.PositiveIntegerField()),
+                ('size', models.PositiveBigIntegerField()),
+                ('datetime_created', models.DateTimeField(auto_now_add=True)),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='messaging.channel')),
+                ('files', models.ManyToManyField(blank=True, to='messaging.file')),
+            ],
+            options={
+                'unique_together': {('channel', 'month')},
+            },
+        ),
+    ]
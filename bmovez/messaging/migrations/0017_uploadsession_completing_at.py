@@ -0,0 +1,18 @@
+# Generated by Django 4.0.10 on 2026-10-19 04:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0016_archivesegment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='completing_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
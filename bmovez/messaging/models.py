@@ -1,6 +1,8 @@
 import uuid
+from typing import Any
 
 from django.db import models
+from django.utils import timezone
 
 from bmovez.users.models import User
 from bmovez.utils.storages import user_directory_path
@@ -46,6 +48,8 @@ class ChannelMembership(models.Model):
     )
     is_admin = models.BooleanField(default=False)
     is_blocked = models.BooleanField(default=True)
+    last_read_at = models.DateTimeField(null=True, blank=True)
+    is_muted = models.BooleanField(default=False)
     datetime_created = models.DateTimeField(auto_now_add=True)
     datetime_updated = models.DateTimeField(auto_now=True)
 
@@ -57,6 +61,27 @@ class ChannelMembership(models.Model):
         ]
 
 
+class Blob(models.Model):
+    """Stored content shared by every File with the same bytes."""
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    content = models.FileField(max_length=300)
+    size = models.PositiveBigIntegerField()
+    # number of File rows pointing here; zero means it can be collected
+    ref_count = models.PositiveIntegerField(default=0)
+    datetime_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # only the few unreferenced blobs, see bmovez.messaging.cleanup
+            models.Index(
+                fields=["id"],
+                condition=models.Q(ref_count=0),
+                name="blob_unreferenced_idx",
+            ),
+        ]
+
+
 class File(models.Model):
     FILE_TYPE_IMAGE = "IMG"
     FILE_TYPE_DOCUMENT = "DOC"
@@ -72,9 +97,96 @@ class File(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     type = models.CharField(max_length=255, choices=FILE_TYPES)
     file = models.FileField(upload_to=user_directory_path, max_length=300)
+    filename = models.CharField(max_length=255, blank=True)
+    # channel of the messages it is attached to, set when first attached
+    channel = models.ForeignKey(
+        Channel, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    # set once the content has been deduplicated, see bmovez.messaging.blobs
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, blank=True)
+    # filled in for images by the variant pipeline, see bmovez.messaging.images
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    blurhash = models.CharField(max_length=64, blank=True)
+    # variant name -> {"name": storage name, "width": ..., "height": ...}
+    variants = models.JSONField(default=dict, blank=True)
     datetime_created = models.DateTimeField(auto_now_add=True)
     datetime_updated = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # channel galleries, newest first per file type
+            models.Index(
+                fields=["channel", "type", "-datetime_created"],
+                name="file_channel_type_created_idx",
+            ),
+            # orphaned file collection, see bmovez.messaging.cleanup
+            models.Index(fields=["datetime_created"], name="file_created_idx"),
+        ]
+
+    def storage_names(self) -> list[str]:
+        """Names of the original and its variants in storage."""
+        return [
+            self.file.name,
+            *(variant["name"] for variant in self.variants.values()),
+        ]
+
+    def get_variants(self) -> dict[str, dict[str, Any]]:
+        """Urls and dimensions of the generated variants."""
+        return {
+            name: {
+                "url": self.file.storage.url(variant["name"]),
+                "width": variant["width"],
+                "height": variant["height"],
+            }
+            for name, variant in self.variants.items()
+        }
+
+
+class UploadSession(models.Model):
+    """A resumable upload, sent in numbered chunks before becoming a File."""
+
+    id = models.UUIDField(
+        default=uuid.uuid4, unique=True, db_index=True, editable=False, primary_key=True
+    )
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    type = models.CharField(
+        max_length=255, choices=File.FILE_TYPES, default=File.FILE_TYPE_DOCUMENT
+    )
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    key = models.CharField(max_length=300)
+    # id of the S3 multipart upload, empty with filesystem storage
+    upload_id = models.CharField(max_length=255, blank=True)
+    file = models.OneToOneField(File, on_delete=models.SET_NULL, null=True)
+    # set while the chunks are being assembled, see uploads.finish_session
+    completing_at = models.DateTimeField(null=True, blank=True)
+    datetime_created = models.DateTimeField(auto_now_add=True)
+    datetime_updated = models.DateTimeField(auto_now=True)
+
+    @property
+    def chunk_count(self) -> int:
+        return -(-self.size // self.chunk_size)
+
+    def expected_chunk_size(self, number: int) -> int:
+        if number == self.chunk_count:
+            return self.size - (number - 1) * self.chunk_size
+        return self.chunk_size
+
+
+class UploadChunk(models.Model):
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE)
+    number = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    # S3 part ETag, needed to complete the multipart upload
+    etag = models.CharField(max_length=255, blank=True)
+    datetime_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = [("session", "number")]
+
 
 class Message(models.Model):
     id = models.UUIDField(
@@ -82,18 +194,62 @@ class Message(models.Model):
     )
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     channel = models.ForeignKey(Channel, on_delete=models.CASCADE)
-    files = models.ManyToManyField(File, null=True)
+    # relations to messages have no database constraints, messages are
+    # partitioned on postgres, see bmovez.messaging.partitions
+    files = models.ManyToManyField(File, null=True, db_constraint=False)
     tagged_users = models.ManyToManyField(
-        User, related_name="tagged_message_set", null=True
+        User,
+        related_name="tagged_message_set",
+        null=True,
+        through="messaging.MessageTag",
     )
     text = models.TextField(max_length=3000)
     edited = models.BooleanField(default=False)
     replying = models.ForeignKey(
-        "messaging.Message", on_delete=models.DO_NOTHING, null=True
+        "messaging.Message", on_delete=models.DO_NOTHING, null=True, db_constraint=False
     )
+    # maintained from the replies' signals, see bmovez.messaging.threads
+    reply_count = models.PositiveIntegerField(default=0)
+    last_reply_at = models.DateTimeField(null=True, blank=True)
     datetime_created = models.DateTimeField(auto_now_add=True)
     datetime_updated = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["replying", "datetime_created"],
+                name="message_replying_created_idx",
+            ),
+            # channel history, newest first
+            models.Index(
+                fields=["channel", "-datetime_created"],
+                name="message_channel_created_idx",
+            ),
+        ]
+
+
+class MessageTag(models.Model):
+    """A user mentioned in a message, as listed in their mentions inbox."""
+
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, db_constraint=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    is_read = models.BooleanField(default=False)
+    # when the user was mentioned, kept here so the mentions inbox is served
+    # from the covering index alone
+    datetime_created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # the table of the former auto-created through model
+        db_table = "messaging_message_tagged_users"
+        unique_together = [("message", "user")]
+        indexes = [
+            models.Index(
+                fields=["user", "-datetime_created"],
+                include=["message", "is_read"],
+                name="messagetag_user_created_idx",
+            )
+        ]
+
 
 class Reaction(models.Model):
     id = models.UUIDField(
@@ -101,6 +257,27 @@ class Reaction(models.Model):
     )
     emoji = models.CharField(max_length=50)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
-    message = models.ForeignKey(Message, on_delete=models.CASCADE)
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, db_constraint=False)
     datetime_created = models.DateTimeField(auto_now_add=True)
     datetime_updated = models.DateTimeField(auto_now=True)
+
+
+class ArchiveSegment(models.Model):
+    """Messages of one channel and month, moved out to storage.
+
+    See bmovez.messaging.archive.
+    """
+
+    channel = models.ForeignKey(Channel, on_delete=models.CASCADE)
+    # first day of the month
+    month = models.DateField()
+    # gzipped JSON lines, newest message first
+    content = models.FileField(max_length=300)
+    message_count = models.PositiveIntegerField()
+    size = models.PositiveBigIntegerField()
+    # attachments of the archived messages, kept from garbage collection
+    files = models.ManyToManyField(File, blank=True)
+    datetime_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = [("channel", "month")]
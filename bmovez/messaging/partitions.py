@@ -0,0 +1,111 @@
+"""Postgres declarative partitioning of messages and their satellite tables.
+
+Messages and reactions are range partitioned by month of `datetime_created`,
+so history reads bounded in time only scan the partitions they cover and old
+months vacuum, and can be dropped, on their own. A default partition catches
+rows no monthly partition covers yet; `create_monthly_partitions` runs ahead
+of time from celery beat and moves such rows out when it catches up.
+
+The message attachment and mention tables are keyed by message and must stay
+unique per (message, file) and (message, user), which Postgres only allows on
+partitioned tables when the partition key is part of it. They are hash
+partitioned by message instead.
+
+Partitioned tables need the partition key in their primary key, so foreign
+keys can no longer point at messages; those relations are declared with
+`db_constraint=False` and cascades stay in django's hands as before.
+
+The tables are converted by migration 0015_partition_messages, which keeps
+its own copy of the partitioning so it does not change along with this module.
+
+Everything here is a no-op on other databases.
+"""
+import logging
+from datetime import date, datetime
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger()
+
+# table -> timestamp column, one partition per month
+RANGE_PARTITIONED_TABLES = {
+    "messaging_message": "datetime_created",
+    "messaging_reaction": "datetime_created",
+}
+
+
+def is_supported(connection) -> bool:
+    return connection.vendor == "postgresql"
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_partition(table: str, month: date) -> str:
+    return f"{table}_p{month.year}{month.month:02d}"
+
+
+def month_start(month: date) -> datetime:
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _month_bounds(month: date) -> str:
+    start, end = month_start(month), month_start(add_months(month, 1))
+    return f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+
+
+def _table_exists(cursor, table: str) -> bool:
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [table])
+    return cursor.fetchone()[0]
+
+
+def create_monthly_partitions() -> list[str]:
+    """Create the monthly partitions of the coming MESSAGE_PARTITIONS_AHEAD months.
+
+    Rows that went to the default partition in the meantime are moved into
+    the new partition, which is filled before being attached.
+    """
+    if not is_supported(connection):
+        return []
+
+    current = timezone.now().date().replace(day=1)
+    created = []
+    with connection.cursor() as cursor:
+        for table, column in RANGE_PARTITIONED_TABLES.items():
+            for months in range(settings.MESSAGE_PARTITIONS_AHEAD + 1):
+                month = add_months(current, months)
+                name = month_partition(table, month)
+                if _table_exists(cursor, name):
+                    continue
+
+                with transaction.atomic():
+                    cursor.execute(
+                        f'CREATE TABLE "{name}" '
+                        f'(LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+                    )
+                    cursor.execute(
+                        f'WITH moved AS (DELETE FROM "{table}_default" '
+                        f'WHERE "{column}" >= %s AND "{column}" < %s RETURNING *) '
+                        f'INSERT INTO "{name}" SELECT * FROM moved',
+                        [month_start(month), month_start(add_months(month, 1))],
+                    )
+                    cursor.execute(
+                        f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" '
+                        f"FOR VALUES {_month_bounds(month)}"
+                    )
+                created.append(name)
+
+    if created:
+        logger.info(
+            msg=(
+                "bmoves::messaging::partitions::create_monthly_partitions::"
+                "Partitions created"
+            ),
+            extra={"partitions": created},
+        )
+    return created
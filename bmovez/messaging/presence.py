@@ -0,0 +1,82 @@
+"""Online presence and typing indicators.
+
+Neither touches the database. Typing indicators are client publications to
+`typing:<channel id>` which centrifugo relays after the publish proxy checks
+membership (against the cached membership set) and a redis rate limit.
+Presence comes from centrifugo's presence stats, fetched in one batched API
+call and cached for a few seconds.
+"""
+from typing import Any, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+
+from bmovez.messaging.realtime import CentWrapper, personal_channel
+
+TYPING_NAMESPACE = "typing"
+
+EMPTY_PRESENCE = {"num_clients": 0, "num_users": 0}
+
+
+def typing_channel(channel_id: Any) -> str:
+    return f"{TYPING_NAMESPACE}:{channel_id}"
+
+
+def _presence_key(channel: str) -> str:
+    return f"presence:{channel}"
+
+
+def presence_stats(channels: Iterable[str]) -> dict[str, dict[str, int]]:
+    """Presence stats of many centrifugo channels, cached briefly."""
+    keys = {_presence_key(channel): channel for channel in channels}
+    cached = cache.get_many(keys)
+    stats = {keys[key]: value for key, value in cached.items()}
+
+    missing = [channel for key, channel in keys.items() if key not in cached]
+    if missing:
+        fetched = CentWrapper().presence_stats(missing)
+        cache.set_many(
+            {_presence_key(channel): value for channel, value in fetched.items()},
+            timeout=settings.PRESENCE_STATS_CACHE_TIMEOUT,
+        )
+        stats.update(fetched)
+
+    return stats
+
+
+def channel_presence(channel_ids: Iterable[Any]) -> dict[str, dict[str, int]]:
+    """Clients and users currently subscribed to each channel."""
+    channels = {str(channel_id): str(channel_id) for channel_id in channel_ids}
+    stats = presence_stats(channels)
+    return {
+        channel_id: stats.get(channel, EMPTY_PRESENCE)
+        for channel_id, channel in channels.items()
+    }
+
+
+def online_user_ids(user_ids: Iterable[Any]) -> set[str]:
+    """Users with at least one open connection.
+
+    Every connection is subscribed to its user's personal channel, so its
+    presence tells whether the user is online.
+    """
+    channels = {personal_channel(user_id): str(user_id) for user_id in user_ids}
+    stats = presence_stats(channels)
+    return {
+        user_id
+        for channel, user_id in channels.items()
+        if stats.get(channel, EMPTY_PRESENCE)["num_clients"]
+    }
+
+
+def allow_typing_publication(user_id: Any, channel_id: Any) -> bool:
+    """Fixed window rate limit on a user's typing events in a channel."""
+    key = f"typing:rate:{user_id}:{channel_id}"
+    cache.add(key, 0, timeout=settings.TYPING_RATE_LIMIT_WINDOW)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # the window expired between add and incr
+        cache.set(key, 1, timeout=settings.TYPING_RATE_LIMIT_WINDOW)
+        count = 1
+    return count <= settings.TYPING_RATE_LIMIT
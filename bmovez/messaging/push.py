@@ -0,0 +1,230 @@
+"""Push notification fan-out.
+
+New messages are handed to celery (see `tasks.queue_message_push`) so requests
+never wait on the push provider. The fan-out skips the sender, members who
+muted the channel and members who are online (they get the message over
+centrifugo), then sends one provider request per batch of device tokens.
+
+Bursts are collapsed per channel: the first message of a burst is pushed
+right away and whatever follows within `PUSH_COLLAPSE_WINDOW` seconds is
+pushed once, as a summary, when the window closes. Notifications carry the
+channel as collapse key so devices only show the latest one.
+
+The provider is pluggable through `PUSH_PROVIDER`. Local and test settings
+use `FakePushProvider`; production falls back to `DisabledPushProvider`, which
+drops every notification and warns about it at startup, until a provider is set.
+"""
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from bmovez.messaging import presence
+from bmovez.messaging.models import ChannelMembership, Message
+from bmovez.users.models import UserDevice
+
+logger = logging.getLogger()
+
+METRICS = (
+    "messages",
+    "collapsed",
+    "recipients",
+    "skipped_online",
+    "skipped_muted",
+    "batches",
+    "notifications",
+    "failures",
+    "invalid_tokens",
+)
+
+
+@dataclass
+class PushResult:
+    sent: int = 0
+    failed: int = 0
+    invalid_tokens: list[str] = field(default_factory=list)
+
+
+class BasePushProvider:
+    """Sends one notification to a batch of device tokens."""
+
+    def send(
+        self, tokens: list[str], notification: dict[str, Any], collapse_key: str
+    ) -> PushResult:
+        raise NotImplementedError
+
+
+class FakePushProvider(BasePushProvider):
+    """Records notifications in memory, for local development and tests."""
+
+    def __init__(self) -> None:
+        # per instance, and get_provider makes one per fan-out
+        self.sent: list[dict[str, Any]] = []
+
+    def send(
+        self, tokens: list[str], notification: dict[str, Any], collapse_key: str
+    ) -> PushResult:
+        self.sent.append(
+            {
+                "tokens": tokens,
+                "notification": notification,
+                "collapse_key": collapse_key,
+            }
+        )
+        return PushResult(sent=len(tokens))
+
+
+class DisabledPushProvider(BasePushProvider):
+    """Sends nothing, for deployments without a push provider yet."""
+
+    def send(
+        self, tokens: list[str], notification: dict[str, Any], collapse_key: str
+    ) -> PushResult:
+        return PushResult()
+
+
+def get_provider() -> BasePushProvider:
+    return import_string(settings.PUSH_PROVIDER)()
+
+
+def _count(metric: str, amount: int = 1) -> None:
+    if not amount:
+        return
+    key = f"push:metrics:{metric}"
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.set(key, amount, timeout=None)
+
+
+def push_metrics() -> dict[str, int]:
+    """Totals of every push counter since the cache was last flushed."""
+    values = cache.get_many([f"push:metrics:{metric}" for metric in METRICS])
+    return {metric: values.get(f"push:metrics:{metric}", 0) for metric in METRICS}
+
+
+def _burst_key(channel_id: Any) -> str:
+    return f"push:burst:{channel_id}"
+
+
+def start_burst(channel_id: Any) -> bool:
+    """Open a burst for the channel unless one is already open."""
+    _count("messages")
+    return cache.add(
+        _burst_key(channel_id), {"count": 0}, timeout=settings.PUSH_COLLAPSE_WINDOW * 2
+    )
+
+
+def add_to_burst(channel_id: Any, message_id: Any) -> None:
+    # not atomic, a lost update only makes the summary's count a bit low
+    burst = cache.get(_burst_key(channel_id)) or {"count": 0}
+    cache.set(
+        _burst_key(channel_id),
+        {"count": burst["count"] + 1, "message": str(message_id)},
+        timeout=settings.PUSH_COLLAPSE_WINDOW * 2,
+    )
+    _count("collapsed")
+
+
+def close_burst(channel_id: Any) -> tuple[str | None, int]:
+    """End a channel's burst, returning its last collapsed message and count."""
+    burst = cache.get(_burst_key(channel_id)) or {"count": 0}
+    cache.delete(_burst_key(channel_id))
+    return burst.get("message"), burst["count"]
+
+
+def notification_for(message: Message, collapsed: int = 0) -> dict[str, Any]:
+    title = message.channel.title or message.created_by.name
+    body = message.text[: settings.INBOX_PREVIEW_LENGTH]
+    if collapsed > 1:
+        body = f"{collapsed} new messages"
+    return {
+        "title": title,
+        "body": body,
+        "data": {
+            "channel": str(message.channel_id),
+            "message": str(message.id),
+        },
+    }
+
+
+def push_message(message_id: Any, collapsed: int = 0) -> PushResult:
+    """Push a message to every offline, unmuted member's devices."""
+    message = (
+        Message.objects.filter(id=message_id)
+        .select_related("channel", "created_by")
+        .first()
+    )
+    if message is None:
+        return PushResult()
+
+    started = time.monotonic()
+    memberships = list(
+        ChannelMembership.objects.filter(channel_id=message.channel_id)
+        .exclude(user_id=message.created_by_id)
+        .values_list("user_id", "is_muted")
+    )
+    recipient_ids = [user_id for user_id, is_muted in memberships if not is_muted]
+    _count("skipped_muted", len(memberships) - len(recipient_ids))
+
+    online = presence.online_user_ids(recipient_ids)
+    recipient_ids = [user_id for user_id in recipient_ids if str(user_id) not in online]
+    _count("skipped_online", len(online))
+    _count("recipients", len(recipient_ids))
+
+    tokens = list(
+        UserDevice.objects.filter(user_id__in=recipient_ids).values_list(
+            "token", flat=True
+        )
+    )
+    notification = notification_for(message, collapsed)
+    provider = get_provider()
+
+    result = PushResult()
+    for start in range(0, len(tokens), settings.PUSH_BATCH_SIZE):
+        end = start + settings.PUSH_BATCH_SIZE
+        batch = tokens[start:end]
+        try:
+            batch_result = provider.send(
+                batch, notification, collapse_key=str(message.channel_id)
+            )
+        except Exception as error:
+            logger.error(
+                msg=(
+                    "bmoves::messaging::push::push_message::"
+                    "Error occured while sending push notifications"
+                ),
+                extra={"details": str(error)},
+            )
+            batch_result = PushResult(failed=len(batch))
+
+        result.sent += batch_result.sent
+        result.failed += batch_result.failed
+        result.invalid_tokens += batch_result.invalid_tokens
+        _count("batches")
+
+    if result.invalid_tokens:
+        UserDevice.objects.filter(token__in=result.invalid_tokens).delete()
+
+    _count("notifications", result.sent)
+    _count("failures", result.failed)
+    _count("invalid_tokens", len(result.invalid_tokens))
+
+    elapsed = time.monotonic() - started
+    logger.info(
+        msg="bmoves::messaging::push::push_message::Push fan-out done",
+        extra={
+            "channel": str(message.channel_id),
+            "devices": len(tokens),
+            "sent": result.sent,
+            "failed": result.failed,
+            "seconds": round(elapsed, 3),
+            "devices_per_second": round(len(tokens) / elapsed) if elapsed else None,
+        },
+    )
+    return result
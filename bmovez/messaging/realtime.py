@@ -0,0 +1,230 @@
+"""Centrifugo publishing.
+
+Channel events (messages, reactions) go to the channel's own centrifugo
+channel, named after its id. Events about a user's inbox and memberships go
+to the user's personal `user:<id>` channel, which every connection is
+subscribed to server side, so clients need not (re)subscribe to each channel
+they belong to just to keep their inbox current.
+"""
+import logging
+from collections import defaultdict
+from typing import Any, Iterable
+
+from cent import CentException, Client, ResponseError
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from bmovez.messaging import events, inbox
+from bmovez.messaging.api.v1 import constants
+from bmovez.messaging.models import Channel, ChannelMembership, Message
+from bmovez.users.models import User
+
+logger = logging.getLogger()
+
+PERSONAL_CHANNEL_NAMESPACE = "user"
+
+
+def personal_channel(user_id: Any) -> str:
+    return f"{PERSONAL_CHANNEL_NAMESPACE}:{user_id}"
+
+
+class CentWrapper:
+    def __init__(self):
+        self.client = Client(
+            address=settings.CENTRIFUGO_API_ADDRESS,
+            api_key=settings.CENTRIFUGO_API_KEY,
+            timeout=0.5,
+        )
+
+    def _call(self, method: str, params: dict[str, Any]) -> dict[str, Any] | None:
+        reply = self.client.send(method, params)[0]
+        if reply.get("error"):
+            raise ResponseError(reply["error"])
+        return reply.get("result")
+
+    def publish(
+        self,
+        action: str,
+        channel: Channel,
+        data: dict[str, Any],
+        user: User | None,
+    ) -> dict[str, Any] | None:
+        """Publish a message to centrifugo.
+
+        Publications are kept in the channel's history stream so reconnecting
+        clients can recover them. Returns the publication's stream position.
+        """
+
+        event = events.envelope(action, data, user.id if user else None)
+
+        try:
+            result = self._call(
+                "publish", {"channel": str(channel.id), **events.encode(event)}
+            )
+        except (CentException, TypeError):
+            logger.error(
+                msg=(
+                    "bmoves::messging::realtime::CentWrapper::publish::"
+                    "Error occured while publishin data to centrifugo"
+                ),
+            )
+            return None
+
+        if not result or "offset" not in result:
+            return None
+
+        position = {"offset": result["offset"], "epoch": result.get("epoch", "")}
+        cache.set(
+            _stream_position_key(channel.id),
+            position,
+            timeout=settings.CENTRIFUGO_HISTORY_TTL,
+        )
+        return position
+
+    def publish_on_commit(self, **kwargs: Any) -> None:
+        """Publish once the data the event describes is visible to readers."""
+        transaction.on_commit(lambda: self.publish(**kwargs))
+
+    def broadcast(
+        self,
+        action: str,
+        channels: list[str],
+        data: dict[str, Any],
+        user: User | None = None,
+    ) -> None:
+        """Send one event to many centrifugo channels in a single API call."""
+
+        if not channels:
+            return
+
+        event = events.envelope(action, data, user.id if user else None)
+
+        try:
+            self._call("broadcast", {"channels": channels, **events.encode(event)})
+        except (CentException, TypeError):
+            logger.error(
+                msg=(
+                    "bmoves::messging::realtime::CentWrapper::broadcast::"
+                    "Error occured while broadcasting data to centrifugo"
+                ),
+            )
+
+    def publish_to_users(
+        self,
+        action: str,
+        user_ids: Iterable[Any],
+        data: dict[str, Any],
+        user: User | None = None,
+    ) -> None:
+        """Send one event to the personal channels of many users at once."""
+        self.broadcast(
+            action=action,
+            channels=[personal_channel(user_id) for user_id in user_ids],
+            data=data,
+            user=user,
+        )
+
+    def publish_to_users_on_commit(self, **kwargs: Any) -> None:
+        transaction.on_commit(lambda: self.publish_to_users(**kwargs))
+
+    def presence_stats(self, channels: list[str]) -> dict[str, dict[str, int]]:
+        """Presence stats of many channels in a single API request.
+
+        Channels whose stats could not be fetched are left out.
+        """
+        for channel in channels:
+            self.client.add(
+                "presence_stats", self.client.get_presence_stats_params(channel)
+            )
+
+        try:
+            replies = self.client.send()
+        except (CentException, TypeError):
+            logger.error(
+                msg=(
+                    "bmoves::messging::realtime::CentWrapper::presence_stats::"
+                    "Error occured while fetching presence stats from centrifugo"
+                ),
+            )
+            return {}
+
+        stats = {}
+        for channel, reply in zip(channels, replies):
+            result = reply.get("result")
+            if result:
+                stats[channel] = {
+                    "num_clients": result.get("num_clients", 0),
+                    "num_users": result.get("num_users", 0),
+                }
+        return stats
+
+
+def _stream_position_key(channel_id: Any) -> str:
+    return f"cent:position:{channel_id}"
+
+
+def get_stream_position(channel_id: Any) -> dict[str, Any] | None:
+    """Last known centrifugo stream position of a channel.
+
+    Read it before querying the data a response is built from: a client that
+    subscribes from this position may then replay events it already has (which
+    payloads are safe for) but can never miss one.
+    """
+    return cache.get(_stream_position_key(channel_id))
+
+
+def _publish_join(cent: CentWrapper, user_ids: list[Any], summary: dict) -> None:
+    summary.pop("score", None)
+    cent.publish_to_users(
+        action=constants.CENTRIFUGO_ACTION_CHANNEL_JOIN,
+        user_ids=user_ids,
+        data=summary,
+    )
+
+
+def notify_memberships_added(memberships: Iterable[ChannelMembership]) -> None:
+    """Tell new members about the channel so it shows up in their inbox."""
+    members_by_channel: dict[Any, list[Any]] = defaultdict(list)
+    for membership in memberships:
+        members_by_channel[membership.channel_id].append(membership.user_id)
+
+    cent = CentWrapper()
+    for channel_id, user_ids in members_by_channel.items():
+        summaries = inbox.build_inbox(user_ids[0], channel_ids=[channel_id])
+        if not summaries:
+            continue
+
+        if summaries[0]["type"] != Channel.CHANNEL_TYPE_DM:
+            # a fresh member's summary is the same for everyone
+            _publish_join(cent, user_ids, summaries[0])
+            continue
+
+        # DMs are titled after the other participant, so differ per member
+        _publish_join(cent, user_ids[:1], summaries[0])
+        for user_id in user_ids[1:]:
+            for summary in inbox.build_inbox(user_id, channel_ids=[channel_id]):
+                _publish_join(cent, [user_id], summary)
+
+
+def notify_membership_removed(user_id: Any, channel_id: Any) -> None:
+    CentWrapper().publish_to_users(
+        action=constants.CENTRIFUGO_ACTION_CHANNEL_LEAVE,
+        user_ids=[user_id],
+        data={"channel": str(channel_id)},
+    )
+
+
+def notify_message_created(message: Message) -> None:
+    """Update the inbox preview of every member with a single broadcast."""
+    member_ids = ChannelMembership.objects.filter(
+        channel_id=message.channel_id
+    ).values_list("user_id", flat=True)
+    CentWrapper().publish_to_users(
+        action=constants.CENTRIFUGO_ACTION_INBOX_MESSAGE,
+        user_ids=member_ids,
+        data={
+            "channel": str(message.channel_id),
+            "last_message": inbox.message_preview(message),
+        },
+    )
@@ -0,0 +1,225 @@
+from typing import Any
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from bmovez.messaging import blobs, inbox, realtime, tasks, threads
+from bmovez.messaging.access import invalidate_member_channels_on_commit
+from bmovez.messaging.models import (
+    ArchiveSegment,
+    Channel,
+    ChannelMembership,
+    File,
+    Message,
+    Reaction,
+)
+from bmovez.users.models import FreepbxExtentionProfile, User
+from bmovez.utils import versions
+from bmovez.utils.avatars import normalize_avatar
+
+
+def channel_version_scopes(*channel_ids: Any) -> list[str]:
+    """Stamps covering a channel: its own and the inbox of every member."""
+    member_ids = (
+        ChannelMembership.objects.filter(channel_id__in=channel_ids)
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
+    return [
+        *[versions.channel_scope(channel_id) for channel_id in channel_ids],
+        *[versions.inbox_scope(user_id) for user_id in member_ids],
+    ]
+
+
+def bump_channel_versions(*channel_ids: Any) -> None:
+    versions.bump_on_commit(lambda: channel_version_scopes(*channel_ids))
+
+
+def bump_user_channel_versions(user_id: Any) -> None:
+    """Bump every channel embedding the user's card."""
+    channel_ids = ChannelMembership.objects.filter(user_id=user_id).values_list(
+        "channel_id", flat=True
+    )
+    bump_channel_versions(*channel_ids)
+
+
+@receiver(post_save, sender=Message)
+def update_inbox_on_message_save(
+    sender: type[Message], instance: Message, created: bool, **kwargs: Any
+) -> None:
+    if created:
+        transaction.on_commit(lambda: inbox.on_message_created(instance))
+        transaction.on_commit(lambda: realtime.notify_message_created(instance))
+        transaction.on_commit(lambda: tasks.queue_message_push(instance))
+
+
+@receiver(post_delete, sender=Message)
+def update_inbox_on_message_delete(
+    sender: type[Message], instance: Message, **kwargs: Any
+) -> None:
+    channel_id = instance.channel_id
+    transaction.on_commit(lambda: inbox.on_message_deleted(channel_id))
+
+
+@receiver(pre_save, sender=File)
+def store_file_as_blob(sender: type[File], instance: File, **kwargs: Any) -> None:
+    blobs.attach_blob(instance)
+
+
+@receiver(post_save, sender=File)
+def process_file_on_save(
+    sender: type[File], instance: File, created: bool, **kwargs: Any
+) -> None:
+    if not created:
+        return
+    file_id = str(instance.id)
+    # uploaded straight to storage, so it could not be hashed on the way in;
+    # images are processed by the same task once the file is on its blob
+    if instance.file and not instance.blob_id:
+        transaction.on_commit(lambda: tasks.dedupe_file_task.delay(file_id))
+    elif instance.type == File.FILE_TYPE_IMAGE:
+        transaction.on_commit(lambda: tasks.process_image_task.delay(file_id))
+
+
+@receiver(post_delete, sender=File)
+def release_blob_on_file_delete(
+    sender: type[File], instance: File, **kwargs: Any
+) -> None:
+    if instance.blob_id:
+        blobs.release_blob(instance.blob_id)
+
+
+@receiver(post_delete, sender=ArchiveSegment)
+def delete_archive_content_on_segment_delete(
+    sender: type[ArchiveSegment], instance: ArchiveSegment, **kwargs: Any
+) -> None:
+    name = instance.content.name
+    storage = instance.content.storage
+    transaction.on_commit(lambda: storage.delete(name))
+
+
+@receiver(post_save, sender=Message)
+def update_thread_on_reply_save(
+    sender: type[Message], instance: Message, created: bool, **kwargs: Any
+) -> None:
+    if created and instance.replying_id:
+        threads.on_reply_created(instance)
+
+
+@receiver(post_delete, sender=Message)
+def update_thread_on_reply_delete(
+    sender: type[Message], instance: Message, **kwargs: Any
+) -> None:
+    if instance.replying_id:
+        threads.on_reply_deleted(instance.replying_id)
+
+
+@receiver(pre_save, sender=Channel)
+def normalize_channel_icon(
+    sender: type[Channel], instance: Channel, **kwargs: Any
+) -> None:
+    normalize_avatar(instance.icon)
+
+
+@receiver(post_save, sender=Channel)
+def update_inbox_on_channel_save(
+    sender: type[Channel], instance: Channel, created: bool, **kwargs: Any
+) -> None:
+    if not created:
+        transaction.on_commit(lambda: inbox.refresh_channel(instance.id))
+
+
+@receiver(post_save, sender=ChannelMembership)
+def update_inbox_on_membership_save(
+    sender: type[ChannelMembership],
+    instance: ChannelMembership,
+    created: bool,
+    **kwargs: Any,
+) -> None:
+    if created:
+        transaction.on_commit(lambda: inbox.on_memberships_added([instance]))
+        transaction.on_commit(lambda: realtime.notify_memberships_added([instance]))
+
+
+@receiver(post_delete, sender=ChannelMembership)
+def update_inbox_on_membership_delete(
+    sender: type[ChannelMembership], instance: ChannelMembership, **kwargs: Any
+) -> None:
+    user_id, channel_id = instance.user_id, instance.channel_id
+    transaction.on_commit(lambda: inbox.on_membership_removed(user_id, channel_id))
+    transaction.on_commit(
+        lambda: realtime.notify_membership_removed(user_id, channel_id)
+    )
+
+
+@receiver(post_save, sender=ChannelMembership)
+@receiver(post_delete, sender=ChannelMembership)
+def invalidate_member_channels_on_membership_change(
+    sender: type[ChannelMembership], instance: ChannelMembership, **kwargs: Any
+) -> None:
+    invalidate_member_channels_on_commit(instance.user_id)
+
+
+@receiver(post_save, sender=Channel)
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+@receiver(post_save, sender=Reaction)
+@receiver(post_delete, sender=Reaction)
+def bump_versions_on_channel_content_change(
+    sender: type[Channel | Message | Reaction],
+    instance: Channel | Message | Reaction,
+    **kwargs: Any,
+) -> None:
+    if isinstance(instance, Channel):
+        bump_channel_versions(instance.id)
+    elif isinstance(instance, Message):
+        bump_channel_versions(instance.channel_id)
+    else:
+        # reactions are embedded in the message payloads of the channel
+        channel_id = (
+            Message.objects.filter(id=instance.message_id)
+            .values_list("channel_id", flat=True)
+            .first()
+        )
+        bump_channel_versions(channel_id)
+
+
+@receiver(m2m_changed, sender=Message.files.through)
+@receiver(m2m_changed, sender=Message.tagged_users.through)
+def bump_versions_on_message_relations_change(
+    sender: Any, instance: Message, action: str, **kwargs: Any
+) -> None:
+    if action.startswith("post_") and isinstance(instance, Message):
+        bump_channel_versions(instance.channel_id)
+
+
+@receiver(post_save, sender=ChannelMembership)
+@receiver(post_delete, sender=ChannelMembership)
+def bump_versions_on_membership_change(
+    sender: type[ChannelMembership], instance: ChannelMembership, **kwargs: Any
+) -> None:
+    bump_channel_versions(instance.channel_id)
+    # a removed member no longer shows up in channel_version_scopes
+    versions.bump_on_commit([versions.inbox_scope(instance.user_id)])
+
+
+@receiver(post_save, sender=User)
+def bump_versions_on_user_change(
+    sender: type[User], instance: User, **kwargs: Any
+) -> None:
+    """User cards are embedded in every channel the user belongs to."""
+    if not getattr(instance, "card_changed", True):
+        return
+    bump_user_channel_versions(instance.id)
+
+
+@receiver(post_save, sender=FreepbxExtentionProfile)
+@receiver(post_delete, sender=FreepbxExtentionProfile)
+def bump_versions_on_pbx_profile_change(
+    sender: type[FreepbxExtentionProfile],
+    instance: FreepbxExtentionProfile,
+    **kwargs: Any,
+) -> None:
+    """User cards embed the pbx profile."""
+    bump_user_channel_versions(instance.user_id)
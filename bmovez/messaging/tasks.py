@@ -0,0 +1,137 @@
+from datetime import datetime
+
+from django.conf import settings
+
+from bmovez.messaging import archive, blobs, cleanup, events, images, partitions, push
+from bmovez.messaging.api.v1 import constants
+from bmovez.messaging.models import ChannelMembership, Message
+from bmovez.messaging.realtime import CentWrapper, personal_channel
+from bmovez.users.models import User
+from config.celery_app import app as CELERY_APP
+
+
+@CELERY_APP.task(name="fan_out_user_update_task")
+def fan_out_user_update_task(user_id: str) -> None:
+    """Push a user's new profile to every channel they share with others.
+
+    One query yields both the user's channels and everyone in them; the
+    event then goes to those channels and the members' personal channels in
+    a single broadcast.
+    """
+    user = User.objects.filter(id=user_id).first()
+    if user is None:
+        return
+
+    memberships = ChannelMembership.objects.filter(
+        channel__channelmembership__user_id=user_id
+    ).values_list("channel_id", "user_id")
+
+    channel_ids, member_ids = set(), {user.id}
+    for channel_id, member_id in memberships:
+        channel_ids.add(channel_id)
+        member_ids.add(member_id)
+
+    CentWrapper().broadcast(
+        action=constants.CENTRIFUGO_ACTION_USER_UPDATE,
+        channels=[
+            *[str(channel_id) for channel_id in channel_ids],
+            *[personal_channel(member_id) for member_id in member_ids],
+        ],
+        data=events.user_event(user),
+        user=user,
+    )
+
+
+@CELERY_APP.task(name="fan_out_channel_members_task")
+def fan_out_channel_members_task(
+    channel_id: str,
+    added: list[str],
+    removed: list[str],
+    initiator_id: str | None = None,
+) -> None:
+    """Tell a channel, its members and removed users who joined or left."""
+    member_ids = set(
+        ChannelMembership.objects.filter(channel_id=channel_id).values_list(
+            "user_id", flat=True
+        )
+    )
+    # removed users have no membership left but still need to hear about it
+    member_ids.update(removed)
+
+    CentWrapper().broadcast(
+        action=constants.CENTRIFUGO_ACTION_CHANNEL_MEMBERS,
+        channels=[
+            str(channel_id),
+            *[personal_channel(member_id) for member_id in member_ids],
+        ],
+        data=events.channel_members_event(channel_id, added, removed),
+        user=User.objects.filter(id=initiator_id).first() if initiator_id else None,
+    )
+
+
+def queue_message_push(message: Message) -> None:
+    """Schedule the push fan-out of a new message, collapsing bursts.
+
+    The first message of a burst is pushed right away, the rest are summed
+    up by `push_burst_task` when the collapse window closes.
+    """
+    if push.start_burst(message.channel_id):
+        push_message_task.delay(str(message.id))
+        push_burst_task.apply_async(
+            (str(message.channel_id),), countdown=settings.PUSH_COLLAPSE_WINDOW
+        )
+    else:
+        push.add_to_burst(message.channel_id, message.id)
+
+
+@CELERY_APP.task(name="push_message_task")
+def push_message_task(message_id: str, collapsed: int = 0) -> None:
+    push.push_message(message_id, collapsed=collapsed)
+
+
+@CELERY_APP.task(name="push_burst_task")
+def push_burst_task(channel_id: str) -> None:
+    message_id, collapsed = push.close_burst(channel_id)
+    if message_id:
+        push.push_message(message_id, collapsed=collapsed)
+
+
+@CELERY_APP.task(name="process_image_task")
+def process_image_task(file_id: str) -> None:
+    images.process_image(file_id)
+
+
+@CELERY_APP.task(name="dedupe_file_task")
+def dedupe_file_task(file_id: str) -> None:
+    blobs.dedupe_file(file_id)
+    # after deduplication, which may delete the object the upload went to
+    images.process_image(file_id)
+
+
+@CELERY_APP.task(name="collect_garbage_task")
+def collect_garbage_task(after: str | None = None) -> None:
+    """Collect orphaned files, continuing in a new task while batches are full."""
+    report = cleanup.collect_garbage(
+        after=datetime.fromisoformat(after) if after else None
+    )
+    if max(report["files"], report["blobs"], report["sessions"]) >= (
+        settings.FILE_GC_BATCH_SIZE
+    ):
+        collect_garbage_task.delay(
+            report["after"].isoformat() if report["after"] else after
+        )
+
+
+@CELERY_APP.task(name="create_message_partitions_task")
+def create_message_partitions_task() -> None:
+    partitions.create_monthly_partitions()
+
+
+@CELERY_APP.task(name="archive_messages_task")
+def archive_messages_task() -> None:
+    """Archive old messages, continuing in a new task while runs archive any."""
+    if archive.archive_old_messages(
+        settings.MESSAGE_ARCHIVE_SEGMENTS_PER_RUN,
+        settings.MESSAGE_ARCHIVE_TIME_BUDGET,
+    ):
+        archive_messages_task.delay()
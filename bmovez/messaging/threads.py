@@ -0,0 +1,34 @@
+"""Denormalized thread counters.
+
+Every message keeps the number of replies it has and the time of the latest
+one, so message pages show thread summaries without counting replies. The
+counters are updated with F() expressions in the reply's own transaction,
+which keeps concurrent replies from losing increments.
+"""
+from typing import Any
+
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Greatest
+
+from bmovez.messaging.models import Message
+
+
+def on_reply_created(reply: Message) -> None:
+    Message.objects.filter(id=reply.replying_id).update(
+        reply_count=F("reply_count") + 1,
+        # a concurrent, older reply must not move it back
+        last_reply_at=Case(
+            When(last_reply_at__gt=reply.datetime_created, then=F("last_reply_at")),
+            default=Value(reply.datetime_created),
+        ),
+    )
+
+
+def on_reply_deleted(parent_id: Any) -> None:
+    latest_reply = Message.objects.filter(replying_id=OuterRef("id")).order_by(
+        "-datetime_created"
+    )
+    Message.objects.filter(id=parent_id).update(
+        reply_count=Greatest(F("reply_count") - 1, 0),
+        last_reply_at=Subquery(latest_reply.values("datetime_created")[:1]),
+    )
@@ -0,0 +1,362 @@
+"""Direct-to-storage uploads for message files.
+
+Clients ask for an upload, send the bytes straight to S3 with the returned
+presigned POST and then complete the upload, which checks the stored object
+before creating the `File` row. No upload goes through a django worker.
+
+The upload token is signed and carries the object key, the file type and the
+declared size and content type, so completion trusts nothing the client sends
+besides the token itself.
+
+Large documents use resumable sessions instead: chunks are PUT in any order,
+retried individually and assembled on completion. Sessions map onto S3
+multipart uploads, or onto chunk files on disk with filesystem storage.
+"""
+import os
+import posixpath
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+from typing import Any, BinaryIO
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core import signing
+from django.core.files import File as DjangoFile
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from bmovez.messaging.models import File, UploadChunk, UploadSession
+from bmovez.users.models import User
+from bmovez.utils.storages import object_key, user_directory_path
+
+UPLOAD_TOKEN_SALT = "bmovez.messaging.uploads"
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """The upload can not be presigned or completed."""
+
+
+def get_storage() -> Any:
+    return File._meta.get_field("file").storage
+
+
+def supports_direct_uploads() -> bool:
+    return isinstance(get_storage(), S3Boto3Storage)
+
+
+def upload_key(user: User, filename: str) -> str:
+    """Storage name of a new upload, unique so uploads never overwrite."""
+    return user_directory_path(
+        File(created_by=user),
+        f"{uuid.uuid4().hex}/{get_valid_filename(filename)}",
+    )
+
+
+def presign_upload(
+    user: User, filename: str, file_type: str, content_type: str, size: int
+) -> dict[str, Any]:
+    """A presigned POST for one object plus the token completing it."""
+    if not supports_direct_uploads():
+        raise UploadError("Direct uploads are not supported by the file storage.")
+
+    storage = get_storage()
+    key = upload_key(user, filename)
+    # content type and size are enforced by S3 itself
+    post = storage.bucket.meta.client.generate_presigned_post(
+        Bucket=storage.bucket_name,
+        Key=object_key(storage, key),
+        Fields={"Content-Type": content_type},
+        Conditions=[
+            {"Content-Type": content_type},
+            ["content-length-range", size, size],
+        ],
+        ExpiresIn=settings.FILE_UPLOAD_URL_EXPIRY,
+    )
+    token = signing.dumps(
+        {
+            "key": key,
+            "user": str(user.id),
+            "type": file_type,
+            "content_type": content_type,
+            "size": size,
+        },
+        salt=UPLOAD_TOKEN_SALT,
+    )
+    return {
+        "url": post["url"],
+        "fields": post["fields"],
+        "token": token,
+        "expires_in": settings.FILE_UPLOAD_URL_EXPIRY,
+    }
+
+
+def read_upload_token(user: User, token: str) -> dict[str, Any]:
+    try:
+        upload = signing.loads(
+            token,
+            salt=UPLOAD_TOKEN_SALT,
+            # completion may come a while after the presigned POST expired
+            max_age=settings.FILE_UPLOAD_URL_EXPIRY * 2,
+        )
+    except signing.BadSignature:
+        raise UploadError("Invalid or expired upload token.")
+
+    if upload["user"] != str(user.id):
+        raise UploadError("Invalid or expired upload token.")
+    return upload
+
+
+def complete_upload(user: User, token: str) -> File:
+    """Create the File of an uploaded object once its size and type check out."""
+    upload = read_upload_token(user, token)
+    existing = File.objects.filter(created_by=user, file=upload["key"]).first()
+    if existing:
+        # the client retried a completion that already went through
+        return existing
+
+    storage = get_storage()
+    try:
+        head = storage.bucket.meta.client.head_object(
+            Bucket=storage.bucket_name, Key=object_key(storage, upload["key"])
+        )
+    except ClientError:
+        raise UploadError("The file has not been uploaded.")
+
+    if head["ContentLength"] != upload["size"]:
+        raise UploadError("The uploaded file does not have the declared size.")
+    if head.get("ContentType") != upload["content_type"]:
+        raise UploadError("The uploaded file does not have the declared type.")
+
+    return File.objects.create(
+        created_by=user,
+        type=upload["type"],
+        file=upload["key"],
+        filename=posixpath.basename(upload["key"]),
+    )
+
+
+def _copy(source: BinaryIO, destination: BinaryIO, length: int) -> int:
+    """Copy at most length + 1 bytes, enough to tell an oversized chunk."""
+    copied = 0
+    while copied <= length:
+        block = source.read(min(COPY_BUFFER_SIZE, length + 1 - copied))
+        if not block:
+            break
+        destination.write(block)
+        copied += len(block)
+    return copied
+
+
+class S3MultipartBackend:
+    """Chunks are the parts of an S3 multipart upload."""
+
+    def __init__(self) -> None:
+        self.storage = get_storage()
+        self.client = self.storage.bucket.meta.client
+
+    def _params(self, session: UploadSession) -> dict[str, Any]:
+        return {
+            "Bucket": self.storage.bucket_name,
+            "Key": object_key(self.storage, session.key),
+        }
+
+    def start(self, session: UploadSession) -> None:
+        upload = self.client.create_multipart_upload(
+            **self._params(session),
+            **self.storage.get_object_parameters(session.key),
+            ContentType=session.content_type,
+        )
+        session.upload_id = upload["UploadId"]
+
+    def write_chunk(
+        self, session: UploadSession, number: int, stream: BinaryIO, length: int
+    ) -> str:
+        # spooled so a chunk only stays in memory while it is small
+        with tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        ) as chunk:
+            if _copy(stream, chunk, length) != length:
+                raise UploadError("The chunk does not have the expected size.")
+            chunk.seek(0)
+            part = self.client.upload_part(
+                **self._params(session),
+                UploadId=session.upload_id,
+                PartNumber=number,
+                Body=chunk,
+                ContentLength=length,
+            )
+        return part["ETag"]
+
+    def finish(self, session: UploadSession, chunks: list[UploadChunk]) -> str:
+        self.client.complete_multipart_upload(
+            **self._params(session),
+            UploadId=session.upload_id,
+            MultipartUpload={
+                "Parts": [
+                    {"ETag": chunk.etag, "PartNumber": chunk.number} for chunk in chunks
+                ]
+            },
+        )
+        head = self.client.head_object(**self._params(session))
+        if head["ContentLength"] != session.size:
+            raise UploadError("The uploaded file does not have the declared size.")
+        return session.key
+
+    def abort(self, session: UploadSession) -> None:
+        try:
+            self.client.abort_multipart_upload(
+                **self._params(session), UploadId=session.upload_id
+            )
+        except ClientError:
+            # already completed or aborted
+            pass
+
+
+class FileSystemChunkBackend:
+    """Chunks are files under FILE_UPLOAD_CHUNKS_ROOT, joined on completion."""
+
+    def _directory(self, session: UploadSession) -> str:
+        return os.path.join(settings.FILE_UPLOAD_CHUNKS_ROOT, str(session.id))
+
+    def _path(self, session: UploadSession, number: int) -> str:
+        return os.path.join(self._directory(session), str(number))
+
+    def start(self, session: UploadSession) -> None:
+        os.makedirs(self._directory(session), exist_ok=True)
+
+    def write_chunk(
+        self, session: UploadSession, number: int, stream: BinaryIO, length: int
+    ) -> str:
+        path = self._path(session, number)
+        # written aside and renamed so a dropped request never leaves half a chunk
+        with tempfile.NamedTemporaryFile(
+            dir=self._directory(session), delete=False
+        ) as chunk:
+            copied = _copy(stream, chunk, length)
+        if copied != length:
+            os.remove(chunk.name)
+            raise UploadError("The chunk does not have the expected size.")
+        os.replace(chunk.name, path)
+        return ""
+
+    def finish(self, session: UploadSession, chunks: list[UploadChunk]) -> str:
+        with tempfile.TemporaryFile() as assembled:
+            for chunk in chunks:
+                with open(self._path(session, chunk.number), "rb") as part:
+                    shutil.copyfileobj(part, assembled, COPY_BUFFER_SIZE)
+            if assembled.tell() != session.size:
+                raise UploadError("The uploaded file does not have the declared size.")
+            assembled.seek(0)
+            name = get_storage().save(session.key, DjangoFile(assembled))
+        self.abort(session)
+        return name
+
+    def abort(self, session: UploadSession) -> None:
+        shutil.rmtree(self._directory(session), ignore_errors=True)
+
+
+def get_chunk_backend() -> S3MultipartBackend | FileSystemChunkBackend:
+    if supports_direct_uploads():
+        return S3MultipartBackend()
+    return FileSystemChunkBackend()
+
+
+def start_session(
+    user: User, filename: str, file_type: str, content_type: str, size: int
+) -> UploadSession:
+    session = UploadSession(
+        created_by=user,
+        type=file_type,
+        filename=filename,
+        content_type=content_type,
+        size=size,
+        chunk_size=settings.FILE_UPLOAD_CHUNK_SIZE,
+        key=upload_key(user, filename),
+    )
+    backend = get_chunk_backend()
+    backend.start(session)
+    try:
+        session.save()
+    except Exception:
+        backend.abort(session)
+        raise
+    return session
+
+
+def missing_chunks(session: UploadSession) -> list[int]:
+    received = set(session.uploadchunk_set.values_list("number", flat=True))
+    return [
+        number for number in range(1, session.chunk_count + 1) if number not in received
+    ]
+
+
+def write_chunk(
+    session: UploadSession, number: int, stream: BinaryIO, length: int
+) -> UploadChunk:
+    """Store one chunk; sending a chunk again replaces it."""
+    if session.file_id or session.completing_at:
+        raise UploadError("The upload is already complete.")
+    if not 1 <= number <= session.chunk_count:
+        raise UploadError("Invalid chunk number.")
+    if length != session.expected_chunk_size(number):
+        raise UploadError("The chunk does not have the expected size.")
+
+    etag = get_chunk_backend().write_chunk(session, number, stream, length)
+    chunk, _ = UploadChunk.objects.update_or_create(
+        session=session, number=number, defaults={"size": length, "etag": etag}
+    )
+    return chunk
+
+
+def finish_session(session_id: Any, user: User) -> File:
+    """Assemble a session's chunks into a File.
+
+    The session is claimed in a short transaction and assembled outside of
+    one, which can take minutes for the largest uploads. A claim older than
+    FILE_UPLOAD_COMPLETION_TIMEOUT is taken to be abandoned.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # serializes concurrent completions of the same session
+        session = UploadSession.objects.select_for_update().get(
+            id=session_id, created_by=user
+        )
+        if session.file_id:
+            return session.file
+        if missing_chunks(session):
+            raise UploadError("Some chunks have not been uploaded.")
+        if session.completing_at and session.completing_at > now - timedelta(
+            seconds=settings.FILE_UPLOAD_COMPLETION_TIMEOUT
+        ):
+            raise UploadError("The upload is already being completed.")
+        session.completing_at = now
+        session.save(update_fields=["completing_at", "datetime_updated"])
+
+    chunks = list(session.uploadchunk_set.order_by("number"))
+    try:
+        name = get_chunk_backend().finish(session, chunks)
+    except Exception:
+        UploadSession.objects.filter(id=session.id).update(completing_at=None)
+        raise
+
+    try:
+        with transaction.atomic():
+            session.file = File.objects.create(
+                created_by=user, type=session.type, file=name, filename=session.filename
+            )
+            session.save(update_fields=["file", "datetime_updated"])
+    except Exception:
+        get_storage().delete(name)
+        raise
+    return session.file
+
+
+def abort_session(session: UploadSession) -> None:
+    if not session.file_id:
+        get_chunk_backend().abort(session)
+    session.delete()
@@ -1,9 +1,11 @@
 from typing import Any
 
+from django.conf import settings
 from rest_framework import serializers
 
 from bmovez.team.models import Team, TeamInivitation, TeamMembership
-from bmovez.users.api.v1.serializers import UserSerializer
+from bmovez.users.api.v1.serializers import get_user_card
+from bmovez.utils.avatars import avatar_url
 
 
 class TeamSerializer(serializers.ModelSerializer):
@@ -37,7 +39,7 @@ class TeamSerializer(serializers.ModelSerializer):
             "id": str(instance.id),
             "users": [
                 {
-                    **UserSerializer(instance=membership.user).data,
+                    **get_user_card(membership.user_id),
                     "membership_data": {
                         "added_by": str(membership.added_by.id),
                         "is_admin": membership.is_admin,
@@ -50,7 +52,11 @@ class TeamSerializer(serializers.ModelSerializer):
             "channels": [str(channel.id) for channel in instance.channels.all()],
             "title": instance.title,
             "description": instance.description,
-            "icon": instance.icon.url if instance.icon else None,
+            "icon": avatar_url(
+                instance.icon,
+                self.context.get("avatar_size", settings.AVATAR_DETAIL_SIZE),
+                self.context.get("request"),
+            ),
             "datetime_created": instance.datetime_created.isoformat(),
             "datetime_updated": instance.datetime_updated.isoformat(),
         }
@@ -75,8 +81,8 @@ class TeamMembershipSerializer(serializers.ModelSerializer):
         data = {
             "id": str(instance.id),
             "team": str(instance.team.id),
-            "user": UserSerializer(instance=instance.user).data,
-            "added_by": UserSerializer(instance=instance.added_by).data,
+            "user": get_user_card(instance.user_id),
+            "added_by": get_user_card(instance.added_by_id),
             "is_admin": instance.is_admin,
             "datetime_created": instance.datetime_created.isoformat(),
             "datetime_updated": instance.datetime_updated.isoformat(),
@@ -141,8 +147,8 @@ class TeamInivitationSerializer(serializers.ModelSerializer):
     def to_representation(self, instance: TeamInivitation) -> dict[str, Any]:
         data = {
             "id": str(instance.id),
-            "created_by": UserSerializer(instance=instance.created_by).data,
-            "invitee": UserSerializer(instance=instance.invitee).data,
+            "created_by": get_user_card(instance.created_by_id),
+            "invitee": get_user_card(instance.invitee_id),
             "team": {
                 "id": str(instance.team.id),
                 "title": instance.team.title,
@@ -1,3 +1,6 @@
+from typing import Any
+
+from django.conf import settings
 from django.db.models import QuerySet
 from django.shortcuts import get_object_or_404
 from rest_framework import filters, generics, permissions
@@ -5,9 +8,11 @@ from rest_framework import filters, generics, permissions
 from bmovez.team.api.v1.permissions import TeamPermission
 from bmovez.team.api.v1.serializers import TeamInivitationSerializer, TeamSerializer
 from bmovez.team.models import Team, TeamInivitation
+from bmovez.utils import versions
+from bmovez.utils.api.v1.mixins import ConditionalGetMixin
 
 
-class TeamAPIView(generics.ListCreateAPIView):
+class TeamAPIView(ConditionalGetMixin, generics.ListCreateAPIView):
     serializer_class = TeamSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.OrderingFilter, filters.SearchFilter]
@@ -15,28 +20,43 @@ class TeamAPIView(generics.ListCreateAPIView):
     ordering = ["-datetime_updated"]
     search_fields = ["username", "name"]
 
+    def get_etag_scopes(self) -> list[str]:
+        return [versions.user_teams_scope(self.request.user.id)]
+
     def get_queryset(self) -> QuerySet[Team]:
         return self.request.user.team_set.all()
 
+    def get_serializer_context(self) -> dict[str, Any]:
+        context = super().get_serializer_context()
+        if self.request.method == "GET":
+            context["avatar_size"] = settings.AVATAR_LIST_SIZE
+        return context
+
     def perform_create(self, serializer: TeamSerializer) -> None:
         serializer.save(created_by=self.request.user)
 
 
-class RetrieveUpdateTeamAPIView(generics.RetrieveUpdateAPIView):
+class RetrieveUpdateTeamAPIView(ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     serializer_class = TeamSerializer
     permission_classes = [permissions.IsAuthenticated, TeamPermission]
 
+    def get_etag_scopes(self) -> list[str]:
+        return [versions.team_scope(self.kwargs["team_id"])]
+
     def get_object(self) -> Team:
         return get_object_or_404(Team, id=self.kwargs["team_id"])
 
 
-class TeamInvitationAPIView(generics.ListCreateAPIView):
+class TeamInvitationAPIView(ConditionalGetMixin, generics.ListCreateAPIView):
     serializer_class = TeamInivitationSerializer
     permission_classes = [permissions.IsAuthenticated, TeamPermission]
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ["datetime_updated", "datetime_created"]
     ordering = ["-datetime_updated"]
 
+    def get_etag_scopes(self) -> list[str]:
+        return [versions.team_invitations_scope(self.kwargs["team_id"])]
+
     def get_object(self) -> Team:
         self.team = get_object_or_404(Team, id=self.kwargs["team_id"])
         return self.team
@@ -60,12 +80,15 @@ class RetrieveUpdateTeamInvitationAPIView(generics.RetrieveUpdateAPIView):
         return invitation
 
 
-class UserInvitationAPIView(generics.ListAPIView):
+class UserInvitationAPIView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = TeamInivitationSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ["datetime_updated", "datetime_created"]
     ordering = ["-datetime_updated"]
 
+    def get_etag_scopes(self) -> list[str]:
+        return [versions.user_invitations_scope(self.request.user.id)]
+
     def get_queryset(self) -> QuerySet[TeamInivitation]:
         return TeamInivitation.objects.filter(invitee=self.request.user)
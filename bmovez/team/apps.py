@@ -5,3 +5,6 @@ from django.utils.translation import gettext_lazy as _
 class TeamConfig(AppConfig):
     name = "bmovez.team"
     verbose_name = _("Team")
+
+    def ready(self) -> None:
+        import bmovez.team.signals  # noqa F401
@@ -0,0 +1,111 @@
+from typing import Any
+
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from bmovez.team.models import Team, TeamInivitation, TeamMembership
+from bmovez.users.models import FreepbxExtentionProfile, User
+from bmovez.utils import versions
+from bmovez.utils.avatars import normalize_avatar
+
+
+def team_version_scopes(*team_ids: Any) -> list[str]:
+    """Stamps covering a team, its members' team lists and its invitations."""
+    member_ids = (
+        TeamMembership.objects.filter(team_id__in=team_ids)
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
+    invitee_ids = (
+        TeamInivitation.objects.filter(team_id__in=team_ids)
+        .values_list("invitee_id", flat=True)
+        .distinct()
+    )
+    return [
+        *[versions.team_scope(team_id) for team_id in team_ids],
+        *[versions.team_invitations_scope(team_id) for team_id in team_ids],
+        *[versions.user_teams_scope(user_id) for user_id in member_ids],
+        *[versions.user_invitations_scope(user_id) for user_id in invitee_ids],
+    ]
+
+
+def bump_team_versions(*team_ids: Any) -> None:
+    versions.bump_on_commit(lambda: team_version_scopes(*team_ids))
+
+
+def bump_user_team_versions(user_id: Any) -> None:
+    """Bump every team embedding the user's card."""
+    team_ids = set(
+        TeamMembership.objects.filter(user_id=user_id).values_list("team_id", flat=True)
+    )
+    team_ids.update(
+        TeamInivitation.objects.filter(
+            Q(invitee_id=user_id) | Q(created_by_id=user_id)
+        ).values_list("team_id", flat=True)
+    )
+    bump_team_versions(*team_ids)
+
+
+@receiver(pre_save, sender=Team)
+def normalize_team_icon(sender: type[Team], instance: Team, **kwargs: Any) -> None:
+    normalize_avatar(instance.icon)
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+def bump_versions_on_team_change(
+    sender: type[Team], instance: Team, **kwargs: Any
+) -> None:
+    bump_team_versions(instance.id)
+
+
+@receiver(m2m_changed, sender=Team.channels.through)
+def bump_versions_on_team_channels_change(
+    sender: Any, instance: Team, action: str, **kwargs: Any
+) -> None:
+    if action.startswith("post_") and isinstance(instance, Team):
+        bump_team_versions(instance.id)
+
+
+@receiver(post_save, sender=TeamMembership)
+@receiver(post_delete, sender=TeamMembership)
+def bump_versions_on_team_membership_change(
+    sender: type[TeamMembership], instance: TeamMembership, **kwargs: Any
+) -> None:
+    bump_team_versions(instance.team_id)
+    versions.bump_on_commit([versions.user_teams_scope(instance.user_id)])
+
+
+@receiver(post_save, sender=TeamInivitation)
+@receiver(post_delete, sender=TeamInivitation)
+def bump_versions_on_invitation_change(
+    sender: type[TeamInivitation], instance: TeamInivitation, **kwargs: Any
+) -> None:
+    versions.bump_on_commit(
+        [
+            versions.team_invitations_scope(instance.team_id),
+            versions.user_invitations_scope(instance.invitee_id),
+        ]
+    )
+
+
+@receiver(post_save, sender=User)
+def bump_versions_on_user_change(
+    sender: type[User], instance: User, **kwargs: Any
+) -> None:
+    """User cards are embedded in teams and invitations."""
+    if not getattr(instance, "card_changed", True):
+        return
+    bump_user_team_versions(instance.id)
+
+
+@receiver(post_save, sender=FreepbxExtentionProfile)
+@receiver(post_delete, sender=FreepbxExtentionProfile)
+def bump_versions_on_pbx_profile_change(
+    sender: type[FreepbxExtentionProfile],
+    instance: FreepbxExtentionProfile,
+    **kwargs: Any,
+) -> None:
+    """User cards embed the pbx profile."""
+    bump_user_team_versions(instance.user_id)
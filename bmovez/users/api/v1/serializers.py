@@ -1,4 +1,5 @@
 import logging
+import uuid
 from typing import Any
 
 import jwt
@@ -8,6 +9,7 @@ from rest_framework import serializers
 from rest_framework.request import Request
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from bmovez.messaging.realtime import personal_channel
 from bmovez.users.api.v1.uitls import (
     create_pbx_profile,
     generate_email_verification_link,
@@ -15,12 +17,21 @@ from bmovez.users.api.v1.uitls import (
     validate_email_verification_signature,
     validate_otp_pin,
 )
-from bmovez.users.models import FreepbxExtentionProfile, User
+from bmovez.users.models import FreepbxExtentionProfile, User, UserDevice
+from bmovez.utils.avatars import avatar_url
+from bmovez.utils.cache import TwoTierCache
 from bmovez.utils.managers import FreePbxConnector
 from bmovez.utils.tasks import send_mail_task
 
 logger = logging.getLogger()
 
+# read-mostly user cards embedded in channel, message and team payloads
+user_card_cache = TwoTierCache(namespace="user-card")
+# what pages embedding cards need fresh; last_login changes on every sign in
+# and is left out of the cards
+USER_CARD_FIELDS = ["username", "name", "email", "profile_picture", "phone_number"]
+USER_CARD_EXCLUDED_FIELDS = ["last_login"]
+
 
 class FreepbxExtentionProfileSerializer(serializers.ModelSerializer):
     class Meta:
@@ -95,7 +106,12 @@ class UserSerializer(serializers.ModelSerializer):
     def generate_auth_token(self, user: User) -> None:
         """Generate authentication token."""
         refresh_token = RefreshToken.for_user(user)
-        claims = {"sub": str(user.id), "info": {"email": user.email}}
+        claims = {
+            "sub": str(user.id),
+            "info": {"email": user.email},
+            # server side subscription to the user's personal channel
+            "channels": [personal_channel(user.id)],
+        }
 
         pbx_profile = getattr(user, "freepbxextentionprofile", None)
         self.token = {
@@ -145,6 +161,11 @@ class UserSerializer(serializers.ModelSerializer):
         """return proper structure for user"""
        
         data = {**super().to_representation(instance)}
+        data["profile_picture"] = avatar_url(
+            instance.profile_picture,
+            self.context.get("avatar_size", settings.AVATAR_DETAIL_SIZE),
+            self.context.get("request"),
+        )
         if self.token:
             data.update({"auth_token": self.token})
         return data
@@ -172,6 +193,27 @@ class UserSerializer(serializers.ModelSerializer):
         return value
 
 
+def get_user_card(user_id: uuid.UUID | str) -> dict[str, Any]:
+    """Return the cached UserSerializer representation of a user.
+
+    Cards leave out USER_CARD_EXCLUDED_FIELDS, which change without bumping
+    the version stamps of the pages embedding them.
+    """
+
+    def build() -> dict[str, Any]:
+        user = User.objects.select_related("freepbxextentionprofile").get(id=user_id)
+        data = UserSerializer(
+            instance=user, context={"avatar_size": settings.AVATAR_LIST_SIZE}
+        ).data
+        return {
+            key: value
+            for key, value in data.items()
+            if key not in USER_CARD_EXCLUDED_FIELDS
+        }
+
+    return user_card_cache.get_or_set(str(user_id), build)
+
+
 class SignInSerializer(serializers.Serializer):
     username = serializers.CharField(write_only=True)
     password = serializers.CharField(write_only=True)
@@ -263,3 +305,22 @@ class EmailVerificationSerializer(serializers.Serializer):
 class ThrirdPartyConnectionSerializer(serializers.Serializer):
     freepbx_ip = serializers.IPAddressField(read_only=True)
     freepbx_port = serializers.IntegerField(read_only=True)
+
+
+class UserDeviceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserDevice
+        fields = ["id", "platform", "token", "datetime_created"]
+        read_only_fields = ["id", "datetime_created"]
+        # re-registering a token moves it to the requesting user
+        extra_kwargs = {"token": {"validators": []}}
+
+    def create(self, validated_data: dict[str, Any]) -> UserDevice:
+        device, _ = UserDevice.objects.update_or_create(
+            token=validated_data["token"],
+            defaults={
+                "user": validated_data["user"],
+                "platform": validated_data["platform"],
+            },
+        )
+        return device
@@ -1,10 +1,13 @@
 from django.urls import path
 
 from bmovez.users.api.v1.views import (
+    BootstrapAPIView,
     GenerateEmailVerificationView,
     GetResetPasswordOTPAPIView,
     ResetPasswordAPIView,
     UserDetailsAPIView,
+    UserDeviceAPIView,
+    UserDeviceDetailAPIView,
     UserListAPIView,
     UserPBXSetting,
     UserSignInAPIView,
@@ -18,7 +21,14 @@ urlpatterns = [
     path("signup/", UserSignUpAPIView.as_view(), name="signup"),
     path("signin/", UserSignInAPIView.as_view(), name="signin"),
     path("me/", UserDetailsAPIView.as_view(), name="user_details"),
+    path("me/bootstrap/", BootstrapAPIView.as_view(), name="user_bootstrap"),
     path("me/pbx-settings/", UserPBXSetting.as_view(), name="user_pbx_profile"),
+    path("me/devices/", UserDeviceAPIView.as_view(), name="user_device_create"),
+    path(
+        "me/devices/<str:token>/",
+        UserDeviceDetailAPIView.as_view(),
+        name="user_device_delete",
+    ),
     path("reset-password/", ResetPasswordAPIView.as_view(), name="reset_password"),
     path(
         "reset-password/get-otp/", GetResetPasswordOTPAPIView.as_view(), name="get_otp"
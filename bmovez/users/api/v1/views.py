@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.db import transaction
 from django.db.models import QuerySet
 from django.http import HttpResponse
 from rest_framework import filters as rest_filters
@@ -12,6 +13,12 @@ from config.settings.local import  ZEGO_APP_ID, ZEGO_SECRET
 
 
 
+from bmovez.messaging import inbox
+from bmovez.messaging.api.v1.serializers import MessageSerializer
+from bmovez.messaging.api.v1.utils import latest_messages_per_channel
+from bmovez.messaging.tasks import fan_out_user_update_task
+from bmovez.team.api.v1.serializers import TeamInivitationSerializer, TeamSerializer
+from bmovez.team.models import TeamInivitation
 from bmovez.users.api.v1.serializers import (
     EmailVerificationSerializer,
     FreepbxExtentionProfileSerializer,
@@ -20,6 +27,7 @@ from bmovez.users.api.v1.serializers import (
     ResetPasswordSerializer,
     SignInSerializer,
     ThrirdPartyConnectionSerializer,
+    UserDeviceSerializer,
     UserSerializer,
 )
 from bmovez.users.api.v1.uitls import (
@@ -27,7 +35,14 @@ from bmovez.users.api.v1.uitls import (
     generate_email_verification_link,
     generate_otp_pin,
 )
-from bmovez.users.models import FreepbxExtentionProfile, ResetPasswordOTP, User
+from bmovez.users.models import (
+    FreepbxExtentionProfile,
+    ResetPasswordOTP,
+    User,
+    UserDevice,
+)
+from bmovez.utils import versions
+from bmovez.utils.api.v1.mixins import ConditionalGetMixin
 from bmovez.utils.tasks import send_mail_task
 
 
@@ -36,13 +51,75 @@ class UserSignUpAPIView(generics.CreateAPIView):
     permission_classes = [permissions.AllowAny]
 
 
-class UserDetailsAPIView(generics.RetrieveUpdateAPIView):
+class UserDetailsAPIView(ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_etag_scopes(self) -> list[str]:
+        return [versions.user_scope(self.request.user.id)]
+
     def get_object(self) -> User:
         return self.request.user
 
+    def perform_update(self, serializer: UserSerializer) -> None:
+        public_fields = {"username", "name", "profile_picture"}
+        changed = any(
+            getattr(serializer.instance, field) != value
+            for field, value in serializer.validated_data.items()
+            if field in public_fields
+        )
+        user = serializer.save()
+        if changed:
+            # channels embedding the user's card learn about it in the background
+            transaction.on_commit(lambda: fan_out_user_update_task.delay(str(user.id)))
+
+
+class BootstrapAPIView(ConditionalGetMixin, generics.GenericAPIView):
+    """Everything the app needs on cold start in a single round trip."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_payload(self, user: User) -> dict:
+        channels = inbox.read_inbox(user.id)
+        top_channel_ids = [
+            channel["id"] for channel in channels[: settings.BOOTSTRAP_TOP_CHANNELS]
+        ]
+        messages = latest_messages_per_channel(
+            top_channel_ids, limit=settings.BOOTSTRAP_MESSAGES_PER_CHANNEL
+        )
+        invitations = TeamInivitation.objects.filter(
+            invitee=user, status=TeamInivitation.INVITATION_STATUS_PENDING
+        ).select_related("team")
+
+        return {
+            "user": UserSerializer(instance=user).data,
+            "channels": channels,
+            "teams": TeamSerializer(
+                instance=user.team_set.prefetch_related("channels"), many=True
+            ).data,
+            "invitations": TeamInivitationSerializer(
+                instance=invitations, many=True
+            ).data,
+            "messages": {
+                channel_id: MessageSerializer(instance=channel_messages, many=True).data
+                for channel_id, channel_messages in messages.items()
+            },
+        }
+
+    def get_etag_scopes(self) -> list[str]:
+        user_id = self.request.user.id
+        return [
+            versions.user_scope(user_id),
+            versions.inbox_scope(user_id),
+            versions.user_teams_scope(user_id),
+            versions.user_invitations_scope(user_id),
+        ]
+
+    def get(self, request: Request) -> Response:
+        return self.conditional_get(
+            lambda: Response(data=self.get_payload(request.user))
+        )
+
 
 class UserSignInAPIView(generics.GenericAPIView):
     serializer_class = SignInSerializer
@@ -181,6 +258,25 @@ class UserPBXSetting(generics.UpdateAPIView):
         return self.request.user.freepbxextentionprofile
 
 
+class UserDeviceAPIView(generics.CreateAPIView):
+    """Register a device for push notifications."""
+
+    serializer_class = UserDeviceSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def perform_create(self, serializer: UserDeviceSerializer) -> None:
+        serializer.save(user=self.request.user)
+
+
+class UserDeviceDetailAPIView(generics.DestroyAPIView):
+    serializer_class = UserDeviceSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_field = "token"
+
+    def get_queryset(self) -> QuerySet[UserDevice]:
+        return UserDevice.objects.filter(user=self.request.user)
+
+
 class ThirdParyConnectionAPIView(generics.GenericAPIView):
     serializer_class = ThrirdPartyConnectionSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -5,3 +5,6 @@ from django.utils.translation import gettext_lazy as _
 class UsersConfig(AppConfig):
     name = "bmovez.users"
     verbose_name = _("Users")
+
+    def ready(self) -> None:
+        import bmovez.users.signals  # noqa F401
@@ -0,0 +1,47 @@
+# Generated by Django 4.0.10 on 2026-10-19 03:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0008_remove_freepbxextentionprofile_freepbx_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserDevice",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        db_index=True,
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "platform",
+                    models.CharField(
+                        choices=[("android", "ANDROID"), ("ios", "IOS")], max_length=20
+                    ),
+                ),
+                ("token", models.CharField(max_length=512, unique=True)),
+                ("datetime_created", models.DateTimeField(auto_now_add=True)),
+                ("datetime_updated", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
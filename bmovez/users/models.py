@@ -67,3 +67,24 @@ class FreepbxExtentionProfile(models.Model):
     caller_id = models.CharField(max_length=200)
     extention_password = models.TextField()
     datetime_created = models.DateTimeField(auto_now_add=True)
+
+
+class UserDevice(models.Model):
+    """A mobile device registered for push notifications."""
+
+    PLATFORM_ANDROID = "android"
+    PLATFORM_IOS = "ios"
+
+    PLATFORMS = (
+        (PLATFORM_ANDROID, "ANDROID"),
+        (PLATFORM_IOS, "IOS"),
+    )
+
+    id = models.UUIDField(
+        default=uuid.uuid4, unique=True, db_index=True, editable=False, primary_key=True
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    platform = models.CharField(max_length=20, choices=PLATFORMS)
+    token = models.CharField(max_length=512, unique=True)
+    datetime_created = models.DateTimeField(auto_now_add=True)
+    datetime_updated = models.DateTimeField(auto_now=True)
@@ -0,0 +1,69 @@
+from typing import Any
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from bmovez.users.api.v1.serializers import USER_CARD_FIELDS, user_card_cache
+from bmovez.users.models import FreepbxExtentionProfile, User
+from bmovez.utils import versions
+from bmovez.utils.avatars import normalize_avatar
+
+
+@receiver(pre_save, sender=User)
+def normalize_profile_picture(
+    sender: type[User], instance: User, **kwargs: Any
+) -> None:
+    normalize_avatar(instance.profile_picture)
+
+
+@receiver(pre_save, sender=User)
+def detect_user_card_change(
+    sender: type[User],
+    instance: User,
+    update_fields: frozenset[str] | None = None,
+    **kwargs: Any,
+) -> None:
+    """Flag saves that change USER_CARD_FIELDS as `instance.card_changed`.
+
+    Pages embedding the card only need new version stamps for those.
+    """
+    if instance._state.adding:
+        instance.card_changed = False
+    elif update_fields is not None:
+        instance.card_changed = bool(set(USER_CARD_FIELDS) & set(update_fields))
+    else:
+        old = User.objects.filter(pk=instance.pk).values(*USER_CARD_FIELDS).first()
+        instance.card_changed = old is None or any(
+            field.get_prep_value(field.value_from_object(instance)) != old[field.name]
+            for field in map(User._meta.get_field, USER_CARD_FIELDS)
+        )
+
+
+def invalidate_user_card_on_commit(user_id: Any) -> None:
+    """Drop a cached user card once the writing transaction commits.
+
+    Invalidating earlier would let a concurrent read cache the pre-commit
+    card again, for the whole TTL.
+    """
+    transaction.on_commit(lambda: user_card_cache.invalidate(str(user_id)))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_card(sender: type[User], instance: User, **kwargs: Any) -> None:
+    """Drop the cached user card whenever the user changes."""
+    invalidate_user_card_on_commit(instance.id)
+    versions.bump_on_commit([versions.user_scope(instance.id)])
+
+
+@receiver(post_save, sender=FreepbxExtentionProfile)
+@receiver(post_delete, sender=FreepbxExtentionProfile)
+def invalidate_user_card_pbx_profile(
+    sender: type[FreepbxExtentionProfile],
+    instance: FreepbxExtentionProfile,
+    **kwargs: Any,
+) -> None:
+    """User cards embed the pbx profile."""
+    invalidate_user_card_on_commit(instance.user_id)
+    versions.bump_on_commit([versions.user_scope(instance.user_id)])
@@ -0,0 +1,55 @@
+from typing import Any, Callable
+
+from django.conf import settings
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from bmovez.utils import versions
+from bmovez.utils.storages import signed_url_period
+
+
+class ConditionalGetMixin:
+    """Answer GETs with an ETag built from version stamps.
+
+    A matching `If-None-Match` gets a 304 before the view's main query or
+    serializer runs. Views list the stamp scopes their response depends on.
+    With private media the ETag also changes whenever media urls are signed
+    again, so clients never keep a body whose urls expired.
+    """
+
+    def get_etag_scopes(self) -> list[str]:
+        raise NotImplementedError
+
+    def get_etag_parts(self) -> list[str]:
+        """Anything else the response depends on that has no version stamp."""
+        return []
+
+    def get_etag(self) -> str:
+        parts = self.get_etag_parts()
+        if settings.MEDIA_PRIVATE:
+            parts = [*parts, str(signed_url_period())]
+        return versions.compute_etag(
+            self.get_etag_scopes(),
+            str(self.request.user.pk),
+            self.request.get_full_path(),
+            *parts,
+        )
+
+    def conditional_get(self, handler: Callable[[], Response]) -> Response:
+        """Return 304 when the client's copy is current, else run handler."""
+        etag = self.get_etag()
+        if_none_match = parse_etags(self.request.headers.get("If-None-Match", ""))
+
+        if etag in if_none_match or "*" in if_none_match:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        response = handler()
+        if response.status_code == status.HTTP_200_OK:
+            response["ETag"] = etag
+        return response
+
+    def get(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        get = super().get
+        return self.conditional_get(lambda: get(request, *args, **kwargs))
@@ -0,0 +1,42 @@
+from typing import Any
+
+from django.conf import settings
+from rest_framework import serializers
+
+
+class SubRequestSerializer(serializers.Serializer):
+    METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE"]
+
+    id = serializers.CharField(required=False, allow_blank=True)
+    method = serializers.ChoiceField(choices=METHODS, default="GET")
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False, allow_null=True)
+    headers = serializers.DictField(
+        child=serializers.CharField(), required=False, default=dict
+    )
+
+    def validate_path(self, value: str) -> str:
+        """Only API paths may be batched, and batches may not be nested."""
+        if not value.startswith("/api/v1/"):
+            raise serializers.ValidationError("Only /api/v1/ paths can be batched.")
+        if value.split("?")[0].rstrip("/") == "/api/v1/batch":
+            raise serializers.ValidationError("Batches can not be nested.")
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = serializers.ListField(
+        child=SubRequestSerializer(),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_REQUESTS,
+    )
+    parallel = serializers.BooleanField(
+        default=False,
+        help_text="Run consecutive GET sub-requests concurrently.",
+    )
+
+    def validate(self, attrs: dict[str, Any]) -> dict[str, Any]:
+        data = super().validate(attrs)
+        for index, sub_request in enumerate(data["requests"]):
+            sub_request.setdefault("id", str(index))
+        return data
@@ -0,0 +1,154 @@
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections, transaction
+from django.urls import Resolver404, resolve
+from rest_framework import generics, permissions, status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from bmovez.utils.api.v1.serializers import BatchSerializer
+
+logger = logging.getLogger()
+
+# long lived workers keep their database connections (CONN_MAX_AGE) between
+# batches instead of opening one per parallel sub-request
+_executor = ThreadPoolExecutor(
+    max_workers=settings.BATCH_MAX_PARALLEL, thread_name_prefix="batch"
+)
+
+
+class BatchAPIView(generics.GenericAPIView):
+    """Run several API sub-requests in one HTTP exchange.
+
+    Sub-requests reuse the caller's authentication and run in order. With
+    `parallel` set, consecutive GET sub-requests run concurrently. Each write
+    runs in its own transaction so a failing sub-request does not undo the
+    others (the url conf wraps this view with `non_atomic_requests`).
+    """
+
+    serializer_class = BatchSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request: Request) -> Response:
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        sub_requests = serializer.validated_data["requests"]
+        parallel = serializer.validated_data["parallel"]
+
+        responses: list[dict[str, Any]] = []
+        reads: list[dict[str, Any]] = []
+
+        for sub_request in sub_requests:
+            if parallel and sub_request["method"] == "GET":
+                reads.append(sub_request)
+                continue
+
+            responses.extend(self.run_reads(request, reads))
+            reads = []
+            with transaction.atomic():
+                result = self.run(request, sub_request)
+                # run() reports failures instead of raising, so the savepoint
+                # would otherwise keep whatever the sub-request wrote
+                if result["status"] >= status.HTTP_400_BAD_REQUEST:
+                    transaction.set_rollback(True)
+            responses.append(result)
+
+        responses.extend(self.run_reads(request, reads))
+        return Response(data={"responses": responses}, status=status.HTTP_200_OK)
+
+    def run_reads(
+        self, request: Request, sub_requests: list[dict[str, Any]]
+    ) -> list[dict[str, Any]]:
+        if len(sub_requests) < 2:
+            return [self.run(request, sub_request) for sub_request in sub_requests]
+
+        def run_in_thread(sub_request: dict[str, Any]) -> dict[str, Any]:
+            close_old_connections()
+            try:
+                return self.run(request, sub_request)
+            finally:
+                close_old_connections()
+
+        return list(_executor.map(run_in_thread, sub_requests))
+
+    def build_sub_request(
+        self, request: Request, sub_request: dict[str, Any]
+    ) -> WSGIRequest:
+        url = urlsplit(sub_request["path"])
+        body = b""
+        if sub_request.get("body") is not None:
+            body = json.dumps(sub_request["body"]).encode()
+
+        environ = {
+            key: value
+            for key, value in request._request.META.items()
+            if not key.startswith("wsgi.")
+            and key not in ("CONTENT_TYPE", "CONTENT_LENGTH")
+            and not key.startswith("HTTP_IF_")
+        }
+        for header, value in sub_request["headers"].items():
+            environ["HTTP_" + header.upper().replace("-", "_")] = value
+        environ.update(
+            {
+                "REQUEST_METHOD": sub_request["method"],
+                "PATH_INFO": url.path,
+                "QUERY_STRING": url.query,
+                "CONTENT_TYPE": "application/json",
+                "CONTENT_LENGTH": str(len(body)),
+                "wsgi.input": io.BytesIO(body),
+                "wsgi.url_scheme": request._request.META.get("wsgi.url_scheme", "http"),
+            }
+        )
+
+        wsgi_request = WSGIRequest(environ)
+        # share the already authenticated user instead of re-running auth
+        wsgi_request._force_auth_user = request.user
+        wsgi_request._force_auth_token = request.auth
+        return wsgi_request
+
+    def run(self, request: Request, sub_request: dict[str, Any]) -> dict[str, Any]:
+        result: dict[str, Any] = {"id": sub_request["id"]}
+
+        try:
+            match = resolve(urlsplit(sub_request["path"]).path)
+        except Resolver404:
+            return {**result, "status": status.HTTP_404_NOT_FOUND, "body": None}
+
+        try:
+            response = match.func(
+                self.build_sub_request(request, sub_request),
+                *match.args,
+                **match.kwargs,
+            )
+        except Exception as error:
+            logger.error(
+                msg=(
+                    "bmoves::utils::api::v1::views::BatchAPIView::run::"
+                    "Unhandled error while running batch sub-request"
+                ),
+                extra={"path": sub_request["path"], "details": str(error)},
+            )
+            return {
+                **result,
+                "status": status.HTTP_500_INTERNAL_SERVER_ERROR,
+                "body": None,
+            }
+
+        if hasattr(response, "data"):
+            body = response.data
+        elif response.get("Content-Type", "").startswith("application/json"):
+            body = json.loads(response.content or "null")
+        else:
+            body = response.content.decode(errors="replace")
+
+        result.update({"status": response.status_code, "body": body})
+        if response.has_header("ETag"):
+            result["etag"] = response["ETag"]
+        return result
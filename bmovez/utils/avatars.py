@@ -0,0 +1,101 @@
+"""Square avatar and icon variants under content-hash keys.
+
+Uploads to `User.profile_picture`, `Channel.icon` and `Team.icon` are not
+stored as sent. They are cropped to squares of every `AVATAR_SIZES` size,
+encoded as WebP and stored under `avatars/<sha256>/<size>.webp`, and the
+field points at the largest one. The key depends only on the uploaded
+bytes, so an image uploaded many times is stored once and its urls never
+change content, which lets storage serve them as immutable.
+
+Avatars are small, so this runs in the saving request and every user card,
+channel list and realtime event sees the variants right away.
+"""
+import hashlib
+import io
+import posixpath
+import re
+from typing import Any
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models.fields.files import FieldFile
+from django.http import HttpRequest
+from PIL import Image, ImageOps
+
+AVATAR_LOCATION = "avatars"
+AVATAR_NAME_PATTERN = re.compile(
+    rf"^{AVATAR_LOCATION}/[0-9a-f]{{2}}/[0-9a-f]{{64}}/(?P<size>\w+)\.webp$"
+)
+HASH_BUFFER_SIZE = 64 * 1024
+
+
+def avatar_name(digest: str, size: str) -> str:
+    return f"{AVATAR_LOCATION}/{digest[:2]}/{digest}/{size}.webp"
+
+
+def _largest_size() -> str:
+    return max(settings.AVATAR_SIZES, key=settings.AVATAR_SIZES.get)
+
+
+def _digest(file: Any) -> str:
+    sha256 = hashlib.sha256()
+    file.seek(0)
+    for block in iter(lambda: file.read(HASH_BUFFER_SIZE), b""):
+        sha256.update(block)
+    file.seek(0)
+    return sha256.hexdigest()
+
+
+def store_avatar(field_file: FieldFile) -> str:
+    """Store the square variants of an uploaded image, returning the largest."""
+    storage = field_file.storage
+    digest = _digest(field_file.file)
+    largest = avatar_name(digest, _largest_size())
+    if storage.exists(largest):
+        return largest
+
+    with Image.open(field_file.file) as image:
+        image.draft("RGB", (settings.AVATAR_SIZES[_largest_size()],) * 2)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+        for size, pixels in settings.AVATAR_SIZES.items():
+            buffer = io.BytesIO()
+            ImageOps.fit(image, (pixels, pixels), Image.Resampling.LANCZOS).save(
+                buffer, format="WEBP", quality=settings.IMAGE_WEBP_QUALITY
+            )
+            name = avatar_name(digest, size)
+            # a concurrent upload of the same image may have stored it already
+            if not storage.exists(name):
+                storage.save(name, ContentFile(buffer.getvalue()))
+
+    return largest
+
+
+def normalize_avatar(field_file: FieldFile) -> None:
+    """Swap a freshly uploaded image for its stored square variants.
+
+    Meant for pre_save, before the file field would store the upload itself.
+    """
+    if not field_file or field_file._committed:
+        return
+
+    field_file.name = store_avatar(field_file)
+    field_file._committed = True
+
+
+def avatar_url(
+    field_file: FieldFile | None, size: str, request: HttpRequest | None = None
+) -> str | None:
+    """Url of one size of an avatar, or of the original for older uploads."""
+    if not field_file:
+        return None
+
+    if AVATAR_NAME_PATTERN.match(field_file.name):
+        directory = posixpath.dirname(field_file.name)
+        url = field_file.storage.url(posixpath.join(directory, f"{size}.webp"))
+    else:
+        url = field_file.url
+    # absolute like drf's own file fields
+    return request.build_absolute_uri(url) if request else url
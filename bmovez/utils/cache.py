@@ -0,0 +1,381 @@
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable
+
+from django.conf import settings
+from django.core.cache import cache as shared_cache
+
+logger = logging.getLogger()
+
+_MISSING = object()
+
+
+def get_redis_connection_or_none(alias: str = "default") -> Any:
+    """Return the raw redis client behind a django-redis cache or None."""
+
+    backend = settings.CACHES.get(alias, {}).get("BACKEND", "")
+    if not backend.startswith("django_redis"):
+        return None
+
+    from django_redis import get_redis_connection
+
+    return get_redis_connection(alias)
+
+
+def _acquire_lock(lock_key: str) -> str | None:
+    """Try to take a short lived rebuild lock, returning its token."""
+    token = uuid.uuid4().hex
+    if shared_cache.add(lock_key, token, settings.SINGLE_FLIGHT_LOCK_TIMEOUT):
+        return token
+    return None
+
+
+def _lock_held(lock_key: str) -> bool:
+    """Whether a failed _acquire_lock lost to another caller.
+
+    Otherwise the cache itself is unavailable (django-redis ignores its
+    errors), and waiting for a rebuild that can never be cached is pointless.
+    """
+    return shared_cache.get(lock_key) is not None
+
+
+def _release_lock(lock_key: str, token: str) -> None:
+    # only release the lock if it has not expired and been taken by someone else
+    if shared_cache.get(lock_key) == token:
+        shared_cache.delete(lock_key)
+
+
+def _wait_for(fetch: Callable[[], Any]) -> Any:
+    """Poll fetch until it returns something or the wait budget is spent."""
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(settings.SINGLE_FLIGHT_POLL_INTERVAL)
+        value = fetch()
+        if value is not _MISSING:
+            return value
+    return _MISSING
+
+
+def _should_recompute(delta: float, expires_at: float, beta: float) -> bool:
+    """Probabilistic early expiration (XFetch).
+
+    The closer an entry gets to its expiry and the longer it took to build,
+    the more likely a caller is picked to rebuild it ahead of time, which
+    spreads rebuilds out instead of having them all happen at expiry.
+    """
+    # 1 - random() lies in (0, 1] so the log is always defined
+    return time.time() - delta * beta * math.log(1.0 - random.random()) >= expires_at
+
+
+def single_flight(
+    key: str,
+    builder: Callable[[], Any],
+    timeout: int,
+    beta: float | None = None,
+) -> Any:
+    """Return the cached value for key, letting a single caller rebuild it.
+
+    Values are kept in the shared cache for `SINGLE_FLIGHT_STALE_TIMEOUT`
+    seconds past their logical expiry. While one caller holds the rebuild lock
+    everyone else is served the stale value, or waits briefly for the fresh
+    one when there is nothing to serve.
+    """
+    beta = settings.SINGLE_FLIGHT_BETA if beta is None else beta
+    entry_key, lock_key = f"sf:{key}", f"sf:{key}:lock"
+
+    entry = shared_cache.get(entry_key)
+    if entry is not None and not _should_recompute(entry[1], entry[2], beta):
+        return entry[0]
+
+    token = _acquire_lock(lock_key)
+    if token is None:
+        if entry is not None:
+            return entry[0]
+        if not _lock_held(lock_key):
+            return builder()
+
+        def fetch() -> Any:
+            fresh = shared_cache.get(entry_key)
+            return _MISSING if fresh is None else fresh[0]
+
+        value = _wait_for(fetch)
+        if value is not _MISSING:
+            return value
+        # the rebuilder is too slow, do not keep the client waiting any longer
+        return builder()
+
+    try:
+        started = time.time()
+        value = builder()
+        delta = time.time() - started
+        shared_cache.set(
+            entry_key,
+            (value, delta, time.time() + timeout),
+            timeout + settings.SINGLE_FLIGHT_STALE_TIMEOUT,
+        )
+    finally:
+        _release_lock(lock_key, token)
+
+    return value
+
+
+def invalidate_single_flight(key: str) -> None:
+    """Drop a value cached through `single_flight`."""
+    shared_cache.delete(f"sf:{key}")
+
+
+class LocalLRUCache:
+    """Bounded, thread safe, in-process LRU cache with per entry expiry."""
+
+    def __init__(self, max_entries: int, timeout: float) -> None:
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data: OrderedDict[str, tuple[float, int, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> tuple[int, Any] | None:
+        """Return (version, value) for key or None when absent or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+
+            expires_at, version, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+
+            self._data.move_to_end(key)
+            return version, value
+
+    def set(self, key: str, version: int, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, version, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def evict(self, key: str, below_version: int | None = None) -> None:
+        """Drop key, optionally only when the cached version is older."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return
+            if below_version is None or entry[1] < below_version:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TwoTierCache:
+    """In-process LRU in front of the shared (redis) django cache.
+
+    Every key carries a version counter in the shared cache. Writers call
+    `invalidate` which bumps the version, drops the shared entry and broadcasts
+    the new version over redis pub/sub so every worker evicts its local copy.
+    Local entries also expire after `local_timeout` seconds as a safety net for
+    lost pub/sub messages.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        timeout: int | None = None,
+        local_timeout: float | None = None,
+        max_entries: int | None = None,
+    ) -> None:
+        self.namespace = namespace
+        self.timeout = timeout or settings.TWO_TIER_CACHE_TIMEOUT
+        self.local = LocalLRUCache(
+            max_entries=max_entries or settings.TWO_TIER_CACHE_LOCAL_MAX_ENTRIES,
+            timeout=local_timeout or settings.TWO_TIER_CACHE_LOCAL_TIMEOUT,
+        )
+        self.counters = {
+            "local_hits": 0,
+            "local_misses": 0,
+            "shared_hits": 0,
+            "shared_misses": 0,
+        }
+        _registry[namespace] = self
+
+    def _entry_key(self, key: str) -> str:
+        return f"tt:{self.namespace}:entry:{key}"
+
+    def _version_key(self, key: str) -> str:
+        return f"tt:{self.namespace}:version:{key}"
+
+    def _count(self, counter: str) -> None:
+        # plain int increments are good enough for monitoring counters
+        self.counters[counter] += 1
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the cached value for key, checking the local tier first."""
+        _ensure_subscriber()
+
+        local_entry = self.local.get(key)
+        if local_entry is not None:
+            self._count("local_hits")
+            return local_entry[1]
+        self._count("local_misses")
+
+        entry_key, version_key = self._entry_key(key), self._version_key(key)
+        shared = shared_cache.get_many([entry_key, version_key])
+        current_version = shared.get(version_key, 0)
+        entry = shared.get(entry_key)
+
+        if entry is None or entry[0] != current_version:
+            self._count("shared_misses")
+            return default
+
+        self._count("shared_hits")
+        self.local.set(key, entry[0], entry[1])
+        return entry[1]
+
+    def set(self, key: str, value: Any, version: int | None = None) -> None:
+        """Store value in both tiers.
+
+        Pass the version read before building the value so that a concurrent
+        invalidation is not overwritten by a stale rebuild.
+        """
+        if version is None:
+            version = shared_cache.get(self._version_key(key), 0)
+
+        shared_cache.set(self._entry_key(key), (version, value), self.timeout)
+        self.local.set(key, version, value)
+
+    def get_or_set(self, key: str, builder: Callable[[], Any]) -> Any:
+        """Return the cached value for key or build and cache it.
+
+        Only one worker rebuilds a missing key at a time, the others wait
+        briefly for its result.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        lock_key = f"tt:{self.namespace}:lock:{key}"
+        token = _acquire_lock(lock_key)
+        if token is None:
+            if not _lock_held(lock_key):
+                return builder()
+            value = _wait_for(lambda: self.get(key, _MISSING))
+            if value is not _MISSING:
+                return value
+            return builder()
+
+        try:
+            version = shared_cache.get(self._version_key(key), 0)
+            value = builder()
+            self.set(key, value, version=version)
+        finally:
+            _release_lock(lock_key, token)
+
+        return value
+
+    def invalidate(self, key: str) -> None:
+        """Bump the key's version and tell every worker to drop it."""
+        version_key = self._version_key(key)
+        # the version counter must outlive the entries it guards
+        if not shared_cache.add(version_key, 1, timeout=None):
+            try:
+                version = shared_cache.incr(version_key)
+            except ValueError:
+                version = 1
+                shared_cache.set(version_key, version, timeout=None)
+        else:
+            version = 1
+
+        shared_cache.delete(self._entry_key(key))
+        self.local.evict(key)
+        _publish_invalidation(self.namespace, key, version)
+
+    def stats(self) -> dict[str, int]:
+        """Return per tier hit and miss counters for this process."""
+        return {**self.counters, "local_size": len(self.local)}
+
+
+_registry: dict[str, TwoTierCache] = {}
+_subscriber_lock = threading.Lock()
+_subscriber_pid: int | None = None
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    """Return counters for every two-tier cache in this process."""
+    return {namespace: cache.stats() for namespace, cache in _registry.items()}
+
+
+def _publish_invalidation(namespace: str, key: str, version: int) -> None:
+    connection = get_redis_connection_or_none()
+    if connection is None:
+        return
+
+    message = json.dumps({"namespace": namespace, "key": key, "version": version})
+    try:
+        connection.publish(settings.TWO_TIER_CACHE_INVALIDATION_CHANNEL, message)
+    except Exception as error:
+        logger.error(
+            msg=(
+                "bmoves::utils::cache::_publish_invalidation::"
+                "Error occured while publishing cache invalidation"
+            ),
+            extra={"details": str(error), "namespace": namespace},
+        )
+
+
+def _listen_for_invalidations(connection: Any) -> None:
+    while True:
+        try:
+            pubsub = connection.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(settings.TWO_TIER_CACHE_INVALIDATION_CHANNEL)
+            # drop whatever we may have missed while (re)subscribing
+            for cache in _registry.values():
+                cache.local.clear()
+
+            for message in pubsub.listen():
+                data = json.loads(message["data"])
+                cache = _registry.get(data["namespace"])
+                if cache is not None:
+                    cache.local.evict(data["key"], below_version=data["version"])
+        except Exception as error:
+            logger.error(
+                msg=(
+                    "bmoves::utils::cache::_listen_for_invalidations::"
+                    "Cache invalidation subscriber failed, retrying"
+                ),
+                extra={"details": str(error)},
+            )
+            time.sleep(1)
+
+
+def _ensure_subscriber() -> None:
+    """Start the invalidation listener once per (forked) worker process."""
+    global _subscriber_pid
+
+    if _subscriber_pid == os.getpid():
+        return
+
+    with _subscriber_lock:
+        if _subscriber_pid == os.getpid():
+            return
+
+        connection = get_redis_connection_or_none()
+        if connection is not None:
+            threading.Thread(
+                target=_listen_for_invalidations,
+                args=(connection,),
+                name="two-tier-cache-invalidation",
+                daemon=True,
+            ).start()
+        _subscriber_pid = os.getpid()
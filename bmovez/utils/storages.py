@@ -1,5 +1,28 @@
+import hashlib
+import logging
+import posixpath
+import time
+from collections.abc import Iterable
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
 from storages.backends.s3boto3 import S3Boto3Storage
 
+from bmovez.utils.avatars import AVATAR_LOCATION
+
+logger = logging.getLogger()
+
+# most keys a single S3 DeleteObjects request accepts
+S3_DELETE_BATCH_SIZE = 1000
+# signed media urls kept in each process before starting over
+SIGNED_URLS_MEMORY_SIZE = 10_000
+
+
+def signed_url_period() -> int:
+    """Number of the current MEDIA_URL_CACHE_PERIOD, urls are re-signed with it."""
+    return int(time.time()) // settings.MEDIA_URL_CACHE_PERIOD
+
 
 class StaticRootS3Boto3Storage(S3Boto3Storage):
     location = "static"
@@ -7,10 +30,133 @@ class StaticRootS3Boto3Storage(S3Boto3Storage):
 
 
 class MediaRootS3Boto3Storage(S3Boto3Storage):
+    """Media storage, private with `MEDIA_PRIVATE` except for avatars.
+
+    Private objects are served through presigned GET urls valid for
+    `MEDIA_URL_EXPIRY`. A url is signed once per object and
+    `MEDIA_URL_CACHE_PERIOD`, then reused from process memory or the cache,
+    so serializing a page of files costs one cache round trip at most and
+    clients see the same url for the whole period, which keeps them cacheable.
+    """
+
     location = "media"
     file_overwrite = False
 
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._signed_urls: dict[str, str] = {}
+        self._signed_urls_period: int | None = None
+
+    def is_private(self, name: str) -> bool:
+        # avatars show up for anyone sharing a team or channel
+        return settings.MEDIA_PRIVATE and not name.startswith(f"{AVATAR_LOCATION}/")
+
+    def url(
+        self,
+        name: str,
+        parameters: dict | None = None,
+        expire: int | None = None,
+        http_method: str | None = None,
+    ) -> str:
+        if self.is_private(name) and not (parameters or expire or http_method):
+            return self.signed_urls([name])[name]
+        return super().url(name, parameters, expire, http_method)
+
+    def _sign(self, name: str) -> str:
+        # signed against the bucket, a custom domain would need cloudfront keys
+        return self.bucket.meta.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket_name, "Key": object_key(self, name)},
+            ExpiresIn=settings.MEDIA_URL_EXPIRY,
+        )
+
+    def signed_urls(self, names: Iterable[str]) -> dict[str, str]:
+        """Signed urls of many objects, signing only those nobody signed yet."""
+        period = signed_url_period()
+        if (
+            period != self._signed_urls_period
+            or len(self._signed_urls) > SIGNED_URLS_MEMORY_SIZE
+        ):
+            self._signed_urls, self._signed_urls_period = {}, period
+
+        names = set(names)
+        missing = {
+            f"media-url:{period}:{hashlib.sha256(name.encode()).hexdigest()}": name
+            for name in names
+            if name not in self._signed_urls
+        }
+        if missing:
+            urls = cache.get_many(missing)
+            signed = {
+                key: self._sign(name)
+                for key, name in missing.items()
+                if key not in urls
+            }
+            if signed:
+                period_end = (period + 1) * settings.MEDIA_URL_CACHE_PERIOD
+                cache.set_many(signed, timeout=max(period_end - time.time(), 1))
+            for key, url in {**urls, **signed}.items():
+                self._signed_urls[missing[key]] = url
+
+        return {name: self._signed_urls[name] for name in names}
+
+    def get_object_parameters(self, name: str) -> dict:
+        params = super().get_object_parameters(name)
+        # avatar keys are content hashes, their content never changes
+        if name.startswith(f"{self.location}/{AVATAR_LOCATION}/"):
+            params["CacheControl"] = settings.AVATAR_CACHE_CONTROL
+        return params
+
 
 def user_directory_path(instance, filename):
     # file will be uploaded to MEDIA_ROOT /<user_id>/<filename>
     return f"uploads/{instance.created_by.id}/{filename}"
+
+
+def object_key(storage: S3Boto3Storage, name: str) -> str:
+    """S3 key of a storage name."""
+    return posixpath.join(storage.location, name) if storage.location else name
+
+
+def delete_objects(storage: Any, names: list[str]) -> int:
+    """Delete stored objects, returning how many could not be deleted.
+
+    On S3 names go out in multi-object deletes of up to 1000 keys, other
+    storages delete them one by one.
+    """
+    if not isinstance(storage, S3Boto3Storage):
+        for name in names:
+            storage.delete(name)
+        return 0
+
+    client = storage.bucket.meta.client
+    failed = 0
+    for start in range(0, len(names), S3_DELETE_BATCH_SIZE):
+        end = start + S3_DELETE_BATCH_SIZE
+        response = client.delete_objects(
+            Bucket=storage.bucket_name,
+            Delete={
+                "Objects": [
+                    {"Key": object_key(storage, name)} for name in names[start:end]
+                ],
+                # only failures are listed in the response
+                "Quiet": True,
+            },
+        )
+        errors = response.get("Errors", [])
+        if errors:
+            failed += len(errors)
+            logger.error(
+                msg=(
+                    "bmoves::utils::storages::delete_objects::"
+                    "Error occured while deleting objects"
+                ),
+                extra={"details": errors[:10], "failed": len(errors)},
+            )
+    return failed
+
+
+def prefetch_urls(storage: Any, names: Iterable[str]) -> None:
+    """Sign the urls of many objects at once, ahead of serializing them."""
+    if isinstance(storage, MediaRootS3Boto3Storage) and settings.MEDIA_PRIVATE:
+        storage.signed_urls(name for name in names if storage.is_private(name))
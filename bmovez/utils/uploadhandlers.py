@@ -0,0 +1,44 @@
+"""Upload handlers hashing files while they stream in.
+
+Every uploaded file gets a `sha256` attribute, so content-addressed storage
+does not read the file again to find out where it goes.
+"""
+import hashlib
+from typing import Any
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+
+
+class HashingUploadHandlerMixin:
+    def new_file(self, *args: Any, **kwargs: Any) -> None:
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data: bytes, start: int) -> bytes | None:
+        returned = super().receive_data_chunk(raw_data, start)
+        # a handler returning the chunk passes it on instead of keeping it
+        if returned is None:
+            self.sha256.update(raw_data)
+        return returned
+
+    def file_complete(self, file_size: int) -> UploadedFile | None:
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(
+    HashingUploadHandlerMixin, MemoryFileUploadHandler
+):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(
+    HashingUploadHandlerMixin, TemporaryFileUploadHandler
+):
+    pass
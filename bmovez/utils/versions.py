@@ -0,0 +1,80 @@
+import hashlib
+import uuid
+from typing import Any, Iterable
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Version stamps are opaque random tokens kept in the shared cache, one per
+# scope (a user's inbox, a channel, a team, ...). Writers replace the token
+# after commit, readers hash the tokens of the scopes a response depends on
+# into an ETag, so conditional requests are answered without touching the
+# database. A lost stamp simply gets a fresh token, which is always safe.
+
+
+def inbox_scope(user_id: Any) -> str:
+    return f"inbox:{user_id}"
+
+
+def user_scope(user_id: Any) -> str:
+    return f"user:{user_id}"
+
+
+def channel_scope(channel_id: Any) -> str:
+    return f"channel:{channel_id}"
+
+
+def team_scope(team_id: Any) -> str:
+    return f"team:{team_id}"
+
+
+def user_teams_scope(user_id: Any) -> str:
+    return f"teams:{user_id}"
+
+
+def team_invitations_scope(team_id: Any) -> str:
+    return f"team-invitations:{team_id}"
+
+
+def user_invitations_scope(user_id: Any) -> str:
+    return f"invitations:{user_id}"
+
+
+def _stamp_key(scope: str) -> str:
+    return f"stamp:{scope}"
+
+
+def bump(scopes: Iterable[str]) -> None:
+    """Give every scope a new version stamp."""
+    stamps = {_stamp_key(scope): uuid.uuid4().hex for scope in set(scopes)}
+    if stamps:
+        cache.set_many(stamps, timeout=None)
+
+
+def bump_on_commit(scopes: Iterable[str] | Any) -> None:
+    """Bump once the current transaction commits.
+
+    `scopes` may also be a callable returning the scopes, so that fan-out
+    queries run against the committed state.
+    """
+    if callable(scopes):
+        transaction.on_commit(lambda: bump(scopes()))
+    else:
+        scopes = list(scopes)
+        transaction.on_commit(lambda: bump(scopes))
+
+
+def get_stamps(scopes: list[str]) -> list[str]:
+    keys = [_stamp_key(scope) for scope in scopes]
+    stamps = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in stamps}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        stamps.update(missing)
+    return [stamps[key] for key in keys]
+
+
+def compute_etag(scopes: list[str], *parts: str) -> str:
+    """Strong ETag over the scopes' stamps and any extra request parts."""
+    digest = hashlib.md5("|".join([*get_stamps(scopes), *parts]).encode())
+    return f'"{digest.hexdigest()}"'
@@ -155,6 +155,13 @@ STATICFILES_FINDERS = [
 MEDIA_ROOT = str(APPS_DIR / "media")
 # https://docs.djangoproject.com/en/dev/ref/settings/#media-url
 MEDIA_URL = "/media/"
+# serve attachments through presigned urls instead of public objects, the
+# bucket policy must then only allow public reads under media/avatars/
+MEDIA_PRIVATE = env.bool("DJANGO_MEDIA_PRIVATE", default=False)
+# S3 caps presigned urls at 7 days, and at the lifetime of temporary credentials
+MEDIA_URL_EXPIRY = env.int("DJANGO_MEDIA_URL_EXPIRY", default=60 * 60 * 24 * 7)
+# urls are reused for this long, so they stay valid for EXPIRY - PERIOD at least
+MEDIA_URL_CACHE_PERIOD = env.int("DJANGO_MEDIA_URL_CACHE_PERIOD", default=60 * 60 * 24)
 
 # TEMPLATES
 # ------------------------------------------------------------------------------
@@ -272,6 +279,21 @@ CELERY_TASK_TIME_LIMIT = 5 * 60
 CELERY_TASK_SOFT_TIME_LIMIT = 60
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#beat-scheduler
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+# https://docs.celeryq.dev/en/stable/userguide/periodic-tasks.html#beat-entries
+CELERY_BEAT_SCHEDULE = {
+    "collect-garbage": {
+        "task": "collect_garbage_task",
+        "schedule": 60 * 60,  # seconds
+    },
+    "create-message-partitions": {
+        "task": "create_message_partitions_task",
+        "schedule": 60 * 60 * 24,  # seconds
+    },
+    "archive-messages": {
+        "task": "archive_messages_task",
+        "schedule": 60 * 60 * 24,  # seconds
+    },
+}
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#worker-send-task-events
 CELERY_WORKER_SEND_TASK_EVENTS = True
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#std-setting-task_send_sent_event
@@ -324,11 +346,158 @@ SIMPLE_JWT = {
 }
 
 
+# TWO TIER CACHE
+# ------------------------------------------------------------------------------
+# bounded in-process LRU in front of CACHES["default"], see bmovez.utils.cache
+TWO_TIER_CACHE_TIMEOUT = env.int("TWO_TIER_CACHE_TIMEOUT", default=60 * 60)
+TWO_TIER_CACHE_LOCAL_TIMEOUT = env.int("TWO_TIER_CACHE_LOCAL_TIMEOUT", default=5 * 60)
+TWO_TIER_CACHE_LOCAL_MAX_ENTRIES = env.int(
+    "TWO_TIER_CACHE_LOCAL_MAX_ENTRIES", default=4096
+)
+TWO_TIER_CACHE_INVALIDATION_CHANNEL = "bmovez:cache:invalidation"
+# single-flight rebuilds of hot cache entries, see bmovez.utils.cache.single_flight
+SINGLE_FLIGHT_LOCK_TIMEOUT = 10  # seconds a rebuilder may hold the lock
+SINGLE_FLIGHT_WAIT_TIMEOUT = 2  # seconds other callers wait for the rebuild
+SINGLE_FLIGHT_POLL_INTERVAL = 0.05
+SINGLE_FLIGHT_STALE_TIMEOUT = 5 * 60  # seconds stale values may still be served
+SINGLE_FLIGHT_BETA = 1.0  # > 1 favours earlier rebuilds
+
+
+# INBOX READ MODEL
+# ------------------------------------------------------------------------------
+INBOX_PREVIEW_LENGTH = 200  # characters of the last message kept per channel
+INBOX_REBUILD_SHARE_TIMEOUT = 10  # seconds a rebuilt inbox is shared with waiters
+
+
+# APP LAUNCH BOOTSTRAP
+# ------------------------------------------------------------------------------
+# latest BOOTSTRAP_MESSAGES_PER_CHANNEL messages of the top BOOTSTRAP_TOP_CHANNELS
+BOOTSTRAP_TOP_CHANNELS = 10
+BOOTSTRAP_MESSAGES_PER_CHANNEL = 20
+
+
+# THREADS
+# ------------------------------------------------------------------------------
+THREAD_REPLY_PREVIEWS = 3  # latest replies embedded under a message in pages
+
+
+# MESSAGE PAGES
+# ------------------------------------------------------------------------------
+# seconds the latest page of a channel is cached, per version stamp
+CHANNEL_PAGE_CACHE_TIMEOUT = 60
+
+
+# MESSAGE PARTITIONS
+# ------------------------------------------------------------------------------
+MESSAGE_PARTITIONS_AHEAD = 3  # months of partitions created in advance
+# days of history a message page first looks back over, widening in turn
+# before reading the whole channel, see ChannelMessagesAPIView
+MESSAGE_HISTORY_WINDOWS = [31, 365]
+
+
+# MESSAGE ARCHIVE
+# ------------------------------------------------------------------------------
+# days after which messages move to storage, a month at a time
+MESSAGE_ARCHIVE_AFTER = env.int("MESSAGE_ARCHIVE_AFTER", default=365 * 2)
+MESSAGE_ARCHIVE_SEGMENTS_PER_RUN = 100
+# seconds after which a run stops starting segments, see CELERY_TASK_SOFT_TIME_LIMIT
+MESSAGE_ARCHIVE_TIME_BUDGET = 30
+
+
+# IMAGE VARIANTS
+# ------------------------------------------------------------------------------
+IMAGE_THUMBNAIL_SIZES = {"small": 160, "medium": 480}  # longest side in pixels
+IMAGE_DISPLAY_SIZE = 1600
+IMAGE_WEBP_QUALITY = 80
+
+
+# AVATARS AND ICONS
+# ------------------------------------------------------------------------------
+AVATAR_SIZES = {"small": 64, "medium": 192, "large": 512}  # squares, in pixels
+AVATAR_LIST_SIZE = "small"  # user cards, channel and team lists, realtime events
+AVATAR_DETAIL_SIZE = "large"
+AVATAR_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+# UPLOADS
+# ------------------------------------------------------------------------------
+# https://docs.djangoproject.com/en/dev/ref/settings/#file-upload-handlers
+FILE_UPLOAD_HANDLERS = [
+    "bmovez.utils.uploadhandlers.HashingMemoryFileUploadHandler",
+    "bmovez.utils.uploadhandlers.HashingTemporaryFileUploadHandler",
+]
+
+
+# DIRECT UPLOADS
+# ------------------------------------------------------------------------------
+FILE_UPLOAD_URL_EXPIRY = 60 * 10  # seconds a presigned upload stays valid
+FILE_UPLOAD_MAX_SIZE = env.int("FILE_UPLOAD_MAX_SIZE", default=100_000_000)  # 100MB
+FILE_UPLOAD_IMAGE_CONTENT_TYPES = [
+    "image/jpeg",
+    "image/png",
+    "image/gif",
+    "image/webp",
+    "image/heic",
+]
+# resumable upload sessions, S3 multipart parts must be at least 5MB
+FILE_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+FILE_UPLOAD_SESSION_MAX_SIZE = env.int(
+    "FILE_UPLOAD_SESSION_MAX_SIZE", default=2_000_000_000
+)  # 2GB
+# chunks of sessions on filesystem storage
+FILE_UPLOAD_CHUNKS_ROOT = env(
+    "FILE_UPLOAD_CHUNKS_ROOT", default=str(BASE_DIR / ".upload-chunks")
+)
+# seconds after which an unfinished session completion may be taken over
+FILE_UPLOAD_COMPLETION_TIMEOUT = 15 * 60
+
+
+# GARBAGE COLLECTION
+# ------------------------------------------------------------------------------
+# age before unattached files and abandoned upload sessions are collected
+FILE_GC_GRACE_PERIOD = env.int("FILE_GC_GRACE_PERIOD", default=60 * 60 * 24)
+# rows per pass, S3 deletes up to 1000 keys per request
+FILE_GC_BATCH_SIZE = 1000
+
+
+# BATCH API
+# ------------------------------------------------------------------------------
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_PARALLEL = env.int("BATCH_MAX_PARALLEL", default=4)
+
+
 # CENTRIFUGO
 # ------------------------------------------------------------------------------
 CENTRIFUGO_TOKEN_HMAC_SECRET_KEY = env("CENTRIFUGO_TOKEN_HMAC_SECRET_KEY", default="")
 CENTRIFUGO_API_ADDRESS = env("CENTRIFUGO_API_ADDRESS", default="")
 CENTRIFUGO_API_KEY = env("CENTRIFUGO_API_KEY", default="")
+# keep in sync with history_ttl in compose/production/centrifugo/config.json
+CENTRIFUGO_HISTORY_TTL = 6 * 60 * 60
+# sent by centrifugo in the X-Centrifugo-Proxy-Secret header of proxy requests
+CENTRIFUGO_PROXY_SECRET = env("CENTRIFUGO_PROXY_SECRET", default="")
+# connections authenticated by the connect proxy are refreshed this often
+CENTRIFUGO_CONNECTION_TTL = env.int("CENTRIFUGO_CONNECTION_TTL", default=60 * 60)
+# "json" or "msgpack" (binary, for protobuf transport clients), see
+# bmovez.messaging.events
+CENTRIFUGO_EVENT_ENCODING = env("CENTRIFUGO_EVENT_ENCODING", default="json")
+
+
+# PRESENCE AND TYPING
+# ------------------------------------------------------------------------------
+PRESENCE_STATS_CACHE_TIMEOUT = 5
+# typing publications allowed per user and channel in each window (seconds)
+TYPING_RATE_LIMIT = 5
+TYPING_RATE_LIMIT_WINDOW = 5
+
+
+# PUSH NOTIFICATIONS
+# ------------------------------------------------------------------------------
+# PUSH_PROVIDER, the dotted path to a bmovez.messaging.push.BasePushProvider
+# subclass, is set per environment
+# device tokens per provider request (FCM multicast accepts up to 500)
+PUSH_BATCH_SIZE = 500
+# seconds during which further messages of a channel are collapsed into one push
+PUSH_COLLAPSE_WINDOW = 10
 
 
 # FREE PBX
@@ -47,6 +47,11 @@ INSTALLED_APPS += ["django_extensions"]  # noqa F405
 
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#task-eager-propagates
 CELERY_TASK_EAGER_PROPAGATES = True
+
+# PUSH NOTIFICATIONS
+# ------------------------------------------------------------------------------
+PUSH_PROVIDER = env("PUSH_PROVIDER", default="bmovez.messaging.push.FakePushProvider")
+
 # Your stuff...
 # ------------------------------------------------------------------------------
 DATABASES = {
@@ -1,6 +1,7 @@
 import logging
 
 import sentry_sdk
+from django.core.exceptions import ImproperlyConfigured
 from sentry_sdk.integrations.celery import CeleryIntegration
 from sentry_sdk.integrations.django import DjangoIntegration
 from sentry_sdk.integrations.logging import LoggingIntegration
@@ -130,6 +131,15 @@ ANYMAIL = {
     "SENDGRID_API_KEY": env("SENDGRID_API_KEY", default=""),
 }
 
+# PUSH NOTIFICATIONS
+# ------------------------------------------------------------------------------
+# without a provider pushes are dropped, with a warning at startup
+PUSH_PROVIDER = env(
+    "PUSH_PROVIDER", default="bmovez.messaging.push.DisabledPushProvider"
+)
+if PUSH_PROVIDER == "bmovez.messaging.push.FakePushProvider":
+    raise ImproperlyConfigured("PUSH_PROVIDER must name a real push provider")
+
 # Collectfast
 # ------------------------------------------------------------------------------
 # https://github.com/antonagestam/collectfast#installation
@@ -205,4 +215,4 @@ SPECTACULAR_SETTINGS["SERVERS"] = [  # noqa F405
 # Your stuff...
 # ------------------------------------------------------------------------------
 ZEGO_APP_ID = env("ZEGO_APP_ID")
-ZEGO_SECRET = env("ZEGO_SECRET")
\ No newline at end of file
+ZEGO_SECRET = env("ZEGO_SECRET")
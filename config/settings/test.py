@@ -28,5 +28,10 @@ EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
 # DEBUGGING FOR TEMPLATES
 # ------------------------------------------------------------------------------
 TEMPLATES[0]["OPTIONS"]["debug"] = True  # type: ignore # noqa F405
+
+# PUSH NOTIFICATIONS
+# ------------------------------------------------------------------------------
+PUSH_PROVIDER = env("PUSH_PROVIDER", default="bmovez.messaging.push.FakePushProvider")
+
 # Your stuff...
 # ------------------------------------------------------------------------------
@@ -1,9 +1,11 @@
 from django.conf import settings
 from django.conf.urls.static import static
+from django.db import transaction
 from django.urls import include, path
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
 from bmovez.users.api.v1.views import ThirdParyConnectionAPIView
+from bmovez.utils.api.v1.views import BatchAPIView
 
 urlpatterns = [
     # V1 API Endpoints
@@ -26,6 +28,12 @@ urlpatterns = [
             namespace="teams_api_v1",
         ),
     ),
+    path(
+        "api/v1/batch/",
+        # sub-requests get their own transactions, see BatchAPIView
+        transaction.non_atomic_requests(BatchAPIView.as_view()),
+        name="batch",
+    ),
     # API DOCS
     path("api/schema/", SpectacularAPIView.as_view(), name="api-schema"),
     path(
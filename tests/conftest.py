@@ -0,0 +1,43 @@
+from typing import Callable, Iterator
+from unittest import mock
+
+import pytest
+from moto import mock_aws
+
+from bmovez.messaging import uploads
+from bmovez.users.models import User
+from bmovez.utils.storages import MediaRootS3Boto3Storage
+
+
+@pytest.fixture
+def make_user(db) -> Callable[..., User]:
+    def make_user(username: str, **fields) -> User:
+        return User.objects.create(
+            username=username,
+            name=username.upper(),
+            phone_number=username,
+            email=f"{username}@example.com",
+            **fields,
+        )
+
+    return make_user
+
+
+@pytest.fixture
+def user(make_user) -> User:
+    return make_user("user")
+
+
+@pytest.fixture
+def s3_storage() -> Iterator[MediaRootS3Boto3Storage]:
+    """Media storage on an in-memory S3 bucket, used by uploads."""
+    with mock_aws():
+        storage = MediaRootS3Boto3Storage(
+            bucket_name="bucket",
+            access_key="access",
+            secret_key="secret",
+            region_name="us-east-1",
+        )
+        storage.bucket.create()
+        with mock.patch.object(uploads, "get_storage", return_value=storage):
+            yield storage
@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import RequestFactory
+
+from bmovez.utils import storages
+from bmovez.utils.api.v1.mixins import ConditionalGetMixin
+
+
+class ChannelView(ConditionalGetMixin):
+    def __init__(self) -> None:
+        self.request = RequestFactory().get("/api/v1/messaging/messages/channel/")
+        self.request.user = SimpleNamespace(pk="user")
+
+    def get_etag_scopes(self) -> list[str]:
+        return ["channel:channel"]
+
+
+def etag_at(seconds: int) -> str:
+    with mock.patch.object(storages.time, "time", return_value=seconds):
+        return ChannelView().get_etag()
+
+
+def test_etag_follows_signed_url_period_with_private_media(settings):
+    settings.MEDIA_PRIVATE = True
+    settings.MEDIA_URL_CACHE_PERIOD = 100
+
+    assert etag_at(1000) == etag_at(1099)
+    assert etag_at(1000) != etag_at(1100)
+
+
+def test_etag_ignores_time_with_public_media(settings):
+    settings.MEDIA_PRIVATE = False
+    settings.MEDIA_URL_CACHE_PERIOD = 100
+
+    assert etag_at(1000) == etag_at(1100)
@@ -0,0 +1,37 @@
+import pytest
+
+from bmovez.messaging import images
+from bmovez.messaging.models import Blob, Channel, File, Message
+from bmovez.utils import versions
+
+pytestmark = pytest.mark.django_db
+
+
+def test_duplicate_image_reuses_variants_and_bumps_its_channels(user):
+    channel = Channel.objects.create(type=Channel.CHANNEL_TYPE_GROUP, title="group")
+    blob = Blob.objects.create(sha256="0" * 64, content="blobs/00/image.png", size=3)
+    variants = {"display": {"name": "blobs/00/image.display.webp"}}
+    File.objects.create(
+        created_by=user,
+        type=File.FILE_TYPE_IMAGE,
+        file=blob.content.name,
+        blob=blob,
+        width=4,
+        height=3,
+        blurhash="hash",
+        variants=variants,
+    )
+    duplicate = File.objects.create(
+        created_by=user, type=File.FILE_TYPE_IMAGE, file=blob.content.name, blob=blob
+    )
+    message = Message.objects.create(created_by=user, channel=channel, text="look")
+    message.files.add(duplicate)
+    scope = versions.channel_scope(channel.id)
+    stamp = versions.get_stamps([scope])
+
+    images.process_image(duplicate.id)
+
+    duplicate.refresh_from_db()
+    assert (duplicate.width, duplicate.height) == (4, 3)
+    assert duplicate.variants == variants
+    assert versions.get_stamps([scope]) != stamp
@@ -0,0 +1,159 @@
+from typing import Callable, Iterator
+from unittest import mock
+
+import pytest
+
+from bmovez.messaging import push
+from bmovez.messaging.models import Channel, ChannelMembership, Message
+from bmovez.users.models import User, UserDevice
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def provider() -> Iterator[push.FakePushProvider]:
+    provider = push.FakePushProvider()
+    with mock.patch.object(push, "get_provider", return_value=provider):
+        yield provider
+
+
+@pytest.fixture
+def online() -> Iterator[set[str]]:
+    online: set[str] = set()
+    with mock.patch.object(
+        push.presence, "online_user_ids", side_effect=lambda user_ids: online
+    ):
+        yield online
+
+
+@pytest.fixture
+def channel(make_user) -> Channel:
+    sender = make_user("sender")
+    channel = Channel.objects.create(type=Channel.CHANNEL_TYPE_GROUP, title="group")
+    ChannelMembership.objects.create(channel=channel, user=sender)
+    return channel
+
+
+@pytest.fixture
+def add_member(make_user, channel) -> Callable[..., User]:
+    def add_member(username: str, devices: int, **kwargs) -> User:
+        user = make_user(username)
+        ChannelMembership.objects.create(channel=channel, user=user, **kwargs)
+        for number in range(devices):
+            UserDevice.objects.create(
+                user=user,
+                platform=UserDevice.PLATFORM_IOS,
+                token=f"{username}-{number}",
+            )
+        return user
+
+    return add_member
+
+
+def send_message(channel: Channel, text: str = "hello") -> Message:
+    sender = User.objects.get(username="sender")
+    return Message.objects.create(channel=channel, created_by=sender, text=text)
+
+
+def sent_tokens(provider: push.FakePushProvider) -> list[str]:
+    return [token for notification in provider.sent for token in notification["tokens"]]
+
+
+def test_push_skips_sender_muted_and_online_members(
+    provider, online, channel, add_member
+):
+    UserDevice.objects.create(
+        user=User.objects.get(username="sender"),
+        platform=UserDevice.PLATFORM_IOS,
+        token="sender-0",
+    )
+    add_member("offline", devices=2)
+    add_member("muted", devices=1, is_muted=True)
+    online.add(str(add_member("online", devices=1).id))
+
+    result = push.push_message(send_message(channel).id)
+
+    assert sorted(sent_tokens(provider)) == ["offline-0", "offline-1"]
+    assert result.sent == 2
+    assert result.failed == 0
+
+
+def test_push_sends_one_request_per_batch(
+    provider, online, channel, add_member, settings
+):
+    settings.PUSH_BATCH_SIZE = 2
+    add_member("first", devices=3)
+    add_member("second", devices=2)
+    message = send_message(channel)
+
+    push.push_message(message.id)
+
+    assert [len(notification["tokens"]) for notification in provider.sent] == [2, 2, 1]
+    assert {notification["collapse_key"] for notification in provider.sent} == {
+        str(channel.id)
+    }
+    assert provider.sent[0]["notification"]["data"] == {
+        "channel": str(channel.id),
+        "message": str(message.id),
+    }
+
+
+def test_push_summarizes_collapsed_messages(provider, online, channel, add_member):
+    add_member("member", devices=1)
+
+    push.push_message(send_message(channel).id, collapsed=3)
+
+    assert provider.sent[0]["notification"]["body"] == "3 new messages"
+
+
+def test_push_removes_invalid_tokens(online, channel, add_member):
+    add_member("member", devices=2)
+
+    class RejectingProvider(push.FakePushProvider):
+        def send(self, tokens, notification, collapse_key):
+            super().send(tokens, notification, collapse_key)
+            return push.PushResult(sent=1, invalid_tokens=["member-1"])
+
+    with mock.patch.object(push, "get_provider", return_value=RejectingProvider()):
+        result = push.push_message(send_message(channel).id)
+
+    assert result.invalid_tokens == ["member-1"]
+    assert list(UserDevice.objects.values_list("token", flat=True)) == ["member-0"]
+
+
+def test_push_counts_failed_batches(online, channel, add_member, settings):
+    settings.PUSH_BATCH_SIZE = 1
+    add_member("member", devices=2)
+
+    class FailingProvider(push.FakePushProvider):
+        def send(self, tokens, notification, collapse_key):
+            if tokens == ["member-0"]:
+                raise ConnectionError("provider unavailable")
+            return super().send(tokens, notification, collapse_key)
+
+    provider = FailingProvider()
+    with mock.patch.object(push, "get_provider", return_value=provider):
+        result = push.push_message(send_message(channel).id)
+
+    assert (result.sent, result.failed) == (1, 1)
+    assert sent_tokens(provider) == ["member-1"]
+
+
+def test_fake_provider_does_not_share_sent_notifications():
+    first, second = push.FakePushProvider(), push.FakePushProvider()
+    first.send(["token"], {"title": "title"}, collapse_key="channel")
+
+    assert len(first.sent) == 1
+    assert second.sent == []
+
+
+def test_disabled_provider_sends_nothing(online, channel, add_member):
+    add_member("member", devices=1)
+
+    with mock.patch.object(
+        push, "get_provider", return_value=push.DisabledPushProvider()
+    ):
+        result = push.push_message(send_message(channel).id)
+
+    assert (result.sent, result.failed) == (0, 0)
+    assert UserDevice.objects.filter(token="member-0").exists()
@@ -0,0 +1,191 @@
+import io
+import os
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from botocore.exceptions import ClientError
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from bmovez.messaging import uploads
+from bmovez.messaging.models import File, UploadSession
+from bmovez.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+CONTENT = b"0123456789"
+CHUNKS = {1: b"0123", 2: b"4567", 3: b"89"}
+
+
+@pytest.fixture(autouse=True)
+def upload_settings(settings, tmp_path):
+    settings.FILE_UPLOAD_CHUNK_SIZE = 4
+    settings.FILE_UPLOAD_CHUNKS_ROOT = str(tmp_path / "chunks")
+    settings.MEDIA_ROOT = str(tmp_path / "media")
+
+
+def start(user: User, size: int = len(CONTENT)) -> UploadSession:
+    return uploads.start_session(
+        user,
+        filename="report.pdf",
+        file_type=File.FILE_TYPE_DOCUMENT,
+        content_type="application/pdf",
+        size=size,
+    )
+
+
+def send(session: UploadSession, number: int, data: bytes) -> None:
+    uploads.write_chunk(session, number, io.BytesIO(data), len(data))
+
+
+def send_all(session: UploadSession) -> None:
+    # out of order, as parallel or retried requests would arrive
+    for number in (3, 1, 2):
+        send(session, number, CHUNKS[number])
+
+
+def test_session_assembles_chunks(user, settings):
+    session = start(user)
+    send_all(session)
+
+    file = uploads.finish_session(session.id, user)
+
+    assert file.file.read() == CONTENT
+    assert file.filename == "report.pdf"
+    assert not os.path.exists(
+        os.path.join(settings.FILE_UPLOAD_CHUNKS_ROOT, str(session.id))
+    )
+    # a retried completion returns the same file
+    assert uploads.finish_session(session.id, user) == file
+
+
+def test_session_resends_replace_chunks(user):
+    session = start(user)
+    send(session, 1, b"xxxx")
+    send_all(session)
+
+    assert uploads.finish_session(session.id, user).file.read() == CONTENT
+
+
+def test_session_rejects_bad_chunks(user):
+    session = start(user)
+
+    with pytest.raises(uploads.UploadError, match="chunk number"):
+        send(session, 4, b"ab")
+    with pytest.raises(uploads.UploadError, match="expected size"):
+        send(session, 1, b"abc")
+    with pytest.raises(uploads.UploadError, match="expected size"):
+        uploads.write_chunk(session, 1, io.BytesIO(b"abc"), 4)
+    assert uploads.missing_chunks(session) == [1, 2, 3]
+
+
+def test_session_requires_every_chunk(user):
+    session = start(user)
+    send(session, 1, CHUNKS[1])
+
+    with pytest.raises(uploads.UploadError, match="have not been uploaded"):
+        uploads.finish_session(session.id, user)
+    assert not File.objects.exists()
+
+
+def test_session_completion_is_claimed_once(user):
+    session = start(user)
+    send_all(session)
+    UploadSession.objects.filter(id=session.id).update(completing_at=timezone.now())
+    session.refresh_from_db()
+
+    with pytest.raises(uploads.UploadError, match="already being completed"):
+        uploads.finish_session(session.id, user)
+    with pytest.raises(uploads.UploadError, match="already complete"):
+        send(session, 1, CHUNKS[1])
+
+
+def test_session_abandoned_claim_is_taken_over(user, settings):
+    session = start(user)
+    send_all(session)
+    UploadSession.objects.filter(id=session.id).update(
+        completing_at=timezone.now()
+        - timedelta(seconds=settings.FILE_UPLOAD_COMPLETION_TIMEOUT + 1)
+    )
+
+    assert uploads.finish_session(session.id, user).file.read() == CONTENT
+
+
+def test_session_failed_assembly_releases_the_claim(user):
+    session = start(user)
+    send_all(session)
+
+    with mock.patch.object(
+        uploads.FileSystemChunkBackend, "finish", side_effect=OSError("disk full")
+    ):
+        with pytest.raises(OSError):
+            uploads.finish_session(session.id, user)
+
+    session.refresh_from_db()
+    assert session.completing_at is None
+    assert uploads.finish_session(session.id, user).file.read() == CONTENT
+
+
+def test_session_filename_is_capped(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    data = {"content_type": "application/pdf", "size": len(CONTENT)}
+
+    response = client.post(
+        "/api/v1/messaging/files/sessions/",
+        {**data, "filename": "a" * 201},
+        format="json",
+    )
+    assert response.status_code == 400
+    assert "filename" in response.data
+
+    response = client.post(
+        "/api/v1/messaging/files/sessions/",
+        {**data, "filename": "a" * 200},
+        format="json",
+    )
+    assert response.status_code == 201
+    session = UploadSession.objects.get(id=response.data["id"])
+    assert len(session.key) <= UploadSession._meta.get_field("key").max_length
+
+
+def test_session_uses_s3_multipart_uploads(user, s3_storage, settings):
+    # S3 parts, other than the last, are at least 5MiB
+    settings.FILE_UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+    parts = {1: b"a" * settings.FILE_UPLOAD_CHUNK_SIZE, 2: b"tail"}
+    session = start(user, size=sum(map(len, parts.values())))
+    assert session.upload_id
+
+    for number in (2, 1):
+        send(session, number, parts[number])
+    file = uploads.finish_session(session.id, user)
+
+    assert file.file.name == session.key
+    assert s3_storage.open(session.key).read() == parts[1] + parts[2]
+
+
+def test_session_failed_s3_completion_releases_the_claim(user, s3_storage):
+    session = start(user)
+    # S3 rejects the 4 byte parts when the upload is completed
+    send_all(session)
+
+    with pytest.raises(ClientError, match="EntityTooSmall"):
+        uploads.finish_session(session.id, user)
+
+    session.refresh_from_db()
+    assert session.completing_at is None
+    assert not File.objects.exists()
+
+
+def test_session_abort_aborts_the_s3_multipart_upload(user, s3_storage):
+    session = start(user)
+    send(session, 1, CHUNKS[1])
+
+    uploads.abort_session(session)
+
+    uploads_in_progress = s3_storage.bucket.meta.client.list_multipart_uploads(
+        Bucket="bucket"
+    )
+    assert not uploads_in_progress.get("Uploads")
+    assert not UploadSession.objects.exists()
@@ -0,0 +1,102 @@
+import base64
+import json
+
+import pytest
+import requests
+
+from bmovez.messaging import uploads
+from bmovez.messaging.models import File
+from bmovez.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+CONTENT = b"0123456789"
+
+
+def presign(user: User, size: int = len(CONTENT)) -> dict:
+    return uploads.presign_upload(
+        user,
+        filename="holiday photo.png",
+        file_type=File.FILE_TYPE_IMAGE,
+        content_type="image/png",
+        size=size,
+    )
+
+
+def post_form(upload: dict, content: bytes, content_type: str = "image/png") -> None:
+    """Upload the way a client does, with the presigned form."""
+    response = requests.post(
+        upload["url"],
+        data={**upload["fields"], "Content-Type": content_type},
+        files={"file": ("holiday photo.png", content)},
+    )
+    response.raise_for_status()
+
+
+def test_presign_requires_s3_storage(user):
+    with pytest.raises(uploads.UploadError):
+        presign(user)
+
+
+def test_presign_policy_pins_key_type_and_size(user, s3_storage, settings):
+    upload = presign(user)
+
+    key = upload["fields"]["key"]
+    assert key.startswith("media/")
+    assert key.endswith("/holiday_photo.png")
+    assert upload["expires_in"] == settings.FILE_UPLOAD_URL_EXPIRY
+    policy = json.loads(base64.b64decode(upload["fields"]["policy"]))
+    assert {"key": key} in policy["conditions"]
+    assert {"Content-Type": "image/png"} in policy["conditions"]
+    assert ["content-length-range", 10, 10] in policy["conditions"]
+
+
+def test_uploaded_file_is_completed(user, s3_storage):
+    upload = presign(user)
+    post_form(upload, CONTENT)
+
+    file = uploads.complete_upload(user, upload["token"])
+
+    assert f"media/{file.file.name}" == upload["fields"]["key"]
+    assert file.type == File.FILE_TYPE_IMAGE
+    assert file.filename == "holiday_photo.png"
+    assert s3_storage.open(file.file.name).read() == CONTENT
+    # a retried completion returns the same file
+    assert uploads.complete_upload(user, upload["token"]) == file
+    assert File.objects.count() == 1
+
+
+def test_complete_requires_the_object(user, s3_storage):
+    upload = presign(user)
+
+    with pytest.raises(uploads.UploadError, match="has not been uploaded"):
+        uploads.complete_upload(user, upload["token"])
+
+
+@pytest.mark.parametrize(
+    ("content", "content_type", "error"),
+    [
+        (CONTENT[:3], "image/png", "declared size"),
+        (CONTENT, "text/html", "declared type"),
+    ],
+)
+def test_complete_checks_the_stored_object(
+    user, s3_storage, content, content_type, error
+):
+    # the in-memory bucket does not enforce the policy, completion checks again
+    upload = presign(user)
+    post_form(upload, content, content_type)
+
+    with pytest.raises(uploads.UploadError, match=error):
+        uploads.complete_upload(user, upload["token"])
+    assert not File.objects.exists()
+
+
+def test_complete_rejects_foreign_and_tampered_tokens(user, make_user, s3_storage):
+    upload = presign(user)
+    post_form(upload, CONTENT)
+
+    with pytest.raises(uploads.UploadError):
+        uploads.complete_upload(make_user("other"), upload["token"])
+    with pytest.raises(uploads.UploadError):
+        uploads.complete_upload(user, upload["token"] + "x")
@@ -0,0 +1,78 @@
+import pytest
+
+from bmovez.messaging.models import Channel, ChannelMembership
+from bmovez.team.models import Team, TeamMembership
+from bmovez.users.api.v1.serializers import USER_CARD_FIELDS, get_user_card
+from bmovez.users.models import FreepbxExtentionProfile, User
+from bmovez.utils import versions
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def member(make_user) -> User:
+    return make_user("member")
+
+
+@pytest.fixture
+def scopes(member) -> list[str]:
+    channel = Channel.objects.create(type=Channel.CHANNEL_TYPE_GROUP, title="group")
+    ChannelMembership.objects.create(channel=channel, user=member)
+    team = Team.objects.create(created_by=member, title="team")
+    TeamMembership.objects.create(team=team, user=member, added_by=member)
+    return [versions.channel_scope(channel.id), versions.team_scope(team.id)]
+
+
+def changed_stamps(scopes, django_capture_on_commit_callbacks, change) -> list[bool]:
+    before = versions.get_stamps(scopes)
+    with django_capture_on_commit_callbacks(execute=True):
+        change()
+    return [old != new for old, new in zip(before, versions.get_stamps(scopes))]
+
+
+def test_pbx_profile_changes_bump_embedding_pages(
+    member, scopes, django_capture_on_commit_callbacks
+):
+    def create():
+        FreepbxExtentionProfile.objects.create(
+            user=member, extention_id=100, caller_id="100", extention_password="x"
+        )
+
+    def update():
+        profile = FreepbxExtentionProfile.objects.get(user=member)
+        profile.caller_id = "Member <100>"
+        profile.save()
+
+    for change in (create, update):
+        assert changed_stamps(scopes, django_capture_on_commit_callbacks, change) == [
+            True,
+            True,
+        ]
+
+
+def test_sign_in_does_not_bump_embedding_pages(
+    member, scopes, django_capture_on_commit_callbacks
+):
+    def sign_in():
+        member.last_login = member.date_joined
+        member.save()
+
+    def rename():
+        member.name = "RENAMED"
+        member.save()
+
+    assert changed_stamps(scopes, django_capture_on_commit_callbacks, sign_in) == [
+        False,
+        False,
+    ]
+    assert changed_stamps(scopes, django_capture_on_commit_callbacks, rename) == [
+        True,
+        True,
+    ]
+
+
+def test_user_card_leaves_out_last_login(member):
+    card = get_user_card(member.id)
+
+    assert "last_login" not in card
+    assert set(USER_CARD_FIELDS) <= set(card)